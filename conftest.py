@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+"""pytest 配置"""
+
+# 这两个是手动运行的诊断脚本 (打印信息、打开浏览器、等待输入)，不作为测试收集
+collect_ignore = ["test_resources.py", "test_template_paths.py"]
@@ -1 +1,10 @@
-from . import graph
+import importlib
+
+# 子模块按需导入：命令行的查询类子命令和编程接口不需要加载 luaparser 等扫描依赖
+_LAZY_SUBMODULES = ("graph", "api")
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 编程接口
+不依赖 Qt 的调用图查询会话，存储文件只加载一次，查询结果和辅助索引按需构建并缓存
+
+示例:
+    from lus4n.api import GraphSession
+    session = GraphSession("result.jb")
+    session.ancestors("os.execute")
+    session.paths("luci.main", "os.execute")
+"""
+
+import threading
+from collections import OrderedDict
+from typing import FrozenSet, List, NamedTuple, Optional
+
+from lus4n.storage import load_call_network
+
+
+# 祖先/后代查询结果的缓存条目数
+CLOSURE_CACHE_SIZE = 1024
+
+
+class NodeInfo(NamedTuple):
+    """节点信息"""
+    name: str
+    role: str                   # 'file' 或 'function'
+    file: Optional[str]         # 定义函数的文件，文件节点及未找到定义时为 None
+
+
+class Hotspot(NamedTuple):
+    """热点函数"""
+    name: str
+    called: int                 # 被调用次数 (入度)
+    calls: int                  # 调用其他函数的次数 (出度)
+
+
+class GraphSession:
+    """调用图查询会话
+
+    - 存储文件在构造时加载一次，之后只读
+    - 祖先/后代结果按 LRU 缓存，定义文件、热点、入口等索引首次使用时构建
+    - 可在多个线程间共享，缓存和索引的构建由内部锁保护
+    """
+
+    def __init__(self, storage_path=None, graph=None, closure_cache_size=CLOSURE_CACHE_SIZE):
+        """
+        参数:
+        - storage_path: 调用图存储文件路径
+        - graph: 已加载的调用图，提供时不再读取存储文件
+        """
+        self.storage_path = storage_path
+        self.graph = graph if graph is not None else load_call_network(storage_path)
+        self.closure_cache_size = closure_cache_size
+        self._lock = threading.RLock()
+        self._closures = OrderedDict()
+        self._defining_files = None
+        self._hotspots = None
+        self._entries = None
+        self._symbol_index = None
+
+    def __contains__(self, name):
+        return name in self.graph
+
+    def _check(self, name):
+        if name not in self.graph:
+            raise ValueError(f"函数不存在: {name}")
+
+    # -------------------------------------------------
+    # 节点信息
+    # -------------------------------------------------
+    def _defining_file_index(self):
+        """函数 -> 定义文件 (通过 export/define 边)，首次使用时一次遍历构建"""
+        with self._lock:
+            if self._defining_files is None:
+                index = {}
+                for source, target, action in self.graph.edges(data="action"):
+                    if action in ("export", "define") and target not in index:
+                        index[target] = source
+                self._defining_files = index
+            return self._defining_files
+
+    def defining_file(self, name: str) -> Optional[str]:
+        """定义函数的文件节点，找不到时返回 None"""
+        self._check(name)
+        return self._defining_file_index().get(name)
+
+    def node_info(self, name: str) -> NodeInfo:
+        """节点的角色和定义文件"""
+        self._check(name)
+        if self.graph.nodes[name].get("role") == "file":
+            return NodeInfo(name, "file", None)
+        return NodeInfo(name, "function", self._defining_file_index().get(name))
+
+    # -------------------------------------------------
+    # 调用关系
+    # -------------------------------------------------
+    def _closure(self, name, direction):
+        key = (direction, name)
+        with self._lock:
+            nodes = self._closures.get(key)
+            if nodes is not None:
+                self._closures.move_to_end(key)
+                return nodes
+
+        # 遍历在锁外进行，并发的不同查询互不阻塞
+        import networkx as nx
+        self._check(name)
+        if direction == "ancestors":
+            nodes = frozenset(nx.ancestors(self.graph, name))
+        else:
+            nodes = frozenset(nx.descendants(self.graph, name))
+
+        with self._lock:
+            self._closures[key] = nodes
+            if len(self._closures) > self.closure_cache_size:
+                self._closures.popitem(last=False)
+        return nodes
+
+    def ancestors(self, name: str) -> FrozenSet[str]:
+        """调用该函数的所有节点 (不含自身)"""
+        return self._closure(name, "ancestors")
+
+    def descendants(self, name: str) -> FrozenSet[str]:
+        """该函数调用的所有节点 (不含自身)"""
+        return self._closure(name, "descendants")
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+        """最短调用路径，不存在时返回 None"""
+        import networkx as nx
+        self._check(source)
+        self._check(target)
+        # 目标不在起点的后代中时无需搜索
+        if target != source and target not in self.descendants(source):
+            return None
+        return nx.shortest_path(self.graph, source, target)
+
+    def paths(self, source: str, target: str, max_depth: int = 10, max_paths: int = 100) -> List[List[str]]:
+        """从 source 到 target 的简单调用路径"""
+        import networkx as nx
+        self._check(source)
+        self._check(target)
+        if target != source and target not in self.descendants(source):
+            return []
+        paths = []
+        for path in nx.all_simple_paths(self.graph, source, target, cutoff=max_depth):
+            paths.append(path)
+            if len(paths) >= max_paths:
+                break
+        return paths
+
+    # -------------------------------------------------
+    # 全图统计
+    # -------------------------------------------------
+    def hotspots(self, top_n: int = 20) -> List[Hotspot]:
+        """被调用次数最多的函数"""
+        with self._lock:
+            if self._hotspots is None:
+                graph = self.graph
+                hotspots = [
+                    Hotspot(node, graph.in_degree(node), graph.out_degree(node))
+                    for node, role in graph.nodes(data="role")
+                    if role != "file" and graph.in_degree(node) > 0
+                ]
+                hotspots.sort(key=lambda h: h.called, reverse=True)
+                self._hotspots = hotspots
+            return self._hotspots[:top_n]
+
+    def entries(self) -> List[str]:
+        """函数入口点：没有被任何函数调用 (无 call/resolve 入边) 的函数"""
+        with self._lock:
+            if self._entries is None:
+                called = {target for _, target, action in self.graph.edges(data="action")
+                          if action in ("call", "resolve")}
+                self._entries = [
+                    node for node, role in self.graph.nodes(data="role")
+                    if role != "file" and node not in called
+                ]
+            return list(self._entries)
+
+    def search(self, query: str, limit: int = 50) -> List[str]:
+        """函数名检索 (子串/模糊)，使用与存储文件一起保存的符号索引"""
+        with self._lock:
+            if self._symbol_index is None:
+                from lus4n.symbol_index import SymbolIndex
+                if self.storage_path is None:
+                    self._symbol_index = SymbolIndex.from_graph(self.graph)
+                else:
+                    self._symbol_index = SymbolIndex.load_or_build(self.storage_path, lambda: self.graph)
+            index = self._symbol_index
+        return index.search(query, limit)
+
+
+def open_session(storage_path) -> GraphSession:
+    """打开存储文件并返回查询会话"""
+    return GraphSession(storage_path)
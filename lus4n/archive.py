@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 压缩包扫描模块
+直接从 tar (含 gzip/bzip2/xz 压缩) 和 zip 固件压缩包中读取 Lua 文件并解析，无需解压到磁盘：
+- tar 只能顺序解压，在主进程中以流方式读取成员，解析分发到工作进程
+- zip 的成员可以独立解压，每个工作进程打开自己的文件句柄，解压和解析都并行进行
+
+文件节点名与解压后扫描时相同：成员在压缩包中的路径，以 '/' 开头
+"""
+
+import stat
+import tarfile
+import zipfile
+import threading
+import multiprocessing
+
+import xxhash
+
+from lus4n.graph import scan_source
+from lus4n.sites import node_sites
+
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tbz", ".tar.xz", ".txz", ".zip")
+
+# 已读出、等待解析的 tar 成员数上限，控制内存占用
+MAX_PENDING_MEMBERS = 256
+
+# 需要解析的成员数少于该值时不使用多进程
+MULTIPROCESS_THRESHOLD = 8
+
+# 工作进程中打开的 zip 文件
+_zip_file = None
+
+
+def is_archive(path):
+    """是否为支持的压缩包 (按文件名后缀判断)"""
+    return path.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def member_node_path(name):
+    """压缩包成员名转换为文件节点名，例如 './usr/lib/lua/a.lua' -> '/usr/lib/lua/a.lua'"""
+    name = name.replace("\\", "/")
+    while name.startswith("./"):
+        name = name[2:]
+    return "/" + name.lstrip("/")
+
+
+def _wanted(relative_file_path, extensions, rules):
+    if not any(relative_file_path.endswith(ext) for ext in extensions):
+        return False
+    # 压缩包内的 .gitignore 不会被读取，排除/包含模式仍然生效
+    return rules is None or rules.accepts_relative(relative_file_path[1:])
+
+
+def iter_tar_members(archive_path, extensions, rules=None):
+    """顺序读取 tar 中需要扫描的普通文件，返回 (文件节点名, 内容)
+
+    以流模式打开 ("r|*")，不需要随机访问，压缩格式自动识别
+    """
+    with tarfile.open(archive_path, "r|*") as tar:
+        for member in tar:
+            # 符号链接和硬链接指向的文件会以普通文件成员出现，不重复扫描
+            if not member.isfile():
+                continue
+            relative_file_path = member_node_path(member.name)
+            if not _wanted(relative_file_path, extensions, rules):
+                continue
+            yield relative_file_path, tar.extractfile(member).read()
+
+
+def list_zip_members(archive_path, extensions, rules=None):
+    """zip 中需要扫描的成员，返回 [(文件节点名, 成员名), ...]"""
+    members = []
+    with zipfile.ZipFile(archive_path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or stat.S_ISLNK(info.external_attr >> 16):
+                continue
+            relative_file_path = member_node_path(info.filename)
+            if _wanted(relative_file_path, extensions, rules):
+                members.append((relative_file_path, info.filename))
+    return members
+
+
+def _scan_member(relative_file_path, file_path, data, _format):
+    _, call_graph, require, status, sites = scan_source(file_path, data, _format, with_sites=True)
+    return (relative_file_path, file_path, call_graph, require, status, xxhash.xxh64(data).hexdigest(),
+            node_sites(relative_file_path, sites, require))
+
+
+def _scan_tar_member(item):
+    return _scan_member(*item)
+
+
+def _init_zip_worker(archive_path):
+    global _zip_file
+    _zip_file = zipfile.ZipFile(archive_path)
+
+
+def _scan_zip_member(item):
+    relative_file_path, name, file_path, _format = item
+    return _scan_member(relative_file_path, file_path, _zip_file.read(name), _format)
+
+
+def _bounded(items, semaphore, stop):
+    """限制在途数量的生成器：每取出一项占用一个名额，由消费方在得到结果后归还"""
+    for item in items:
+        while not semaphore.acquire(timeout=0.1):
+            if stop.is_set():
+                return
+        yield item
+
+
+def scan_archive(archive_path, extensions=None, rules=None, jobs=None, _format="json"):
+    """解析压缩包中的 Lua 文件，结果按完成顺序返回
+
+    参数:
+    - archive_path: tar/zip 压缩包路径
+    - extensions: 文件后缀列表，默认 ['.lua']
+    - rules: lus4n.ignore.IgnoreRules，按成员路径应用排除/包含模式
+    - jobs: 工作进程数，1 表示在当前进程中解析，默认使用全部 CPU
+
+    返回 (生成器):
+    - (文件节点名, 虚拟文件路径, 调用图, require 列表, 状态, 内容哈希, 调用位置)；
+      虚拟文件路径为压缩包路径加成员路径，用于日志；调用位置为 lus4n.sites.node_sites 的形式
+    """
+    extensions = extensions or [".lua"]
+
+    if zipfile.is_zipfile(archive_path):
+        items = [(relative_file_path, name, archive_path + relative_file_path, _format)
+                 for relative_file_path, name in list_zip_members(archive_path, extensions, rules)]
+        if jobs == 1 or len(items) < MULTIPROCESS_THRESHOLD:
+            with zipfile.ZipFile(archive_path) as zf:
+                for relative_file_path, name, file_path, _ in items:
+                    yield _scan_member(relative_file_path, file_path, zf.read(name), _format)
+            return
+        with multiprocessing.Pool(jobs, initializer=_init_zip_worker, initargs=(archive_path,)) as pool:
+            yield from pool.imap_unordered(_scan_zip_member, items, chunksize=4)
+        return
+
+    items = ((relative_file_path, archive_path + relative_file_path, data, _format)
+             for relative_file_path, data in iter_tar_members(archive_path, extensions, rules))
+    if jobs == 1:
+        for item in items:
+            yield _scan_tar_member(item)
+        return
+
+    # 主进程解压的同时工作进程解析；限制在途成员数，避免解压速度快于解析时内容堆积在内存中
+    semaphore = threading.Semaphore(MAX_PENDING_MEMBERS)
+    stop = threading.Event()
+    with multiprocessing.Pool(jobs) as pool:
+        try:
+            for result in pool.imap_unordered(_scan_tar_member, _bounded(items, semaphore, stop)):
+                semaphore.release()
+                yield result
+        finally:
+            # 提前结束时先让读取线程退出，进程池才能正常关闭
+            stop.set()
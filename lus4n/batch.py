@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 批量查询模块
+调用图只加载一次，查询分发到多个工作进程执行，结果按完成顺序以 JSON Lines 输出
+
+查询每行一条，支持两种写法：
+- 文本：ancestors NAME / descendants NAME / degree NAME / paths SOURCE TARGET
+- JSON：{"op": "paths", "source": "...", "target": "...", "all": true, "max_depth": 10}
+"""
+
+import json
+import multiprocessing
+
+from lus4n.query import related_nodes
+
+
+BATCH_OPS = ("ancestors", "descendants", "paths", "degree")
+
+# 各查询类型必需的字段
+REQUIRED_FIELDS = {"paths": ("source", "target")}
+
+# 输出记录中由批量查询填写的字段，查询中的同名字段不写入输出
+RECORD_FIELDS = ("line", "result", "error")
+
+# 每次分发给工作进程的查询数量
+BATCH_CHUNK_SIZE = 16
+
+# 工作进程中使用的调用图：fork 方式下直接继承父进程已加载的图 (写时复制)，
+# 其他启动方式下由 _init_worker 在每个工作进程中加载一次
+_graph = None
+
+
+def parse_query(line):
+    """解析一行查询，空行和以 # 开头的注释行返回 None"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line.startswith(("{", "[")):
+        query = json.loads(line)
+    else:
+        parts = line.split()
+        op, params = parts[0], parts[1:]
+        if op == "paths":
+            if len(params) != 2:
+                raise ValueError("paths 需要起始函数和目标函数两个参数")
+            query = {"op": op, "source": params[0], "target": params[1]}
+        else:
+            if len(params) != 1:
+                raise ValueError(f"{op} 需要一个函数名参数")
+            query = {"op": op, "name": params[0]}
+    if not isinstance(query, dict):
+        raise ValueError("JSON 查询必须是对象")
+    if query.get("op") not in BATCH_OPS:
+        raise ValueError(f"不支持的查询类型: {query.get('op')}")
+    for field in REQUIRED_FIELDS.get(query["op"], ("name",)):
+        if field not in query:
+            raise ValueError(f"{query['op']} 查询缺少字段: {field}")
+    return query
+
+
+def run_query(graph, query):
+    """执行单条查询，返回结果字典"""
+    import networkx as nx
+
+    op = query["op"]
+    if op == "paths":
+        source, target = query["source"], query["target"]
+        for name in (source, target):
+            if name not in graph:
+                raise KeyError(f"no such node {name}")
+        if query.get("all"):
+            paths = []
+            for path in nx.all_simple_paths(graph, source, target, cutoff=query.get("max_depth", 10)):
+                paths.append(path)
+                if len(paths) >= query.get("max_paths", 100):
+                    break
+            return {"paths": paths}
+        try:
+            return {"paths": [nx.shortest_path(graph, source, target)]}
+        except nx.NetworkXNoPath:
+            return {"paths": []}
+
+    name = query["name"]
+    if name not in graph:
+        raise KeyError(f"no such node {name}")
+    if op == "degree":
+        return {"in": graph.in_degree(name), "out": graph.out_degree(name)}
+    return {"nodes": related_nodes(graph, name, op)}
+
+
+def _answer(item):
+    """执行一条已编号的查询，出错时把错误信息放进结果"""
+    index, query, error = item
+    record = {"line": index}
+    if error is None:
+        # 结果按完成顺序输出，行号是对应查询的唯一依据，不能被查询中的字段覆盖
+        record.update((key, value) for key, value in query.items() if key not in RECORD_FIELDS)
+        try:
+            record["result"] = run_query(_graph, query)
+        except KeyError as e:
+            record["error"] = e.args[0]
+        except Exception as e:
+            record["error"] = str(e)
+    else:
+        record["error"] = error
+    return record
+
+
+def _numbered_queries(lines):
+    """为每行查询附上行号 (从 1 开始)，解析失败的行携带错误信息"""
+    for index, line in enumerate(lines, 1):
+        try:
+            query = parse_query(line)
+        except Exception as e:
+            yield index, None, f"无法解析查询: {e}"
+            continue
+        if query is not None:
+            yield index, query, None
+
+
+def _init_worker(storage_path):
+    global _graph
+    if storage_path is not None:
+        from lus4n.storage import load_call_network
+        _graph = load_call_network(storage_path)
+
+
+def run_batch(graph, lines, out, jobs=None, storage_path=None):
+    """执行批量查询并逐条写出 JSON Lines 结果
+
+    参数:
+    - graph: 已加载的调用图
+    - lines: 查询行的可迭代对象 (文件或标准输入)，按需读取
+    - out: 输出流
+    - jobs: 工作进程数，1 表示在当前进程中执行，默认使用全部 CPU
+    - storage_path: 存储文件路径，非 fork 启动方式 (spawn/forkserver) 下工作进程据此重新加载调用图，
+      此时 jobs 不为 1 就必须提供
+
+    返回:
+    - 执行的查询数量
+    """
+    # fork 方式下工作进程直接共享父进程中的图，无需序列化或重新加载
+    inherit = multiprocessing.get_start_method() == "fork"
+    if jobs != 1 and not inherit and storage_path is None:
+        raise ValueError("非 fork 启动方式下多进程批量查询需要提供 storage_path，或使用 jobs=1")
+    global _graph
+    _graph = graph
+    items = _numbered_queries(lines)
+    count = 0
+
+    if jobs == 1:
+        for item in items:
+            out.write(json.dumps(_answer(item), ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+        return count
+
+    with multiprocessing.Pool(jobs, initializer=_init_worker,
+                              initargs=(None if inherit else storage_path,)) as pool:
+        for record in pool.imap_unordered(_answer, items, chunksize=BATCH_CHUNK_SIZE):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            count += 1
+    return count
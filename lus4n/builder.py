@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 调用网络构建模块
+把各文件的调用图字典展开为调用网络的边。每个文件生成一个去重后的边批次，
+累积到一定数量后一次性插入 networkx 图
+
+命令行扫描、图形界面扫描、压缩包扫描、监视模式和图分析都通过这里构建调用网络，
+同一份调用图无论由哪条路径构建，得到的节点和边都相同
+
+多进程扫描时各工作进程为自己的文件块生成去重后的部分边表 (EdgeTable)，主进程把
+部分边表按顺序拼接、统一去重一次，再把最终的边表插入图中
+
+传入符号表 (lus4n.symbols.SymbolTable) 时，插入图中的节点名都取自符号表，
+与调用图共享同一批字符串对象
+
+每条边带有权重 weight：调用边为调用发生的次数 (按 lus4n.sites 的调用表统计，
+没有调用位置信息的文件每个调用按 1 次计)，多个文件的调用次数相加；其余边为 1
+
+扫描结束后 lus4n.resolve 再把跨文件解析得到的调用以 resolve 边加入调用网络
+"""
+
+import os
+from array import array
+
+import networkx as nx
+import xxhash
+
+from lus4n.symbols import SymbolTable
+
+
+# 累积的边数达到该值时插入图中
+BATCH_SIZE = 50000
+
+# 调用网络节点命名规则的版本，规则变化时递增；存储文件中的版本不同时，增量扫描会重新构建调用网络
+NETWORK_VERSION = 4
+
+# 边表中 action 的编号
+ACTIONS = ("export", "define", "call")
+_ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+
+
+def package_name(relative_file_path):
+    """文件的包名：去掉目录和后缀的文件名，例如 '/usr/lib/lua/luci/util.lua' -> 'util'"""
+    return os.path.splitext(os.path.basename(relative_file_path))[0]
+
+
+def main_node(relative_file_path):
+    """文件顶层代码对应的节点名
+
+    哈希取自文件节点名 (相对扫描路径)，与扫描路径所在位置无关，
+    解压后的目录和压缩包扫描得到相同的节点
+    """
+    digest = xxhash.xxh32(relative_file_path.encode()).hexdigest()
+    return f"{package_name(relative_file_path)}.main.{digest}"
+
+
+def caller_node(relative_file_path, tmp_name, require=()):
+    """调用图键对应的调用网络节点名，以及文件到该节点的边的 action
+
+    - [G]：包名.main.哈希，export
+    - [X]a.b：包名.b (a 不是 require 的模块时) 或 a.b，export
+    - [L]f：f，define
+    其余键返回 (None, None)
+    """
+    if tmp_name == "[G]":
+        return main_node(relative_file_path), "export"
+    if tmp_name.startswith("[X]"):
+        exported = tmp_name[3:]
+        father, dot, left = exported.partition(".")
+        if dot and father not in require:
+            # TODO: 或许也可以用 M./_M.来筛选导出函数？
+            return f"{package_name(relative_file_path)}.{left}", "export"
+        return exported, "export"
+    if tmp_name.startswith("[L]"):
+        return tmp_name[3:], "define"
+    return None, None
+
+
+def _file_edges(relative_file_path, call_graph, require):
+    """文件的边 {(起点, 终点): action}，同一条边以后写入的 action 为准"""
+    edges = {}
+    for tmp_name, called_list in call_graph.items():
+        if tmp_name == "[G]" and not called_list:
+            continue
+        source, action = caller_node(relative_file_path, tmp_name, require)
+        if source is None:
+            continue
+        edges[(relative_file_path, source)] = action
+        for called in called_list:
+            edges[(source, called)] = "call"
+    return edges
+
+
+def file_edges(relative_file_path, call_graph, require=(), symbols=None, counts=None):
+    """将单个文件的调用图字典展开为去重后的边列表 [(起点, 终点, action, 权重), ...]
+
+    - [G]：文件 -export-> 包名.main.哈希 -call-> 被调用函数
+    - [X]a.b：文件 -export-> 包名.b (a 不是 require 的模块时) 或 a.b -call-> 被调用函数
+    - [L]f：文件 -define-> f -call-> 被调用函数
+
+    参数:
+    - symbols: 符号表，节点名取自其中
+    - counts: 文件中各调用边的调用次数 (lus4n.sites.count_calls)，缺少时每条边按 1 次计
+    """
+    counts = counts or {}
+    edges = _file_edges(relative_file_path, call_graph, require)
+    if symbols is None:
+        return [(u, v, action, counts.get((u, v), 1)) for (u, v), action in edges.items()]
+    intern = symbols.intern
+    return [(intern(u), intern(v), action, counts.get((u, v), 1)) for (u, v), action in edges.items()]
+
+
+class GraphBuilder:
+    """批量构建调用网络
+
+    用法:
+        builder = GraphBuilder()
+        for relative_file_path, call_graph in ...:
+            builder.add_file(relative_file_path, call_graph, require)
+        network = builder.build()
+    """
+
+    def __init__(self, network=None, batch_size=BATCH_SIZE, symbols=None):
+        self.network = network if network is not None else nx.DiGraph()
+        self.batch_size = batch_size
+        self.symbols = symbols
+        self._files = []
+        self._edges = {}
+        self._weights = {}
+
+    def add_file(self, relative_file_path, call_graph, require=(), counts=None):
+        """加入一个文件的调用图，没有调用关系的文件不加入
+
+        counts 为文件中各调用边的调用次数 (lus4n.sites.count_calls)，缺少时每条边按 1 次计
+        """
+        if not call_graph:
+            return
+        self._files.append(relative_file_path)
+        edges, weights = self._edges, self._weights
+        for edge, action in _file_edges(relative_file_path, call_graph, require).items():
+            edges[edge] = action
+            weights[edge] = weights.get(edge, 0) + (counts.get(edge, 1) if counts else 1)
+        if len(edges) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """把累积的文件节点和边插入图中，已在图中的边累加权重"""
+        intern = self.symbols.intern if self.symbols is not None else None
+        network = self.network
+        existing = network.number_of_edges() > 0
+        if self._files:
+            network.add_nodes_from(map(intern, self._files) if intern else self._files, role="file")
+            self._files = []
+        if self._edges:
+            # 按 (action, 权重) 分组插入，省去为每条边单独创建属性字典
+            groups = {}
+            for edge, action in self._edges.items():
+                weight = self._weights[edge]
+                if intern:
+                    edge = (intern(edge[0]), intern(edge[1]))
+                if existing:
+                    data = network.get_edge_data(*edge)
+                    if data is not None:
+                        weight += data.get("weight", 1)
+                groups.setdefault((action, weight), []).append(edge)
+            for (action, weight), edges in groups.items():
+                network.add_edges_from(edges, action=action, weight=weight)
+            self._edges = {}
+            self._weights = {}
+
+    def build(self):
+        """插入剩余的边并返回调用网络"""
+        self.flush()
+        return self.network
+
+
+def build_network(whole_call_graph, file_requires=None, network=None, symbols=None, call_counts=None):
+    """由各文件的调用图 {文件节点名: 调用图} 构建调用网络
+
+    参数:
+    - whole_call_graph: 各文件的调用图
+    - file_requires: 各文件的 require 列表，缺少时按没有 require 处理
+    - network: 在已有的图上追加，默认新建
+    - symbols: 符号表，节点名取自其中
+    - call_counts: 各文件的调用次数 {文件: {(调用方节点, 被调用函数): 次数}} (CallSiteTable.call_counts)
+    """
+    file_requires = file_requires or {}
+    call_counts = call_counts or {}
+    builder = GraphBuilder(network, symbols=symbols)
+    for relative_file_path, call_graph in whole_call_graph.items():
+        builder.add_file(relative_file_path, call_graph, file_requires.get(relative_file_path, ()),
+                         call_counts.get(relative_file_path))
+    return builder.build()
+
+
+class EdgeTable:
+    """紧凑的部分边表，可以在进程间传递和合并
+
+    节点名存放在边表自己的符号表中，边保存为起点编号、终点编号、权重三个整数数组和 action 编号；
+    同一文件内的边在加入时去重，不同文件之间的重复边在 dedup() 时合并 (权重相加)
+    """
+
+    def __init__(self):
+        self.files = []             # 文件节点
+        self.nodes = SymbolTable()  # 节点名 <-> 编号
+        self.sources = array("l")
+        self.targets = array("l")
+        self.weights = array("l")
+        self.actions = bytearray()
+
+    def __len__(self):
+        return len(self.actions)
+
+    def add_file(self, relative_file_path, call_graph, require=(), counts=None):
+        """加入一个文件的调用图，没有调用关系的文件不加入；counts 同 GraphBuilder.add_file"""
+        if not call_graph:
+            return
+        self.files.append(relative_file_path)
+        node_id = self.nodes.id
+        for (u, v), action in _file_edges(relative_file_path, call_graph, require).items():
+            self.sources.append(node_id(u))
+            self.targets.append(node_id(v))
+            self.weights.append(counts.get((u, v), 1) if counts else 1)
+            self.actions.append(_ACTION_CODES[action])
+
+    def merge(self, other):
+        """把另一个边表追加到本边表之后 (对方的节点编号重新映射)，返回本边表"""
+        remap = [self.nodes.id(name) for name in other.nodes.names]
+        self.files.extend(other.files)
+        self.sources.extend(map(remap.__getitem__, other.sources))
+        self.targets.extend(map(remap.__getitem__, other.targets))
+        self.weights.extend(other.weights)
+        self.actions.extend(other.actions)
+        return self
+
+    def dedup(self):
+        """合并重复的边：保留最先出现的一条，权重相加，返回本边表"""
+        count = len(self.nodes)
+        first = {}
+        keep, weights = [], []
+        for i, (key, weight) in enumerate(zip((u * count + v for u, v in zip(self.sources, self.targets)),
+                                              self.weights)):
+            j = first.get(key)
+            if j is None:
+                first[key] = len(keep)
+                keep.append(i)
+                weights.append(weight)
+            else:
+                weights[j] += weight
+        if len(keep) < len(self.actions):
+            self.sources = array("l", [self.sources[i] for i in keep])
+            self.targets = array("l", [self.targets[i] for i in keep])
+            self.actions = bytearray([self.actions[i] for i in keep])
+            self.weights = array("l", weights)
+        return self
+
+    def to_network(self, network=None, symbols=None):
+        """去重后插入调用网络 (默认新建)，symbols 不为 None 时节点名取自该符号表"""
+        self.dedup()
+        network = network if network is not None else nx.DiGraph()
+        if symbols is not None:
+            nodes = symbols.intern_list(self.nodes.names)
+            network.add_nodes_from(symbols.intern_list(self.files), role="file")
+        else:
+            nodes = self.nodes.names
+            network.add_nodes_from(self.files, role="file")
+        groups = {}
+        for u, v, code, weight in zip(self.sources, self.targets, self.actions, self.weights):
+            groups.setdefault((code, weight), []).append((nodes[u], nodes[v]))
+        for (code, weight), edges in groups.items():
+            network.add_edges_from(edges, action=ACTIONS[code], weight=weight)
+        return network
+
+
+def build_table(items):
+    """由 [(文件节点名, 调用图, require 列表, 调用次数), ...] 生成去重后的部分边表
+
+    可在工作进程中执行，块内的重复边在传回主进程之前已经合并
+    """
+    table = EdgeTable()
+    for relative_file_path, call_graph, require, counts in items:
+        table.add_file(relative_file_path, call_graph, require, counts)
+    return table.dedup()
+
+
+def reduce_tables(tables):
+    """把部分边表按先后顺序拼接为一个边表，最后统一去重一次
+
+    不在进程池中逐轮两两合并：每一轮都要在进程间传递全部边表，序列化的开销超过去重本身
+    """
+    tables = [table for table in tables if table.files]
+    if not tables:
+        return EdgeTable()
+    result = tables[0]
+    for table in tables[1:]:
+        result.merge(table)
+    return result.dedup()
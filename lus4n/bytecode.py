@@ -0,0 +1,557 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - Lua 字节码解析模块
+直接读取 luac (Lua 5.1) 和 LuaJIT 2.0/2.1 (string.dump / luajit -b) 生成的字节码，
+遍历函数原型和常量表恢复调用关系，输出与源码解析相同格式的调用图：
+- 键：[G] 文件顶层，[X]全局函数或表字段函数 (如 [X]M.foo)，[L]局部函数
+- 值：被调用的名字，全局/局部/上值函数为函数名，表字段函数为 '.字段名'
+
+不做完整的反编译，只在每个函数内按指令顺序跟踪寄存器中保存的名字 (全局变量、表字段、
+字符串常量、闭包)，遇到跳转目标时清空。带调试信息的字节码可以得到局部变量和上值的名字；
+去掉调试信息 (luac -s / luajit -s) 后，局部函数的调用无法恢复，未命名的函数按匿名函数处理，
+其调用归入外层函数
+"""
+
+import struct
+
+
+LUA51_SIGNATURE = b"\x1bLua\x51"
+LUAJIT_SIGNATURE = b"\x1bLJ"
+
+# 名字未知的局部表 (去掉调试信息时)，添加到调用网络时会替换为文件名
+UNKNOWN_TABLE = "?"
+
+
+def is_bytecode(data):
+    """内容是否为 Lua 字节码 (任意版本)"""
+    return data.startswith(b"\x1bL")
+
+
+class Prototype:
+    """函数原型：统一表示后的指令和调试信息"""
+
+    __slots__ = ("ops", "targets", "children", "locals", "upvalues", "upvalue_count")
+
+    def __init__(self):
+        self.ops = []           # [(pc, 操作, 参数...)]
+        self.targets = set()    # 跳转目标 pc
+        self.children = []      # 子函数原型
+        self.locals = []        # [(变量名或 None, startpc, endpc)]，按声明顺序
+        self.upvalues = []      # 上值名
+        self.upvalue_count = 0
+
+    def local_name(self, slot, pc):
+        """pc 处第 slot 个寄存器对应的局部变量名"""
+        for name, startpc, endpc in self.locals:
+            if startpc > pc:
+                break
+            if pc < endpc:
+                if slot == 0:
+                    return name
+                slot -= 1
+        return None
+
+    def upvalue_name(self, index):
+        return self.upvalues[index] if index < len(self.upvalues) else None
+
+
+# -----------------------------------------------------
+# Lua 5.1
+# -----------------------------------------------------
+# 写入 R(A) 以外寄存器或不写寄存器的指令
+_LUA51_NO_DEST = {"SETGLOBAL", "SETUPVAL", "SETTABLE", "JMP", "EQ", "LT", "LE", "TEST",
+                  "RETURN", "SETLIST", "CLOSE"}
+
+_LUA51_OPNAMES = (
+    "MOVE", "LOADK", "LOADBOOL", "LOADNIL", "GETUPVAL", "GETGLOBAL", "GETTABLE", "SETGLOBAL",
+    "SETUPVAL", "SETTABLE", "NEWTABLE", "SELF", "ADD", "SUB", "MUL", "DIV", "MOD", "POW", "UNM",
+    "NOT", "LEN", "CONCAT", "JMP", "EQ", "LT", "LE", "TEST", "TESTSET", "CALL", "TAILCALL",
+    "RETURN", "FORLOOP", "FORPREP", "TFORLOOP", "SETLIST", "CLOSE", "CLOSURE", "VARARG",
+)
+
+
+class _Lua51Reader:
+    def __init__(self, data):
+        self.data = data
+        if data[5] != 0:
+            raise ValueError("不支持的 Lua 5.1 字节码格式")
+        endian = "<" if data[6] == 1 else ">"
+        int_size, size_t_size, instruction_size, number_size = data[7:11]
+        if instruction_size != 4:
+            raise ValueError(f"不支持的指令长度：{instruction_size}")
+        self.int = struct.Struct(endian + {4: "i", 8: "q"}[int_size])
+        self.size_t = struct.Struct(endian + {4: "I", 8: "Q"}[size_t_size])
+        self.instruction = endian + "I"
+        self.number_size = number_size
+        self.pos = 12
+
+    def _read(self, st):
+        value = st.unpack_from(self.data, self.pos)[0]
+        self.pos += st.size
+        return value
+
+    def _byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def _string(self):
+        size = self._read(self.size_t)
+        if size == 0:
+            return None
+        value = self.data[self.pos:self.pos + size - 1]
+        self.pos += size
+        return value.decode("utf-8", errors="replace")
+
+    def function(self):
+        proto = Prototype()
+        self._string()                      # 源文件名
+        self.pos += self.int.size * 2       # 起止行号
+        proto.upvalue_count = self._byte()
+        self.pos += 3                       # 参数数、vararg 标记、栈大小
+
+        count = self._read(self.int)
+        code = struct.unpack_from(f"{self.instruction[0]}{count}I", self.data, self.pos)
+        self.pos += count * 4
+
+        constants = []
+        for _ in range(self._read(self.int)):
+            tp = self._byte()
+            if tp == 0:                     # nil
+                constants.append(None)
+            elif tp == 1:                   # boolean
+                self.pos += 1
+                constants.append(None)
+            elif tp == 3:                   # number
+                self.pos += self.number_size
+                constants.append(None)
+            elif tp == 4:                   # string
+                constants.append(self._string())
+            else:
+                raise ValueError(f"未知的常量类型：{tp}")
+
+        proto.children = [self.function() for _ in range(self._read(self.int))]
+
+        # 调试信息：行号表、局部变量、上值名
+        lineinfo_count = self._read(self.int)
+        self.pos += lineinfo_count * self.int.size
+        for _ in range(self._read(self.int)):
+            name = self._string()
+            startpc = self._read(self.int)
+            endpc = self._read(self.int)
+            proto.locals.append((name, startpc, endpc))
+        proto.upvalues = [self._string() for _ in range(self._read(self.int))]
+
+        self._decode(proto, code, constants)
+        return proto
+
+    @staticmethod
+    def _decode(proto, code, constants):
+        def string_constant(index):
+            value = constants[index] if index < len(constants) else None
+            return value if isinstance(value, str) else None
+
+        ops = proto.ops
+        pc = 0
+        while pc < len(code):
+            ins = code[pc]
+            op = ins & 0x3F
+            a = (ins >> 6) & 0xFF
+            c = (ins >> 14) & 0x1FF
+            b = (ins >> 23) & 0x1FF
+            bx = ins >> 14
+            name = _LUA51_OPNAMES[op] if op < len(_LUA51_OPNAMES) else None
+            next_pc = pc + 1
+
+            if name == "MOVE":
+                ops.append((pc, "move", a, b))
+            elif name == "LOADK":
+                ops.append((pc, "const", a, string_constant(bx)))
+            elif name == "GETGLOBAL":
+                ops.append((pc, "global", a, string_constant(bx)))
+            elif name == "GETUPVAL":
+                ops.append((pc, "upval", a, b))
+            elif name == "GETTABLE":
+                key = string_constant(c & 0xFF) if c & 0x100 else None
+                ops.append((pc, "field", a, b, key))
+            elif name == "SELF":
+                ops.append((pc, "move", a + 1, b))
+                ops.append((pc, "field", a, b, string_constant(c & 0xFF) if c & 0x100 else None))
+            elif name == "SETGLOBAL":
+                ops.append((pc, "setglobal", a, string_constant(bx)))
+            elif name == "SETTABLE":
+                if b & 0x100 and not c & 0x100:
+                    ops.append((pc, "setfield", a, string_constant(b & 0xFF), c))
+            elif name in ("CALL", "TAILCALL"):
+                ops.append((pc, "call", a, a + 1))
+            elif name == "CLOSURE":
+                # 紧随其后的 MOVE/GETUPVAL 是描述上值的伪指令，不执行
+                child = proto.children[bx]
+                next_pc += child.upvalue_count
+                ops.append((pc, "closure", a, child, next_pc))
+            elif name == "LOADNIL":
+                ops.append((pc, "clear", a, b))
+            elif name == "JMP":
+                proto.targets.add(pc + 1 + bx - 131071)
+            elif name in ("FORLOOP", "FORPREP"):
+                proto.targets.add(pc + 1 + bx - 131071)
+                ops.append((pc, "clear", a, None))
+            elif name not in _LUA51_NO_DEST:
+                ops.append((pc, "clear", a, None))
+            pc = next_pc
+
+
+# -----------------------------------------------------
+# LuaJIT 2.0 / 2.1
+# -----------------------------------------------------
+_LUAJIT_OPNAMES_20 = (
+    "ISLT", "ISGE", "ISLE", "ISGT", "ISEQV", "ISNEV", "ISEQS", "ISNES", "ISEQN", "ISNEN",
+    "ISEQP", "ISNEP", "ISTC", "ISFC", "IST", "ISF", "MOV", "NOT", "UNM", "LEN",
+    "ADDVN", "SUBVN", "MULVN", "DIVVN", "MODVN", "ADDNV", "SUBNV", "MULNV", "DIVNV", "MODNV",
+    "ADDVV", "SUBVV", "MULVV", "DIVVV", "MODVV", "POW", "CAT", "KSTR", "KCDATA", "KSHORT",
+    "KNUM", "KPRI", "KNIL", "UGET", "USETV", "USETS", "USETN", "USETP", "UCLO", "FNEW",
+    "TNEW", "TDUP", "GGET", "GSET", "TGETV", "TGETS", "TGETB", "TSETV", "TSETS", "TSETB",
+    "TSETM", "CALLM", "CALL", "CALLMT", "CALLT", "ITERC", "ITERN", "VARG", "ISNEXT", "RETM",
+    "RET", "RET0", "RET1", "FORI", "JFORI", "FORL", "IFORL", "JFORL", "ITERL", "IITERL",
+    "JITERL", "LOOP", "ILOOP", "JLOOP", "JMP", "FUNCF", "IFUNCF", "JFUNCF", "FUNCV", "IFUNCV",
+    "JFUNCV", "FUNCC", "FUNCCW",
+)
+
+# 2.1 增加了 ISTYPE/ISNUM 和 TGETR/TSETR
+_LUAJIT_OPNAMES_21 = (
+    _LUAJIT_OPNAMES_20[:16] + ("ISTYPE", "ISNUM") + _LUAJIT_OPNAMES_20[16:57] + ("TGETR",)
+    + _LUAJIT_OPNAMES_20[57:61] + ("TSETR",) + _LUAJIT_OPNAMES_20[61:]
+)
+
+_LUAJIT_NO_DEST = {
+    "ISLT", "ISGE", "ISLE", "ISGT", "ISEQV", "ISNEV", "ISEQS", "ISNES", "ISEQN", "ISNEN",
+    "ISEQP", "ISNEP", "IST", "ISF", "ISTYPE", "ISNUM", "USETV", "USETS", "USETN", "USETP",
+    "UCLO", "GSET", "TSETV", "TSETS", "TSETB", "TSETM", "TSETR", "RETM", "RET", "RET0", "RET1",
+    "JMP", "LOOP", "ILOOP", "JLOOP", "ISNEXT",
+}
+
+# D 为跳转偏移的指令
+_LUAJIT_JUMPS = {"JMP", "FORI", "JFORI", "FORL", "IFORL", "ITERL", "IITERL", "LOOP", "UCLO", "ISNEXT"}
+
+_BCDUMP_F_BE = 0x01
+_BCDUMP_F_STRIP = 0x02
+_BCDUMP_F_FR2 = 0x08
+
+_KGC_CHILD, _KGC_TAB, _KGC_I64, _KGC_U64, _KGC_COMPLEX, _KGC_STR = range(6)
+_KTAB_STR = 5
+
+# 调试信息中内置的局部变量名 (for 循环的隐藏变量)，编号小于该值
+_VARNAME_MAX = 7
+
+
+class _LuaJITReader:
+    def __init__(self, data):
+        self.data = data
+        version = data[3]
+        if version == 1:
+            self.opnames = _LUAJIT_OPNAMES_20
+        elif version == 2:
+            self.opnames = _LUAJIT_OPNAMES_21
+        else:
+            raise ValueError(f"不支持的 LuaJIT 字节码版本：{version}")
+        self.pos = 4
+        flags = self._uleb()
+        self.strip = bool(flags & _BCDUMP_F_STRIP)
+        self.endian = ">" if flags & _BCDUMP_F_BE else "<"
+        # FR2 (64 位 GC) 模式下调用帧多占一个寄存器，参数从 A+2 开始
+        self.arg_offset = 2 if flags & _BCDUMP_F_FR2 else 1
+        if not self.strip:
+            name_size = self._uleb()        # 源文件名
+            self.pos += name_size
+
+    def _uleb(self):
+        data = self.data
+        value = data[self.pos]
+        self.pos += 1
+        if value >= 0x80:
+            shift = 0
+            value &= 0x7F
+            while True:
+                shift += 7
+                byte = data[self.pos]
+                self.pos += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+        return value
+
+    def _skip_uleb33(self):
+        value = self.data[self.pos] >> 1
+        self.pos += 1
+        if value >= 0x40:
+            while self.data[self.pos] >= 0x80:
+                self.pos += 1
+            self.pos += 1
+
+    def _cstring(self):
+        end = self.data.index(b"\x00", self.pos)
+        value = self.data[self.pos:end].decode("utf-8", errors="replace")
+        self.pos = end + 1
+        return value
+
+    def _skip_table_value(self):
+        tp = self._uleb()
+        if tp >= _KTAB_STR:
+            self.pos += tp - _KTAB_STR
+        elif tp == 3:       # 整数
+            self._uleb()
+        elif tp == 4:       # 浮点数
+            self._uleb()
+            self._uleb()
+
+    def prototypes(self):
+        """读取全部函数原型，返回主函数 (文件中按后序排列，主函数在最后)"""
+        stack = []
+        while self.pos < len(self.data):
+            size = self._uleb()
+            if size == 0:
+                break
+            end = self.pos + size
+            stack.append(self._prototype(stack))
+            self.pos = end
+        if len(stack) != 1:
+            raise ValueError("LuaJIT 字节码结构不完整")
+        return stack[0]
+
+    def _prototype(self, stack):
+        proto = Prototype()
+        self.pos += 3                       # 标记、参数数、栈大小
+        sizeuv = self.data[self.pos]
+        self.pos += 1
+        sizekgc = self._uleb()
+        sizekn = self._uleb()
+        sizebc = self._uleb()
+        sizedbg = 0
+        if not self.strip:
+            sizedbg = self._uleb()
+            if sizedbg:
+                self._uleb()                # 起始行号
+                numline = self._uleb()
+
+        code = struct.unpack_from(f"{self.endian}{sizebc}I", self.data, self.pos)
+        self.pos += sizebc * 4
+        self.pos += sizeuv * 2
+
+        kgc = []
+        for _ in range(sizekgc):
+            tp = self._uleb()
+            if tp >= _KGC_STR:
+                kgc.append(self.data[self.pos:self.pos + tp - _KGC_STR].decode("utf-8", errors="replace"))
+                self.pos += tp - _KGC_STR
+            elif tp == _KGC_CHILD:
+                if not stack:
+                    raise ValueError("LuaJIT 字节码结构不完整")
+                child = stack.pop()
+                proto.children.append(child)
+                kgc.append(child)
+            elif tp == _KGC_TAB:
+                narray = self._uleb()
+                nhash = self._uleb()
+                for _ in range(narray + nhash * 2):
+                    self._skip_table_value()
+                kgc.append(None)
+            elif tp == _KGC_COMPLEX:
+                for _ in range(4):
+                    self._uleb()
+                kgc.append(None)
+            else:                           # I64 / U64
+                self._uleb()
+                self._uleb()
+                kgc.append(None)
+        # 字符串和子函数常量按 D 从后往前编号
+        kgc.reverse()
+
+        for _ in range(sizekn):
+            is_number = self.data[self.pos] & 1
+            self._skip_uleb33()
+            if is_number:
+                self._uleb()
+
+        if sizedbg:
+            self._debug_info(proto, sizebc, sizeuv, numline)
+
+        self._decode(proto, code, kgc)
+        return proto
+
+    def _debug_info(self, proto, sizebc, sizeuv, numline):
+        # 行号表：每条指令一项，宽度取决于函数跨越的行数
+        width = 1 if numline < 256 else 2 if numline < 65536 else 4
+        self.pos += sizebc * width
+        proto.upvalues = [self._cstring() for _ in range(sizeuv)]
+        lastpc = 0
+        while True:
+            vn = self.data[self.pos]
+            if vn < _VARNAME_MAX:
+                if vn == 0:
+                    self.pos += 1
+                    break
+                self.pos += 1
+                name = None
+            else:
+                name = self._cstring()
+            startpc = lastpc = lastpc + self._uleb()
+            endpc = startpc + self._uleb()
+            # 调试信息中的 pc 从函数头指令开始计数，文件中不包含函数头
+            proto.locals.append((name, startpc - 1, endpc - 1))
+
+    def _decode(self, proto, code, kgc):
+        def constant(d):
+            return kgc[d] if d < len(kgc) else None
+
+        def string_constant(d):
+            value = constant(d)
+            return value if isinstance(value, str) else None
+
+        ops = proto.ops
+        opnames = self.opnames
+        for pc, ins in enumerate(code):
+            op = ins & 0xFF
+            a = (ins >> 8) & 0xFF
+            c = (ins >> 16) & 0xFF
+            b = ins >> 24
+            d = ins >> 16
+            name = opnames[op] if op < len(opnames) else None
+
+            if name == "MOV":
+                ops.append((pc, "move", a, d))
+            elif name == "KSTR":
+                ops.append((pc, "const", a, string_constant(d)))
+            elif name == "GGET":
+                ops.append((pc, "global", a, string_constant(d)))
+            elif name == "UGET":
+                ops.append((pc, "upval", a, d))
+            elif name == "TGETS":
+                ops.append((pc, "field", a, b, string_constant(c)))
+            elif name == "GSET":
+                ops.append((pc, "setglobal", a, string_constant(d)))
+            elif name == "TSETS":
+                ops.append((pc, "setfield", b, string_constant(c), a))
+            elif name in ("CALL", "CALLM", "CALLT", "CALLMT"):
+                ops.append((pc, "call", a, a + self.arg_offset))
+            elif name == "FNEW":
+                child = constant(d)
+                if isinstance(child, Prototype):
+                    ops.append((pc, "closure", a, child, pc + 1))
+            elif name == "KNIL":
+                ops.append((pc, "clear", a, d))
+            else:
+                if name in _LUAJIT_JUMPS:
+                    proto.targets.add(pc + 1 + d - 0x8000)
+                if name not in _LUAJIT_NO_DEST:
+                    ops.append((pc, "clear", a, None))
+
+
+# -----------------------------------------------------
+# 调用关系
+# -----------------------------------------------------
+def parse_bytecode(data):
+    """解析字节码，返回主函数的 Prototype；格式不支持或内容损坏时抛出 ValueError"""
+    try:
+        if data.startswith(LUA51_SIGNATURE):
+            return _Lua51Reader(data).function()
+        if data.startswith(LUAJIT_SIGNATURE):
+            return _LuaJITReader(data).prototypes()
+    except (IndexError, KeyError, OverflowError, MemoryError, struct.error) as e:
+        raise ValueError(f"字节码内容不完整：{e}") from e
+    if data.startswith(b"\x1bLua") and len(data) > 4:
+        raise ValueError(f"不支持的 Lua 字节码版本：{data[4] >> 4}.{data[4] & 0x0F}")
+    raise ValueError("不是 Lua 字节码")
+
+
+def _table_path(value):
+    """寄存器中的表对应的点分名字"""
+    if value is None:
+        return None
+    if value[0] == "name":
+        return value[1]
+    if value[0] == "field":
+        return value[2]
+    return None
+
+
+def _collect(proto, key, call_graph, require):
+    regs = {}
+    child_keys = {}
+
+    def value(slot, pc):
+        name = proto.local_name(slot, pc)
+        if name:
+            return ("name", name)
+        return regs.get(slot)
+
+    for op in proto.ops:
+        pc, kind = op[0], op[1]
+        if pc in proto.targets:
+            regs.clear()
+        if kind == "move":
+            regs[op[2]] = value(op[3], pc)
+        elif kind == "const":
+            regs[op[2]] = ("str", op[3]) if op[3] is not None else None
+        elif kind == "global":
+            regs[op[2]] = ("name", op[3]) if op[3] is not None else None
+        elif kind == "upval":
+            name = proto.upvalue_name(op[3])
+            regs[op[2]] = ("name", name) if name else None
+        elif kind == "field":
+            _, _, dst, src, field = op
+            if field is None:
+                regs[dst] = None
+            else:
+                base = _table_path(value(src, pc))
+                regs[dst] = ("field", field, f"{base}.{field}" if base else None)
+        elif kind == "closure":
+            _, _, dst, child, next_pc = op
+            regs[dst] = ("closure", child)
+            name = proto.local_name(dst, next_pc)
+            if name:
+                child_keys.setdefault(child, f"[L]{name}")
+        elif kind == "setglobal":
+            stored = value(op[2], pc)
+            if op[3] and stored and stored[0] == "closure":
+                child_keys.setdefault(stored[1], f"[X]{op[3]}")
+        elif kind == "setfield":
+            _, _, table, field, src = op
+            stored = value(src, pc)
+            if field and stored and stored[0] == "closure":
+                base = _table_path(value(table, pc)) or UNKNOWN_TABLE
+                child_keys.setdefault(stored[1], f"[X]{base}.{field}")
+        elif kind == "call":
+            _, _, base, arg = op
+            func = value(base, pc)
+            if func is not None and func[0] in ("name", "field"):
+                called = func[1] if func[0] == "name" else f".{func[1]}"
+                call_graph.setdefault(key, []).append(called)
+                if func == ("name", "require"):
+                    argument = value(arg, pc)
+                    if argument is not None and argument[0] == "str":
+                        require.append(argument[1])
+            for slot in [slot for slot in regs if slot >= base]:
+                del regs[slot]
+        elif kind == "clear":
+            _, _, first, last = op
+            for slot in [slot for slot in regs if slot >= first and (last is None or slot <= last)]:
+                del regs[slot]
+
+    # 未命名的函数 (回调、匿名函数等) 的调用归入外层函数
+    for child in proto.children:
+        _collect(child, child_keys.get(child, key), call_graph, require)
+
+
+def scan_bytecode(data):
+    """从字节码恢复调用图和 require 列表，格式与源码解析结果相同
+
+    返回: (call_graph, require)
+    """
+    main = parse_bytecode(data)
+    call_graph = {}
+    require = []
+    _collect(main, "[G]", call_graph, require)
+    for from_where in call_graph:
+        call_graph[from_where] = list(set(call_graph[from_where]))
+    return call_graph, require
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 扫描检查点模块
+存储文件只在扫描结束时写出，扫描中途取消或进程崩溃时已解析的结果会全部丢失。
+扫描过程中把每个文件的解析结果追加写入检查点文件 (<存储文件>.ckpt)，下次扫描时
+内容未变的文件直接取检查点中的结果，不再重新解析：
+- 文件开头是一条头记录 (扫描路径、文件后缀、调用网络版本)，与本次扫描不同时丢弃检查点
+- 其后每条记录是一批文件的结果 [(文件节点名, 文件哈希, 状态, 调用图, require 列表, 调用位置), ...]，
+  调用位置为 lus4n.sites.node_sites 的形式
+- 每 CHECKPOINT_FILES 个文件或 CHECKPOINT_SECONDS 秒写出一批；最后一批写了一半时读取到此为止，
+  继续追加前截掉这部分
+- 扫描完成、存储文件写出后删除检查点
+"""
+
+import os
+import time
+import pickle
+
+
+# 累积这么多个文件的结果后写出一批
+CHECKPOINT_FILES = 200
+
+# 距上次写出超过这么多秒后写出一批
+CHECKPOINT_SECONDS = 30.0
+
+# 检查点文件格式的版本
+CHECKPOINT_FORMAT = 1
+
+
+def checkpoint_path(storage_path):
+    """存储文件对应的检查点文件"""
+    return f"{storage_path}.ckpt"
+
+
+class ScanCheckpoint:
+    """一次扫描的检查点"""
+
+    def __init__(self, storage_path, header, every_files=CHECKPOINT_FILES, every_seconds=CHECKPOINT_SECONDS):
+        """
+        参数:
+        - storage_path: 存储文件路径
+        - header: 头记录 (dict)，只有头记录相同的检查点才能继续使用
+        """
+        self.path = checkpoint_path(storage_path)
+        self.header = dict(header, format=CHECKPOINT_FORMAT)
+        self.every_files = every_files
+        self.every_seconds = every_seconds
+        self.count = 0          # 检查点中已写出的文件数
+        self._pending = []
+        self._last_flush = time.monotonic()
+        self._valid_size = None  # 可以继续追加的已有检查点的有效长度
+        self._file = None
+
+    def load(self):
+        """读取已有检查点中的结果
+
+        返回:
+        - {文件节点名: (文件哈希, 状态, 调用图, require 列表, 调用位置)}；没有检查点或头记录不同时为空
+        """
+        results = {}
+        if not os.path.exists(self.path):
+            return results
+        try:
+            with open(self.path, "rb") as f:
+                if pickle.load(f) != self.header:
+                    raise ValueError("检查点与本次扫描的设置不同")
+                valid_size = f.tell()
+                while True:
+                    try:
+                        batch = pickle.load(f)
+                    except EOFError:
+                        break
+                    except Exception:
+                        # 写了一半的最后一批
+                        break
+                    for relative_file_path, *result in batch:
+                        results[relative_file_path] = tuple(result)
+                    valid_size = f.tell()
+        except Exception:
+            self.remove()
+            return {}
+        self._valid_size = valid_size
+        self.count = len(results)
+        return results
+
+    def add(self, relative_file_path, file_hash, status, call_graph, require, sites):
+        """记录一个文件的结果，达到数量或时间间隔时写出"""
+        self._pending.append((relative_file_path, file_hash, status, call_graph, require, sites))
+        if (len(self._pending) >= self.every_files
+                or time.monotonic() - self._last_flush >= self.every_seconds):
+            self.flush()
+
+    def flush(self):
+        """把尚未写出的结果作为一批追加到检查点文件"""
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        if self._file is None:
+            if self._valid_size is not None and os.path.exists(self.path):
+                self._file = open(self.path, "r+b")
+                self._file.truncate(self._valid_size)
+                self._file.seek(0, os.SEEK_END)
+            else:
+                self._file = open(self.path, "wb")
+                pickle.dump(self.header, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(self._pending, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.count += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        """关闭检查点文件 (不写出尚未写出的结果)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """删除检查点文件"""
+        self.close()
+        self._pending = []
+        self._valid_size = None
+        self.count = 0
+        if os.path.exists(self.path):
+            os.remove(self.path)
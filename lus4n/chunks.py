@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 大文件切分模块
+生成的协议表、配置模块等几 MB 的文件由 luaparser 整体解析时耗时很长，多进程扫描时其余进程都在等它。
+这里用一个轻量的词法扫描在顶层语句边界把源码切成若干块，各块可以分别 (并行) 解析：
+- 切分点在顶层 (不在任何 function/if/do/repeat 块和括号内)、行首的语句开头，
+  且上一个记号能够结束一条语句，因此各块都是完整的语句序列
+- 函数定义不会跨块，块内的调用归属与整体解析时相同；块的行偏移用于还原调用位置的行号
+- 某一块有语法错误时只影响这一块
+"""
+
+import re
+
+
+# 源码超过该长度 (字符数) 时切分
+SPLIT_THRESHOLD = 1 << 20
+
+# 每块的目标长度 (字符数)，实际在达到该长度后的第一个切分点切分
+CHUNK_SIZE = 1 << 18
+
+_TOKEN = re.compile(r"""
+      (?P<comment>--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]|--[^\n]*)
+    | (?P<string>\[(?P<leq>=*)\[.*?\](?P=leq)\]|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<number>0[xX][0-9a-fA-F]*(?:\.[0-9a-fA-F]*)?(?:[pP][+-]?\d+)?|\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    | (?P<open>[({\[])
+    | (?P<close>[)}\]])
+    | (?P<op>\.\.\.|\.\.|==|~=|<=|>=|::|[-+*/%^#<>=.,;:])
+""", re.S | re.X)
+
+KEYWORDS = frozenset((
+    "and", "break", "do", "else", "elseif", "end", "false", "for", "function", "goto", "if", "in",
+    "local", "nil", "not", "or", "repeat", "return", "then", "true", "until", "while",
+))
+
+# 进入和离开块的关键字；while/for 的块由 do 开始，if 的块由 if 开始 (then/elseif 不计)
+_BLOCK_OPEN = frozenset(("function", "if", "do", "repeat"))
+_BLOCK_CLOSE = frozenset(("end", "until"))
+
+# 可以开始一条顶层语句的关键字 (其余关键字开头的行不会是新语句，例如 and/or 续行、while ... 换行 do)
+_STATEMENT_KEYWORDS = frozenset(("local", "function", "if", "for", "while", "repeat", "return", "goto"))
+
+# 可以结束一条语句的关键字
+_ENDING_KEYWORDS = frozenset(("end", "true", "false", "nil", "break"))
+
+
+def _ends_statement(kind, token):
+    if kind in ("number", "string", "close"):
+        return True
+    if kind == "name":
+        return token not in KEYWORDS or token in _ENDING_KEYWORDS
+    return token == ";"
+
+
+def statement_boundaries(source):
+    """顶层语句开头的位置 (都在行首)，不含 0"""
+    boundaries = []
+    depth = 0       # 块的嵌套层数
+    brackets = 0    # 括号的嵌套层数
+    last = None     # 上一个记号 (类型, 文本)
+    for match in _TOKEN.finditer(source):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        token = match.group(kind)
+        start = match.start()
+        if (kind == "name" and depth == 0 and brackets == 0 and last is not None
+                and (start == 0 or source[start - 1] == "\n")
+                and (token not in KEYWORDS or token in _STATEMENT_KEYWORDS)
+                and _ends_statement(*last)):
+            boundaries.append(start)
+        if kind == "name":
+            if token in _BLOCK_OPEN:
+                depth += 1
+            elif token in _BLOCK_CLOSE and depth > 0:
+                depth -= 1
+        elif kind == "open":
+            brackets += 1
+        elif kind == "close" and brackets > 0:
+            brackets -= 1
+        last = (kind, token)
+    return boundaries
+
+
+def split_source(source, chunk_size=CHUNK_SIZE):
+    """在顶层语句边界切分源码
+
+    返回:
+    - [(行偏移, 源码块), ...]，行偏移为块之前的行数；找不到切分点时只有一块
+    """
+    starts = [0]
+    for boundary in statement_boundaries(source):
+        if boundary - starts[-1] >= chunk_size:
+            starts.append(boundary)
+    # 最后一块过小时并入前一块
+    if len(starts) > 1 and len(source) - starts[-1] < chunk_size // 4:
+        starts.pop()
+    chunks = []
+    line_offset = 0
+    for start, stop in zip(starts, starts[1:] + [len(source)]):
+        text = source[start:stop]
+        chunks.append((line_offset, text))
+        line_offset += text.count("\n")
+    return chunks
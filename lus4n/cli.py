@@ -1,166 +1,417 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 命令行入口
+子命令：scan / deps / query / paths / stats / export / batch / serve / gui
+
+模块顶层只导入标准库，networkx、joblib、luaparser、pyvis 等依赖在具体子命令中按需导入，
+同时兼容旧的 -p/-q/-g 参数形式
+"""
+
 import os
+import sys
 import uuid
-import shutil
 import argparse
 import tempfile
-import webbrowser
-import networkx as nx
 
-from joblib import dump, load
-from lus4n.ui.custom_network import CustomNetwork
+from lus4n.query import QUERY_DIRECTIONS, OUTPUT_FORMATS
+
+
+SUBCOMMANDS = ("scan", "deps", "query", "paths", "stats", "export", "batch", "serve", "gui")
+
+EXPORT_FORMATS = ("graphml", "gexf", "json", "csv")
+
+
+def _default_storage():
+    """未指定存储文件时使用临时目录中的随机文件"""
+    return os.path.join(tempfile.gettempdir(), str(uuid.uuid4())) + '.jb'
+
+
+def _load_network(storage):
+    from lus4n.storage import load_call_network
+    return load_call_network(storage)
 
-from lus4n.graph import scan_path
 
+def _require_nodes(graph, *names):
+    """检查节点是否存在，不存在时以退出码 1 结束"""
+    for name in names:
+        if name not in graph:
+            print(f"no such node {name}", file=sys.stderr)
+            sys.exit(1)
 
-parser = argparse.ArgumentParser(description="Lus4n: lua call graph generation")
-parser.add_argument('-p', '--path', type=str)
-parser.add_argument('-s', '--storage', type=str)
-parser.add_argument('-q', '--query', type=str)
-parser.add_argument('-e', '--extensions', type=str, default=".lua", help="要扫描的文件后缀，多个后缀以逗号分隔，例如 '.lua,.luac'")
-parser.add_argument('-g', '--gui', action='store_true', help="以图形界面模式启动")
-args = parser.parse_args()
-temp_dir = tempfile.gettempdir()
-if args.path:
-    assert os.path.exists(args.path)
+
+# -----------------------------------------------------
+# 子命令实现
+# -----------------------------------------------------
+def cmd_scan(args, parser):
+    """扫描 Lua 代码并保存调用图"""
+    if not os.path.exists(args.path):
+        parser.error(f"路径不存在: {args.path}")
     if args.storage:
-        assert os.path.exists(os.path.dirname(args.storage))
+        storage_dir = os.path.dirname(os.path.abspath(args.storage))
+        if not os.path.isdir(storage_dir):
+            parser.error(f"存储目录不存在: {storage_dir}")
         storage = args.storage
     else:
-        storage = os.path.join(temp_dir, str(uuid.uuid4())) + '.jb'
-elif args.query:
-    assert args.storage and os.path.exists(args.storage)
-    storage = args.storage
-else:
-    temp_dir = tempfile.gettempdir()
-    storage = os.path.join(temp_dir, str(uuid.uuid4())) + '.jb'
+        storage = _default_storage()
+
+    from lus4n.ignore import IgnoreRules
+
+    extensions = [ext.strip() for ext in args.extensions.split(",")]
+    rules = IgnoreRules(args.path, args.exclude, args.include, not args.no_ignore_files)
+    entries = getattr(args, "entry", None)
+    if getattr(args, "watch", False):
+        if not os.path.isdir(args.path):
+            parser.error("监视模式只支持目录，不支持压缩包")
+        if entries:
+            parser.error("监视模式不支持按入口文件扫描")
+        _scan_and_watch(args, storage, extensions, rules)
+        return
+
+    from joblib import dump
+    from lus4n.symbol_index import SymbolIndex
+
+    if entries:
+        if not os.path.isdir(args.path):
+            parser.error("按入口文件扫描只支持目录，不支持压缩包")
+        from lus4n.lazy import scan_closure
+        try:
+            d, g, missing = scan_closure(args.path, entries, args.package_path, rules)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"scanned {len(d)} file(s) reachable from {len(entries)} entry file(s)", file=sys.stderr)
+        if missing:
+            print(f"module(s) not found: {' '.join(missing)}", file=sys.stderr)
+    else:
+        from lus4n.graph import scan_path
+        d, g = scan_path(args.path, None, False, extensions, rules, args.follow_symlinks)
+    dump(g, storage)
+    SymbolIndex.build_for_storage(storage, g)
+    print(storage)
+
+
+def _scan_and_watch(args, storage, extensions, rules):
+    """扫描后持续监视文件变化，只重新解析变化的文件并写回存储文件，Ctrl+C 退出"""
+    import threading
+    from lus4n.watch import LiveCallGraph, watch, INOTIFY_AVAILABLE
 
+    live = LiveCallGraph(os.path.abspath(args.path), extensions, rules, args.follow_symlinks)
+    live.load_storage(storage)
+    scanned, removed = live.sync()
+    live.save(storage)
+    print(storage)
+    mode = "inotify" if INOTIFY_AVAILABLE and not args.poll else "polling"
+    print(f"watching {args.path} ({mode}), parsed {scanned} file(s), removed {removed}", file=sys.stderr)
+
+    stop_event = threading.Event()
+    try:
+        watch(live, storage, stop_event, use_polling=args.poll,
+              on_change=lambda count: print(f"updated {count} file(s)", file=sys.stderr))
+    except KeyboardInterrupt:
+        # watch 在退出前保存尚未写回的修改
+        pass
+
+
+def cmd_deps(args, parser):
+    """模块依赖图：只提取 require 的快速扫描，或读取已有存储文件中的 require 信息"""
+    from lus4n import depends
 
-def cli_main():
     if args.path:
+        if not os.path.exists(args.path):
+            parser.error(f"路径不存在: {args.path}")
+        from lus4n.ignore import IgnoreRules
+
         extensions = [ext.strip() for ext in args.extensions.split(",")]
-        d, g = scan_path(args.path, None, False, extensions)
-        dump(g, storage)
-    elif args.query:
-        g: nx.DiGraph = load(args.storage)
-        if args.query in g.nodes:
-            nodes: set = nx.ancestors(g, args.query)
-            file_node_list = []
-            func_node_list = []
-            for node in nodes:
-                if "role" in g.nodes[node] and g.nodes[node]["role"] == "file":
-                    file_node_list.append(node)
-                else:
-                    func_node_list.append(node)
-            if args.query not in nodes:
-                nodes.add(args.query)
-            sg = g.subgraph(nodes)
-            
-            # 创建临时目录用于存放 HTML 和静态资源
-            temp_uuid = str(uuid.uuid4())
-            temp_output_dir = os.path.join(temp_dir, f"lus4n_{temp_uuid}")
-            os.makedirs(temp_output_dir, exist_ok=True)
-            
-            # 复制静态资源文件到临时目录
-            static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ui', 'static')
-            try:
-                shutil.copy(os.path.join(static_dir, 'vis.min.js'), temp_output_dir)
-                shutil.copy(os.path.join(static_dir, 'vis.min.css'), temp_output_dir)
-                
-                # 获取自定义模板路径
-                # 尝试多个可能的位置查找模板文件
-                template_paths = [
-                    # 1. 标准路径
-                    os.path.join(static_dir, 'template.html'),
-                    # 2. 打包环境中的路径
-                    os.path.join(os.path.dirname(sys.executable), 'lus4n', 'ui', 'static', 'template.html') if getattr(sys, 'frozen', False) else None,
-                    # 3. pyvis 包路径
-                    os.path.join(os.path.dirname(sys.executable), 'pyvis', 'templates', 'template.html') if getattr(sys, 'frozen', False) else None
-                ]
-                
-                # 过滤掉 None 值
-                template_paths = [p for p in template_paths if p]
-                
-                # 查找第一个存在的模板路径
-                template_path = next((p for p in template_paths if p and os.path.exists(p)), None)
-                
-                # 同样处理备用模板
-                fallback_template_paths = [
-                    os.path.join(static_dir, 'fallback_template.html'),
-                    os.path.join(os.path.dirname(sys.executable), 'lus4n', 'ui', 'static', 'fallback_template.html') if getattr(sys, 'frozen', False) else None,
-                    os.path.join(os.path.dirname(sys.executable), 'pyvis', 'templates', 'fallback_template.html') if getattr(sys, 'frozen', False) else None
-                ]
-                
-                fallback_template_paths = [p for p in fallback_template_paths if p]
-                fallback_template_path = next((p for p in fallback_template_paths if p and os.path.exists(p)), None)
-                
-                # 创建网络图
-                net = CustomNetwork(notebook=True)
-                net.add_node(args.query)
-                net.from_nx(sg)
-                
-                # 选择模板
-                if os.path.exists(template_path):
-                    net.set_template(template_path)
-                elif os.path.exists(fallback_template_path):
-                    net.set_template(fallback_template_path)
-                else:
-                    # 使用内联模板作为最后的备用方案
-                    print("警告：找不到模板文件，使用内联模板")
-                    inline_template = """
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8">
-<title>Lus4n Network</title>
-<script type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.min.js"></script>
-<link href="https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.min.css" rel="stylesheet" type="text/css" />
-<style type="text/css">
-    #mynetwork {
-        width: 100%;
-        height: 800px;
-        border: 1px solid lightgray;
-    }
-</style>
-</head>
-<body>
-<div id="mynetwork"></div>
-</body>
-</html>
-                    """
-                    # 创建临时模板文件
-                    temp_template_path = os.path.join(temp_output_dir, "temp_template.html")
-                    with open(temp_template_path, "w", encoding="utf-8") as f:
-                        f.write(inline_template)
-                    net.set_template(temp_template_path)
-                
-                show_path = os.path.join(temp_output_dir, "network.html")
-                net.show(show_path)
-                webbrowser.open_new_tab(f"file://{show_path}")
-            except Exception as e:
-                print(f"复制静态资源文件失败：{e}")
-                # 回退到原始方法
-                net = CustomNetwork(notebook=True)
-                net.add_node(args.query)
-                net.from_nx(sg)
-                show_path = os.path.join(temp_dir, f"{uuid.uuid4()}.html")
-                net.show(show_path)
-                webbrowser.open_new_tab(f"file://{show_path}")
+        rules = IgnoreRules(args.path, args.exclude, args.include, not args.no_ignore_files)
+        file_requires, declared_modules = depends.scan_requires(args.path, extensions, rules,
+                                                                args.follow_symlinks, args.jobs)
+        graph = depends.build_dependency_graph(file_requires, declared_modules)
+        if args.storage:
+            from lus4n.storage import save_storage
+            save_storage({
+                'file_requires': file_requires,
+                'declared_modules': declared_modules,
+                'dependency_network': graph,
+            }, args.storage)
+    else:
+        if not args.storage or not os.path.exists(args.storage):
+            parser.error("请指定扫描路径，或通过 -s 指定已存在的存储文件")
+        from lus4n.storage import load_storage
+        graph = depends.dependency_graph_of(load_storage(args.storage))
+        if graph is None:
+            print("存储文件中没有 require 信息", file=sys.stderr)
+            sys.exit(1)
+
+    if args.closure:
+        _require_nodes(graph, *args.closure)
+        files = depends.dependency_closure(graph, args.closure)
+        if args.format == "json":
+            import json
+            print(json.dumps({"roots": args.closure, "files": files}, ensure_ascii=False))
         else:
-            print(f"no such node {args.query}")
+            print("\n".join(files))
+        return
+    depends.write_dependencies(graph, args.format, sys.stdout)
+
+
+def cmd_query(args, parser):
+    """查询函数的调用者/被调用者"""
+    g = _load_network(args.storage)
+    if args.format != "html":
+        # 无界面输出：不导入任何可视化组件，不生成 HTML
+        from lus4n.query import write_query_result
+        _require_nodes(g, args.name)
+        write_query_result(g, args.name, args.direction, args.format, sys.stdout)
+        return
+
+    if args.name not in g:
+        print(f"no such node {args.name}")
+        return
+    from lus4n.ui.graph_visualizer import GraphVisualizer
+    from lus4n.query import related_nodes
+
+    nodes = set(related_nodes(g, args.name, args.direction))
+    nodes.add(args.name)
+    visualizer = GraphVisualizer()
+    graph_data = visualizer.build_graph_data(g, nodes, query_node=args.name)
+    visualizer.display_graph(visualizer.export_html(graph_data))
+
+
+def cmd_paths(args, parser):
+    """查找两个函数之间的调用路径"""
+    import networkx as nx
+    from lus4n.query import write_paths
+
+    g = _load_network(args.storage)
+    _require_nodes(g, args.source, args.target)
+    if args.all:
+        paths = []
+        for path in nx.all_simple_paths(g, args.source, args.target, cutoff=args.max_depth):
+            paths.append(path)
+            if len(paths) >= args.max_paths:
+                break
+    else:
+        try:
+            paths = [nx.shortest_path(g, args.source, args.target)]
+        except nx.NetworkXNoPath:
+            paths = []
+    write_paths(args.source, args.target, paths, args.format, sys.stdout)
+
+
+def cmd_stats(args, parser):
+    """输出调用图统计信息"""
+    from lus4n.query import graph_stats, write_stats
+
+    g = _load_network(args.storage)
+    write_stats(graph_stats(g, args.top), args.format, sys.stdout)
 
 
-def main():
+def cmd_export(args, parser):
+    """导出调用图为通用格式"""
+    import networkx as nx
+
+    g = _load_network(args.storage)
+    if args.format == "graphml":
+        nx.write_graphml(g, args.output)
+    elif args.format == "gexf":
+        nx.write_gexf(g, args.output)
+    elif args.format == "json":
+        import json
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(nx.node_link_data(g, edges="edges"), f, ensure_ascii=False)
+    else:
+        import csv
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(("source", "target", "action"))
+            for u, v, action in g.edges(data="action", default=""):
+                writer.writerow((u, v, action))
+    print(args.output)
+
+
+def cmd_batch(args, parser):
+    """批量查询：调用图只加载一次，结果以 JSON Lines 输出"""
+    from lus4n.batch import run_batch
+
+    g = _load_network(args.storage)
+    if args.input == "-":
+        run_batch(g, sys.stdin, sys.stdout, args.jobs, args.storage)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            run_batch(g, f, sys.stdout, args.jobs, args.storage)
+
+
+def cmd_serve(args, parser):
+    """启动常驻查询服务"""
+    from lus4n.server import serve
+
+    for spec in args.storage:
+        path = spec.split("=", 1)[1] if "=" in spec and not os.path.exists(spec) else spec
+        if not os.path.exists(path):
+            parser.error(f"存储文件不存在: {path}")
+    serve(args.storage, args.host, args.port, args.unix, args.verbose)
+
+
+def cmd_gui(args=None, parser=None):
+    """启动图形界面"""
+    try:
+        from lus4n.gui import main as gui_main
+    except ImportError as e:
+        print(f"无法启动图形界面：{e}")
+        print("请确保已安装 PySide6。可以使用命令 'pip install PySide6' 安装。")
+        return
+    gui_main()
+
+
+# -----------------------------------------------------
+# 参数解析
+# -----------------------------------------------------
+def _add_storage_argument(parser, required=True):
+    parser.add_argument('-s', '--storage', type=str, required=required, help="调用图存储文件路径")
+
+
+def _add_discovery_arguments(parser):
+    parser.add_argument('-x', '--exclude', type=str, action='append', default=[],
+                        help="排除模式 (.gitignore 语法，相对扫描路径)，可多次指定，例如 'build/' 或 '*.min.lua'")
+    parser.add_argument('-i', '--include', type=str, action='append', default=[],
+                        help="包含模式，可多次指定；指定后只扫描匹配的文件")
+    parser.add_argument('--no-ignore-files', action='store_true',
+                        help="不读取 .gitignore 和 .lus4nignore 文件")
+    parser.add_argument('--follow-symlinks', action='store_true',
+                        help="进入符号链接指向的目录 (会检测循环，同一文件只扫描一次)")
+
+
+def _add_watch_arguments(parser):
+    parser.add_argument('-w', '--watch', action='store_true',
+                        help="扫描完成后持续监视文件变化，增量更新调用图并写回存储文件")
+    parser.add_argument('--poll', action='store_true', help="监视时使用轮询而不是 inotify")
+
+
+def build_parser():
+    """子命令形式的参数解析器"""
+    parser = argparse.ArgumentParser(prog="lus4n", description="Lus4n: lua call graph generation")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan = subparsers.add_parser("scan", help="扫描 Lua 代码并生成调用图")
+    scan.add_argument('path', type=str, help="要扫描的 Lua 代码路径")
+    _add_storage_argument(scan, required=False)
+    scan.add_argument('-e', '--extensions', type=str, default=".lua",
+                      help="要扫描的文件后缀，多个后缀以逗号分隔，例如 '.lua,.luac'")
+    _add_discovery_arguments(scan)
+    _add_watch_arguments(scan)
+    scan.add_argument('--entry', type=str, action='append', default=[], metavar="FILE",
+                      help="按需扫描：只解析该入口文件 (可多次指定) 及其 require 能到达的文件，路径相对扫描路径")
+    scan.add_argument('--package-path', type=str, default=None,
+                      help="按需扫描时查找模块的 package.path 模板，以 ';' 分隔，相对扫描路径，"
+                           "默认 './?.lua;./?/init.lua;/usr/lib/lua/?.lua;/usr/lib/lua/?/init.lua;...'")
+    scan.set_defaults(func=cmd_scan)
+
+    deps = subparsers.add_parser("deps", help="只提取 require，快速生成模块依赖图和拓扑分层")
+    deps.add_argument('path', type=str, nargs='?',
+                      help="要扫描的 Lua 代码路径 (目录或压缩包)；省略时读取 -s 指定的存储文件中的 require 信息")
+    _add_storage_argument(deps, required=False)
+    deps.add_argument('-e', '--extensions', type=str, default=".lua",
+                      help="要扫描的文件后缀，多个后缀以逗号分隔，例如 '.lua,.luac'")
+    _add_discovery_arguments(deps)
+    deps.add_argument('-j', '--jobs', type=int, default=None, help="工作进程数，默认使用全部 CPU，1 表示不使用子进程")
+    deps.add_argument('--closure', type=str, action='append', default=[], metavar="FILE",
+                      help="只输出该文件 (可多次指定) 及其直接和间接依赖的文件列表，可作为完整扫描的范围")
+    deps.add_argument('-f', '--format', choices=("text", "json"), default="text", help="输出格式")
+    deps.set_defaults(func=cmd_deps)
+
+    query = subparsers.add_parser("query", help="查询函数的调用者或被调用者")
+    query.add_argument('name', type=str, help="要查询的函数名")
+    _add_storage_argument(query)
+    query.add_argument('-f', '--format', choices=("html",) + OUTPUT_FORMATS, default="html",
+                       help="输出格式：html 在浏览器中显示调用图，text/json/csv 直接输出到标准输出")
+    query.add_argument('-d', '--direction', choices=QUERY_DIRECTIONS, default="ancestors",
+                       help="查询方向：ancestors 为调用者，descendants 为被调用者")
+    query.set_defaults(func=cmd_query)
+
+    paths = subparsers.add_parser("paths", help="查找两个函数之间的调用路径")
+    paths.add_argument('source', type=str, help="起始函数")
+    paths.add_argument('target', type=str, help="目标函数")
+    _add_storage_argument(paths)
+    paths.add_argument('--all', action='store_true', help="输出所有简单路径 (默认只输出最短路径)")
+    paths.add_argument('--max-depth', type=int, default=10, help="--all 时的最大路径深度")
+    paths.add_argument('--max-paths', type=int, default=100, help="--all 时的最大路径数")
+    paths.add_argument('-f', '--format', choices=("text", "json"), default="text", help="输出格式")
+    paths.set_defaults(func=cmd_paths)
+
+    stats = subparsers.add_parser("stats", help="输出调用图统计信息")
+    _add_storage_argument(stats)
+    stats.add_argument('--top', type=int, default=10, help="输出的热点函数数量")
+    stats.add_argument('-f', '--format', choices=("text", "json"), default="text", help="输出格式")
+    stats.set_defaults(func=cmd_stats)
+
+    export = subparsers.add_parser("export", help="导出调用图 (graphml/gexf/json/csv 边表)")
+    _add_storage_argument(export)
+    export.add_argument('-o', '--output', type=str, required=True, help="输出文件路径")
+    export.add_argument('-f', '--format', choices=EXPORT_FORMATS, default="graphml", help="导出格式")
+    export.set_defaults(func=cmd_export)
+
+    batch = subparsers.add_parser("batch", help="从文件或标准输入读取多条查询，输出 JSON Lines 结果")
+    _add_storage_argument(batch)
+    batch.add_argument('-i', '--input', type=str, default="-",
+                       help="查询文件，每行一条 (ancestors/descendants/degree NAME 或 paths SOURCE TARGET)，默认读取标准输入")
+    batch.add_argument('-j', '--jobs', type=int, default=None, help="工作进程数，默认使用全部 CPU，1 表示不使用子进程")
+    batch.set_defaults(func=cmd_batch)
+
+    serve = subparsers.add_parser("serve", help="启动常驻内存的本地 HTTP/JSON 查询服务")
+    serve.add_argument('-s', '--storage', type=str, action='append', required=True,
+                       help="调用图存储文件路径，可多次指定；可用 name=path 指定名称")
+    serve.add_argument('--host', type=str, default="127.0.0.1", help="监听地址")
+    serve.add_argument('--port', type=int, default=8765, help="监听端口")
+    serve.add_argument('--unix', type=str, default=None, help="改为监听指定的 Unix socket 文件")
+    serve.add_argument('-v', '--verbose', action='store_true', help="输出访问日志")
+    serve.set_defaults(func=cmd_serve)
+
+    gui = subparsers.add_parser("gui", help="以图形界面模式启动")
+    gui.set_defaults(func=cmd_gui)
+    return parser
+
+
+def build_legacy_parser():
+    """旧版参数形式：lus4n -p PATH / lus4n -q NAME -s STORAGE / lus4n -g"""
+    parser = argparse.ArgumentParser(prog="lus4n", description="Lus4n: lua call graph generation",
+                                     epilog=f"子命令：{', '.join(SUBCOMMANDS)}，使用 lus4n <子命令> -h 查看帮助")
+    parser.add_argument('-p', '--path', type=str)
+    parser.add_argument('-s', '--storage', type=str)
+    parser.add_argument('-q', '--query', type=str)
+    parser.add_argument('-e', '--extensions', type=str, default=".lua", help="要扫描的文件后缀，多个后缀以逗号分隔，例如 '.lua,.luac'")
+    parser.add_argument('-f', '--format', choices=("html",) + OUTPUT_FORMATS, default="html",
+                        help="查询结果的输出格式：html 在浏览器中显示调用图，text/json/csv 直接输出到标准输出")
+    parser.add_argument('-d', '--direction', choices=QUERY_DIRECTIONS, default="ancestors",
+                        help="查询方向 (仅 text/json/csv 格式)：ancestors 为调用者，descendants 为被调用者")
+    _add_discovery_arguments(parser)
+    _add_watch_arguments(parser)
+    parser.add_argument('-g', '--gui', action='store_true', help="以图形界面模式启动")
+    return parser
+
+
+def _run_legacy(argv):
+    parser = build_legacy_parser()
+    args = parser.parse_args(argv)
     # 如果指定了 GUI 模式或没有提供任何参数，启动 GUI
     if args.gui or (not args.path and not args.query):
-        try:
-            from lus4n.gui import main as gui_main
-            gui_main()
-        except ImportError as e:
-            print(f"无法启动图形界面：{e}")
-            print("请确保已安装 PySide6。可以使用命令 'pip install PySide6' 安装。")
+        cmd_gui()
+    elif args.path:
+        cmd_scan(args, parser)
+    else:
+        if not args.storage or not os.path.exists(args.storage):
+            parser.error("查询时必须通过 -s 指定已存在的存储文件")
+        args.name = args.query
+        cmd_query(args, parser)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in SUBCOMMANDS:
+        parser = build_parser()
+        args = parser.parse_args(argv)
+        args.func(args, parser)
     else:
-        # 否则使用命令行模式
-        cli_main()
+        _run_legacy(argv)
 
 
 if __name__ == "__main__":
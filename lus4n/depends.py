@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 模块依赖模块
+不做完整的语法分析，只用一个轻量的词法扫描提取 require "x" 和 module("x")，
+快速得到文件/模块之间的依赖图和拓扑分层：
+- 词法扫描跳过注释和字符串，a.require("x") 之类的成员调用不计入
+- 字节码文件取字节码常量表中的 require 模块名
+- 目录扫描时各文件在工作进程中并行提取
+
+依赖图的节点为文件节点 (role='file'，与调用网络中的文件节点同名) 和扫描范围之外的模块
+(role='module'，例如标准库和 C 模块)，边的 action 为 require，module 属性为 require 的模块名。
+模块名按 lus4n.resolve 的模块表对应到文件
+"""
+
+import json
+import os
+import re
+import multiprocessing
+
+import networkx as nx
+
+from lus4n.bytecode import is_bytecode, scan_bytecode
+from lus4n.ignore import walk_files
+from lus4n.resolve import build_module_map, normalize_module
+
+
+# 需要提取的文件数少于该值时不使用多进程
+MULTIPROCESS_THRESHOLD = 64
+
+# 词法扫描只关心注释、字符串、名称和 . : ( 这几种记号
+_TOKEN = re.compile(r"""
+      (?P<comment>--\[(?P<ceq>=*)\[.*?\](?P=ceq)\]|--[^\n]*)
+    | (?P<long>\[(?P<leq>=*)\[(?P<body>.*?)\](?P=leq)\])
+    | (?P<string>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+    | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<op>\.\.|[.:(])
+""", re.S | re.X)
+
+
+def extract_requires(source):
+    """从源码文本中提取 require 的模块名和 module() 声明的模块名
+
+    返回:
+    - (require 列表, 模块名或 None)
+    """
+    requires = []
+    module_name = None
+    pending = None      # 刚读到的 require / module
+    paren = False       # pending 之后是否已读到 (
+    member = False      # 上一个记号是否为 . 或 :
+    for match in _TOKEN.finditer(source):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if pending is not None:
+            if kind == "op" and match.group(kind) == "(" and not paren:
+                paren = True
+                continue
+            if kind in ("string", "long"):
+                value = match.group("body") if kind == "long" else match.group(kind)[1:-1]
+                if pending == "require":
+                    requires.append(value)
+                elif module_name is None:
+                    module_name = value
+            pending = None
+        token = match.group(kind)
+        if kind == "name" and token in ("require", "module") and not member:
+            pending, paren = token, False
+        member = kind == "op" and token in (".", ":")
+    return requires, module_name
+
+
+def extract_file(raw_data):
+    """从文件内容中提取依赖，返回 (require 列表, 模块名或 None, 状态)"""
+    if raw_data.startswith(b'\xef\xbb\xbf'):
+        raw_data = raw_data[3:]
+    if is_bytecode(raw_data):
+        try:
+            return scan_bytecode(raw_data)[1], None, "成功"
+        except ValueError:
+            return [], None, "Lua 字节码文件"
+    # 模块名都是 ASCII，无法按 UTF-8 解码的字节不影响提取
+    return extract_requires(raw_data.decode("utf-8", "replace")) + ("成功",)
+
+
+def _extract_path(item):
+    relative_file_path, file_path = item
+    try:
+        with open(file_path, "rb") as f:
+            raw_data = f.read()
+    except OSError:
+        return relative_file_path, [], None, "IO 错误"
+    return (relative_file_path,) + extract_file(raw_data)
+
+
+def _iter_directory(root, extensions, rules, follow_symlinks):
+    for dir_path, _, file_list in walk_files(root, extensions, rules, follow_symlinks):
+        for file_name in file_list:
+            file_path = os.path.join(dir_path, file_name)
+            if not any(file_path.endswith(ext) for ext in extensions):
+                continue
+            relative_file_path = file_path[len(root):]
+            if not relative_file_path.startswith("/"):
+                relative_file_path = "/" + relative_file_path
+            yield relative_file_path, file_path
+
+
+def _iter_archive(archive_path, extensions, rules):
+    import zipfile
+    from lus4n.archive import iter_tar_members, list_zip_members
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as zf:
+            for relative_file_path, name in list_zip_members(archive_path, extensions, rules):
+                yield (relative_file_path,) + extract_file(zf.read(name))
+        return
+    for relative_file_path, raw_data in iter_tar_members(archive_path, extensions, rules):
+        yield (relative_file_path,) + extract_file(raw_data)
+
+
+def scan_requires(path, extensions=None, rules=None, follow_symlinks=False, jobs=None):
+    """只提取 require 的快速扫描 (目录或 tar/zip 压缩包)
+
+    参数:
+    - extensions: 文件后缀列表，默认 ['.lua']
+    - rules: lus4n.ignore.IgnoreRules，None 时使用默认规则
+    - jobs: 工作进程数，1 表示在当前进程中提取，默认使用全部 CPU；压缩包只能顺序读取，始终在当前进程中提取
+
+    返回:
+    - (各文件的 require 列表 {文件节点名: [模块名, ...]}, 各文件声明的模块名 {文件节点名: 模块名})
+    """
+    extensions = extensions or [".lua"]
+    from lus4n.archive import is_archive
+    if os.path.isfile(path) and is_archive(path):
+        results = _iter_archive(path, extensions, rules)
+    else:
+        items = list(_iter_directory(path, extensions, rules, follow_symlinks))
+        if jobs == 1 or len(items) < MULTIPROCESS_THRESHOLD:
+            results = map(_extract_path, items)
+        else:
+            with multiprocessing.Pool(jobs) as pool:
+                results = pool.map(_extract_path, items, chunksize=64)
+    file_requires, declared_modules = {}, {}
+    for relative_file_path, requires, module_name, status in results:
+        if status != "成功":
+            continue
+        file_requires[relative_file_path] = requires
+        if module_name:
+            declared_modules[relative_file_path] = module_name
+    return file_requires, declared_modules
+
+
+def build_dependency_graph(file_requires, declared_modules=None):
+    """由各文件的 require 列表构建依赖图
+
+    参数:
+    - file_requires: 各文件的 require 列表，只有其中的文件会成为文件节点
+    - declared_modules: 各文件 module() 声明的模块名
+    """
+    declared_modules = declared_modules or {}
+    module_map, _ = build_module_map({relative_file_path: declared_modules.get(relative_file_path)
+                                      for relative_file_path in file_requires})
+    graph = nx.DiGraph()
+    graph.add_nodes_from(file_requires, role="file")
+    for relative_file_path, requires in file_requires.items():
+        for required in requires:
+            module_name = normalize_module(required)
+            target = module_map.get(module_name)
+            if target is None:
+                # 扫描范围之外的模块
+                target = module_name
+                graph.add_node(target, role="module")
+            if target != relative_file_path and not graph.has_edge(relative_file_path, target):
+                graph.add_edge(relative_file_path, target, action="require", module=module_name)
+    return graph
+
+
+def dependency_graph_of(data):
+    """存储内容中的依赖图：快速扫描保存的依赖图，或由完整扫描的 require 列表和模块信息构建
+
+    没有 require 信息时返回 None
+    """
+    if not isinstance(data, dict):
+        return None
+    if isinstance(data.get('dependency_network'), nx.DiGraph):
+        return data['dependency_network']
+    if 'file_requires' not in data:
+        return None
+    declared_modules = {}
+    call_sites = data.get('call_sites')
+    for file_id, module in (getattr(call_sites, 'modules', None) or {}).items():
+        if module[0]:
+            declared_modules[call_sites.symbols.name(file_id)] = module[0]
+    return build_dependency_graph(data['file_requires'], declared_modules)
+
+
+def _file_graph(graph):
+    return graph.subgraph(node for node, role in graph.nodes(data="role") if role == "file")
+
+
+def dependency_layers(graph):
+    """文件的拓扑分层：第 0 层不依赖其他文件，第 k 层只依赖前 k 层的文件
+
+    互相依赖 (循环 require) 的文件放在同一层；每层按名称排序
+    """
+    condensed = nx.condensation(_file_graph(graph))
+    level = {}
+    for component in reversed(list(nx.topological_sort(condensed))):
+        level[component] = 1 + max((level[successor] for successor in condensed.successors(component)), default=-1)
+    layers = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for component, members in condensed.nodes(data="members"):
+        layers[level[component]].extend(members)
+    return [sorted(layer) for layer in layers]
+
+
+def dependency_cycles(graph):
+    """循环 require 的文件组，每组按名称排序"""
+    return sorted(sorted(component) for component in nx.strongly_connected_components(_file_graph(graph))
+                  if len(component) > 1)
+
+
+def dependency_closure(graph, roots):
+    """roots 及其直接和间接依赖的文件，按名称排序"""
+    closure = set()
+    for root in roots:
+        if root not in graph:
+            raise ValueError(f"依赖图中没有该文件: {root}")
+        closure.add(root)
+        closure.update(nx.descendants(graph, root))
+    return sorted(node for node in closure if graph.nodes[node].get("role") == "file")
+
+
+def write_dependencies(graph, fmt, out):
+    """输出依赖图概况：文件数、外部模块、拓扑分层和循环依赖"""
+    layers = dependency_layers(graph)
+    cycles = dependency_cycles(graph)
+    external = sorted(node for node, role in graph.nodes(data="role") if role == "module")
+    files = sum(len(layer) for layer in layers)
+    if fmt == "json":
+        json.dump({"files": files, "edges": graph.number_of_edges(), "external": external,
+                   "layers": layers, "cycles": cycles}, out, ensure_ascii=False)
+        out.write("\n")
+        return
+    out.write(f"files: {files}, edges: {graph.number_of_edges()}, external modules: {len(external)}\n")
+    for level, layer in enumerate(layers):
+        out.write(f"layer {level} ({len(layer)}): {' '.join(layer)}\n")
+    for cycle in cycles:
+        out.write(f"cycle: {' '.join(cycle)}\n")
+    if external:
+        out.write(f"external: {' '.join(external)}\n")
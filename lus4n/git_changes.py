@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - git 变化检测模块
+扫描路径位于 git 仓库中时，通过 git 的对象 ID 判断文件是否变化，无需逐个读取文件并计算哈希：
+- git ls-files -s: 已跟踪文件及其 blob 对象 ID
+- git status --porcelain: 工作区中已修改和未跟踪的文件
+- git diff --name-status <上次扫描的提交> HEAD: 上次扫描以来提交中发生变化的文件
+"""
+
+import os
+import shutil
+import subprocess
+
+
+GIT_AVAILABLE = shutil.which("git") is not None
+
+
+def _git(path, *args):
+    """在 path 下执行 git 命令，失败时返回 None"""
+    try:
+        result = subprocess.run(["git", *args], cwd=path, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout
+
+
+class GitChanges:
+    """一次扫描时的 git 状态
+
+    路径均为相对扫描路径的本地路径形式 (不以路径分隔符开头)
+    """
+
+    def __init__(self, head, blobs, dirty, untracked, committed, deleted):
+        self.head = head                # 当前 HEAD 提交
+        self.blobs = blobs              # 已跟踪文件 -> 暂存区中的 blob 对象 ID
+        self.dirty = dirty              # 工作区内容与暂存区不一致的文件
+        self.untracked = untracked      # 未跟踪 (且未被忽略) 的文件
+        self.committed = committed      # 上次扫描的提交到 HEAD 之间变化的文件，无法比较时为 None
+        self.deleted = deleted          # 上次扫描的提交到 HEAD 之间删除或重命名移走的文件
+
+    def files(self):
+        """需要考虑的全部文件：已跟踪文件和未跟踪文件"""
+        return list(self.blobs) + [f for f in self.untracked if f not in self.blobs]
+
+    def is_unchanged(self, relative_file_path, old_blobs):
+        """文件内容是否与上次扫描时相同"""
+        blob = self.blobs.get(relative_file_path)
+        if blob is None or relative_file_path in self.dirty:
+            return False
+        if self.committed is not None and relative_file_path in self.committed:
+            return False
+        return old_blobs.get(relative_file_path) == blob
+
+    def state(self):
+        """保存到存储文件中的状态，工作区有修改的文件不记录 blob (其内容与 blob 不一致)"""
+        return {
+            'head': self.head,
+            'blobs': {f: blob for f, blob in self.blobs.items() if f not in self.dirty},
+        }
+
+
+def _split_z(output):
+    return [item for item in output.decode("utf-8", "surrogateescape").split("\0") if item]
+
+
+def collect_changes(path, old_head=None):
+    """收集扫描路径下的 git 状态
+
+    参数:
+    - path: 扫描路径
+    - old_head: 上次扫描时的 HEAD 提交，提供时额外比较两次提交之间的变化
+
+    返回:
+    - GitChanges，不是 git 仓库或无法执行 git 时返回 None
+    """
+    if not GIT_AVAILABLE or not os.path.isdir(path):
+        return None
+    prefix = _git(path, "rev-parse", "--show-prefix")
+    if prefix is None:
+        return None
+    prefix = prefix.decode("utf-8", "surrogateescape").strip()
+    # 还没有任何提交的仓库没有 HEAD
+    head = _git(path, "rev-parse", "--verify", "-q", "HEAD")
+    head = head.decode().strip() if head else None
+
+    def relative(name):
+        # git 输出相对仓库根目录的路径，只保留扫描路径下的文件
+        if not name.startswith(prefix):
+            return None
+        return name[len(prefix):].replace("/", os.sep)
+
+    output = _git(path, "ls-files", "-s", "-z", "--full-name", "--", ".")
+    if output is None:
+        return None
+    blobs = {}
+    for entry in _split_z(output):
+        # <mode> <object> <stage>\t<file>
+        info, name = entry.split("\t", 1)
+        relative_file_path = relative(name)
+        if relative_file_path is not None:
+            blobs[relative_file_path] = info.split()[1]
+
+    output = _git(path, "status", "--porcelain=v1", "-z", "--untracked-files=all", "--", ".")
+    if output is None:
+        return None
+    dirty, untracked = set(), []
+    entries = iter(_split_z(output))
+    for entry in entries:
+        code, name = entry[:2], entry[3:]
+        if code[0] in "RC":
+            next(entries, None)     # 重命名/复制记录后跟随原路径
+        relative_file_path = relative(name)
+        if relative_file_path is None:
+            continue
+        if code == "??":
+            untracked.append(relative_file_path)
+        elif code[1] != " ":
+            dirty.add(relative_file_path)
+
+    committed = deleted = None
+    if old_head and head and old_head != head:
+        output = _git(path, "diff", "--name-status", "-z", "--no-renames", old_head, head, "--", ".")
+        if output is not None:
+            committed, deleted = set(), set()
+            entries = iter(_split_z(output))
+            for status in entries:
+                relative_file_path = relative(next(entries, ""))
+                if relative_file_path is None:
+                    continue
+                (deleted if status.startswith("D") else committed).add(relative_file_path)
+    elif old_head and old_head == head:
+        committed, deleted = set(), set()
+
+    return GitChanges(head, blobs, dirty, untracked, committed, deleted)
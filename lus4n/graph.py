@@ -1,7 +1,5 @@
 import os
 import json
-import xxhash
-import networkx as nx
 import re
 from tqdm import tqdm
 from loguru import logger
@@ -10,44 +8,97 @@ from luaparser.astnodes import *
 from luaparser.utils.visitor import *
 from luaparser.printers import PythonStyleVisitor
 from luaparser.ast import SyntaxException
+from lus4n.ignore import walk_files
+from lus4n.bytecode import is_bytecode, scan_bytecode
+from lus4n.builder import GraphBuilder
+from lus4n.symbols import SymbolTable
+from lus4n.sites import CallSiteTable, node_sites, count_calls
+from lus4n.resolve import resolve_calls
+from lus4n.chunks import SPLIT_THRESHOLD, split_source
 
 
-def scan_one_file(file_path: str, _format="json", _debug=False, encoding=None):
+# 没有调用位置信息 (字节码、正则表达式解析、解析失败) 时的调用位置
+NO_SITES = ((), (), None)
+
+
+def scan_one_file(file_path: str, _format="json", _debug=False, encoding=None, with_sites=False):
     if not os.path.exists(file_path):
         logger.warning(f"文件不存在：{file_path}")
-        return file_path, {}, [], "文件不存在"
+        return _result(file_path, {}, [], "文件不存在", NO_SITES, with_sites)
     
+    try:
+        # 首先尝试二进制方式读取
+        with open(file_path, "rb") as f:
+            raw_data = f.read()
+    except IOError as e:
+        logger.error(f"[IO 错误] 跳过文件：{os.path.basename(file_path)} - {str(e)}")
+        return _result(file_path, {}, [], "IO 错误", NO_SITES, with_sites)
+    return scan_source(file_path, raw_data, _format, _debug, encoding, with_sites)
+
+
+def _result(file_path, call_graph, require, status, sites, with_sites):
+    if with_sites:
+        return file_path, call_graph, require, status, sites
+    return file_path, call_graph, require, status
+
+
+def scan_source(file_path: str, raw_data: bytes, _format="json", _debug=False, encoding=None, with_sites=False):
+    """解析已读入内存的文件内容
+
+    file_path 只用于日志和返回值，可以是压缩包内成员的虚拟路径
+
+    with_sites 为 True 时多返回一项调用位置 (调用列表, 定义列表, 模块信息)，见 Lus4nVisitor.sites()
+    """
+    file_path, call_graph, require, status, sites = _scan_source(file_path, raw_data, _format, _debug, encoding)
+    return _result(file_path, call_graph, require, status, sites, with_sites)
+
+
+def _decode(raw_data, encoding=None):
+    """按指定编码或依次尝试常见编码解码源码，都失败时返回 None"""
     # 尝试不同的编码方式
     encodings = [encoding] if encoding else ['utf-8', 'gb2312', 'gbk', 'latin-1']
+    for encoding in encodings:
+        try:
+            return raw_data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def _scan_source(file_path, raw_data, _format, _debug, encoding):
     source = None
     
     try:
-        # 首先尝试二进制方式读取
-        with open(file_path, "rb") as f:
-            raw_data = f.read()
-            
         # 处理 BOM（字节顺序标记）
         if raw_data.startswith(b'\xef\xbb\xbf'):  # UTF-8-BOM
             raw_data = raw_data[3:]
             
-        # 只检查是否为 Lua 字节码，不是字节码就当作文本处理
-        if raw_data.startswith(b"\x1bL"):
-            logger.warning(f"[Lua 字节码文件] 跳过文件：{os.path.basename(file_path)}")
-            return file_path, {}, [], "Lua 字节码文件"
+        # Lua 字节码 (luac / LuaJIT) 直接从函数原型和常量表恢复调用关系，不是字节码就当作文本处理
+        if is_bytecode(raw_data):
+            try:
+                call_graph, require = scan_bytecode(raw_data)
+            except ValueError as e:
+                logger.warning(f"[Lua 字节码文件] 跳过文件：{os.path.basename(file_path)} - {str(e)}")
+                return file_path, {}, [], "Lua 字节码文件", NO_SITES
+            if _format == "json":
+                logger.success(json.dumps(call_graph, indent=4))
+            return file_path, call_graph, require, "成功", NO_SITES
             
         # 直接进行编码检测，不再检查二进制特征
-        for encoding in encodings:
-            try:
-                source = raw_data.decode(encoding)
-                break
-            except UnicodeDecodeError:
-                continue
+        source = _decode(raw_data, encoding)
         
         # 如果所有编码都失败，使用 latin-1 作为后备（它不会失败，但可能显示乱码）
         if source is None:
             source = raw_data.decode('latin-1')
             logger.warning(f"[无法解码] 跳过文件：{os.path.basename(file_path)}")
-            return file_path, {}, [], "编码解析失败"
+            return file_path, {}, [], "编码解析失败", NO_SITES
+        
+        # 大文件在顶层语句边界切分，逐块解析后合并，某一块的语法错误不影响其他块
+        if len(source) >= SPLIT_THRESHOLD:
+            chunks = split_source(source)
+            if len(chunks) > 1:
+                results = [parse_chunk(file_path, text, line_offset) for line_offset, text in chunks]
+                return (file_path,) + merge_chunks(file_path, results, _format)
             
         # 禁用输出中不必要的打印，避免编码错误
         import sys
@@ -63,35 +114,131 @@ def scan_one_file(file_path: str, _format="json", _debug=False, encoding=None):
             _visitor = Lus4nVisitor(4, source)
             _visitor.visit(tree)
             call_graph, require = _visitor.output(_format=_format)
-            return file_path, call_graph, require, "成功"
+            return file_path, call_graph, require, "成功", _visitor.sites()
         except SyntaxException:
             sys.stdout = original_stdout  # 恢复正常输出
             logger.warning(f"[语法错误，尝试使用正则表达式解析] 文件：{os.path.basename(file_path)}")
             # 使用正则表达式提取函数和 require 语句
-            return extract_info_with_regex(file_path, source, _format)
+            return extract_info_with_regex(file_path, source, _format) + (NO_SITES,)
         except Exception as e:
             sys.stdout = original_stdout  # 恢复正常输出
             logger.error(f"[解析错误，尝试使用正则表达式解析] 文件：{os.path.basename(file_path)} - {str(e)}")
             # 使用正则表达式提取函数和 require 语句
-            return extract_info_with_regex(file_path, source, _format)
-    except IOError as e:
-        logger.error(f"[IO 错误] 跳过文件：{os.path.basename(file_path)} - {str(e)}")
-        return file_path, {}, [], "IO 错误"
+            return extract_info_with_regex(file_path, source, _format) + (NO_SITES,)
     except Exception as e:
         logger.error(f"[未知错误] 跳过文件：{os.path.basename(file_path)} - {str(e)}")
-        return file_path, {}, [], "未知错误"
+        return file_path, {}, [], "未知错误", NO_SITES
+
+
+def source_chunks(file_path, encoding=None):
+    """需要切分的大文件在顶层语句边界切分后的源码块 [(行偏移, 源码), ...]
+
+    文件较小、是字节码、无法读取或解码、找不到切分点时返回 None (按整个文件解析)
+    """
+    try:
+        if os.path.getsize(file_path) < SPLIT_THRESHOLD:
+            return None
+        with open(file_path, "rb") as f:
+            raw_data = f.read()
+    except OSError:
+        return None
+    if raw_data.startswith(b'\xef\xbb\xbf'):
+        raw_data = raw_data[3:]
+    if is_bytecode(raw_data):
+        return None
+    source = _decode(raw_data, encoding)
+    if source is None or len(source) < SPLIT_THRESHOLD:
+        return None
+    chunks = split_source(source)
+    return chunks if len(chunks) > 1 else None
+
+
+def parse_chunk(file_path, text, line_offset=0):
+    """解析源码中的一块 (lus4n.chunks.split_source 的结果)，可以在工作进程中执行
+
+    返回:
+    - (调用图, require 列表, 调用位置, 是否由语法分析得到)；调用位置的行号已加上行偏移，
+      语法错误时这一块使用正则表达式解析，没有调用位置
+    """
+    import sys
+    original_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        tree = ast.parse(text)
+        sys.stdout = original_stdout
+        _visitor = Lus4nVisitor(4, text)
+        _visitor.visit(tree)
+    except Exception as e:
+        sys.stdout = original_stdout
+        logger.warning(f"[语法错误，该块使用正则表达式解析] 文件：{os.path.basename(file_path)} "
+                       f"第 {line_offset + 1} 行起 - {str(e)}")
+        _, call_graph, require, _ = extract_info_with_regex(file_path, text, None)
+        return call_graph, require, NO_SITES, False
+    call_graph, require = _visitor.output(_format=None)
+    calls, definitions, module = _visitor.sites()
+    if line_offset:
+        calls = [(tmp_name, called, line + line_offset, column, qualified)
+                 for tmp_name, called, line, column, qualified in calls]
+        definitions = [(tmp_name, line + line_offset, column) for tmp_name, line, column in definitions]
+    return call_graph, require, (calls, definitions, module), True
+
+
+def merge_chunks(file_path, results, _format=None):
+    """合并各块的解析结果 (按块的顺序)
 
+    返回:
+    - (调用图, require 列表, 状态, 调用位置)；所有块都有语法错误时状态与整个文件使用正则表达式解析时相同
+    """
+    merged = {}
+    require, calls, definitions = [], [], []
+    module_name, returned, aliases = None, None, {}
+    failed = 0
+    for call_graph, chunk_require, (chunk_calls, chunk_definitions, module), parsed in results:
+        for from_where, called_list in call_graph.items():
+            merged.setdefault(from_where, set()).update(called_list)
+        require.extend(chunk_require)
+        calls.extend(chunk_calls)
+        definitions.extend(chunk_definitions)
+        if module is not None:
+            # module() 取第一个声明，返回的表取最后一块的 return
+            module_name = module_name or module[0]
+            returned = module[1] or returned
+            aliases.update(module[2])
+        if not parsed:
+            failed += 1
+    call_graph = {from_where: list(called) for from_where, called in merged.items()}
+    if failed == len(results):
+        return call_graph, require, "使用正则表达式解析", NO_SITES
+    if failed:
+        logger.warning(f"[部分语法错误] 文件：{os.path.basename(file_path)} - {failed}/{len(results)} 块使用正则表达式解析")
+    if _format == "json":
+        logger.success(json.dumps(call_graph, indent=4))
+    return call_graph, require, "成功", (calls, definitions, (module_name, returned, aliases))
 
-def scan_path(dirt_path: str, _format="json", _debug=False, extensions=None):
-    whole_call_graph = {}
-    whole_call_network = nx.DiGraph()
+
+def scan_path(dirt_path: str, _format="json", _debug=False, extensions=None, rules=None, follow_symlinks=False):
+    """扫描目录 (或 tar/zip 固件压缩包) 下的 Lua 文件
+
+    参数:
+    - rules: lus4n.ignore.IgnoreRules，忽略规则，None 时使用默认规则 (.gitignore/.lus4nignore)
+    - follow_symlinks: 是否进入指向目录的符号链接
+    """
+    collector = CallGraphCollector()
     will_scan = []
     
     # 如果没有指定后缀，默认使用 .lua
     if extensions is None:
         extensions = [".lua"]
+    
+    # 固件压缩包：直接从压缩包中读取成员解析，无需解压到磁盘
+    from lus4n.archive import is_archive, scan_archive
+    if os.path.isfile(dirt_path) and is_archive(dirt_path):
+        for relative_file_path, file_path, call_graph, require, status, _, sites in scan_archive(
+                dirt_path, extensions, rules, _format=_format):
+            collector.add_file(relative_file_path, call_graph, require, sites)
+        return collector.build()
         
-    for path, dir_list, file_list in os.walk(dirt_path):
+    for path, dir_list, file_list in walk_files(dirt_path, extensions, rules, follow_symlinks):
         for file_name in file_list:
             file_path = os.path.join(path, file_name)
             
@@ -108,9 +255,9 @@ def scan_path(dirt_path: str, _format="json", _debug=False, extensions=None):
                     logger.warning(f"读取文件错误：{file_path} [{str(e)}]")
                     continue
                 
-                # 只检查是否为 Lua 字节码，不是字节码就当作文本处理
-                if content.startswith(b"\x1bL"):
-                    logger.warning(f"跳过 Lua 字节码文件：{file_path}")
+                # Lua 字节码由 scan_one_file 解析，不需要检测编码
+                if is_bytecode(content):
+                    will_scan.append(file_path)
                     continue
                     
                 # 直接进行编码检测，不再检查二进制特征
@@ -141,38 +288,40 @@ def scan_path(dirt_path: str, _format="json", _debug=False, extensions=None):
                 logger.warning(f"未知错误：{file_path} [{e}]")
             
     for file_path in tqdm(will_scan):
-        _, call_graph, require, status = scan_one_file(file_path, _format, _debug)
+        _, call_graph, require, status, sites = scan_one_file(file_path, _format, _debug, with_sites=True)
         relative_file_path = file_path[len(dirt_path):]
         if not relative_file_path.startswith("/"):
             relative_file_path = "/" + relative_file_path
-        whole_call_graph[relative_file_path] = call_graph
-        whole_call_network.add_node(relative_file_path, role='file')
-        package_name = os.path.basename(file_path).replace(".lua", "")
-        for tmp_name in call_graph.keys():
-            if tmp_name == "[G]":
-                default_main = f"{package_name}.main.{xxhash.xxh32(file_path).hexdigest()}"
-                for called in call_graph["[G]"]:
-                    whole_call_network.add_edge(relative_file_path, default_main, action='export')
-                    whole_call_network.add_edge(default_main, called, action="call")
-            if tmp_name.startswith("[X]"):
-                exported = tmp_name.replace("[X]", "")
-                sub_names = exported.split('.')
-                if len(sub_names) > 1:
-                    father = sub_names[0]
-                    left = exported[len(father):]
-                    # TODO: 或许也可以用 M./_M.来筛选导出函数？
-                    _exported = f"{package_name}{left}" if father not in require else exported
-                else:
-                    _exported = exported
-                whole_call_network.add_edge(relative_file_path, _exported, action="export")
-                for called in call_graph[tmp_name]:
-                    whole_call_network.add_edge(_exported, called, action='call')
-            if tmp_name.startswith("[L]"):
-                defined = tmp_name.replace("[L]", "")
-                whole_call_network.add_edge(relative_file_path, defined, action="define")
-                for called in call_graph[tmp_name]:
-                    whole_call_network.add_edge(defined, called, action='call')
-    return whole_call_graph, whole_call_network
+        collector.add_file(relative_file_path, call_graph, require, node_sites(relative_file_path, sites, require))
+    return collector.build()
+
+
+class CallGraphCollector:
+    """汇总各文件的解析结果并构建调用网络 (命令行扫描和按需扫描共用)
+
+    名称都取自同一个符号表，调用图和调用网络共享同一批字符串对象
+    """
+
+    def __init__(self):
+        self.symbols = SymbolTable()
+        self.builder = GraphBuilder(symbols=self.symbols)
+        self.call_sites = CallSiteTable(self.symbols)
+        self.whole_call_graph = {}
+        self.file_requires = {}
+
+    def add_file(self, relative_file_path, call_graph, require, sites):
+        """加入一个文件的解析结果，sites 为 node_sites() 形式的调用位置，调用次数作为边的权重"""
+        symbols = self.symbols
+        self.whole_call_graph[symbols.intern(relative_file_path)] = symbols.intern_call_graph(call_graph)
+        self.builder.add_file(relative_file_path, call_graph, require, count_calls(sites[0]))
+        if call_graph:
+            self.call_sites.add_file(relative_file_path, sites)
+            self.file_requires[relative_file_path] = require
+
+    def build(self):
+        """返回 (各文件的调用图, 调用网络)；跨文件解析得到的调用以 resolve 边加入调用网络"""
+        network = self.builder.build()
+        return self.whole_call_graph, resolve_calls(self.call_sites, self.file_requires).apply(network)
 
 
 class Lus4nVisitor(PythonStyleVisitor):
@@ -184,6 +333,12 @@ class Lus4nVisitor(PythonStyleVisitor):
         self.stack_for_function = []
         self.call_graph = {}
         self.require = []
+        self.calls = []          # 每一次调用：(调用方键, 被调用函数, 行, 列, 限定名)
+        self.definitions = []    # 每个函数定义：([X]/[L] 键, 行, 列)
+        # 跨文件解析所需的模块信息
+        self.module_name = None  # 顶层 module("x", ...) 声明的模块名
+        self.returned = None     # 顶层 return M 返回的表名
+        self.aliases = {}        # local x = require "y" 形式的别名 {x: y}
 
     @visitor(str)
     def visit(self, node):
@@ -276,29 +431,45 @@ class Lus4nVisitor(PythonStyleVisitor):
                 self.stack_for_function.append(f"[X]{'.'.join(func_name)}")
             elif isinstance(node, LocalFunction):
                 self.stack_for_function.append(f"[L]{'.'.join(func_name)}")
+            self.definitions.append((self.stack_for_function[-1],) + self.position(node))
 
-        for attr, attrValue in node.__dict__.items():
+        if isinstance(node, Call):
+            if len(self.stack_for_function) > 0:
+                from_where = self.stack_for_function[-1]
+            else:
+                from_where = "[G]"
+            if from_where not in self.call_graph.keys():
+                self.call_graph[from_where] = []
+            if isinstance(node.func, Index):
+                try:
+                    called_func_name = self.source[node.func.start_char: node.func.stop_char + 1]
+                    self.call_graph[from_where].append(called_func_name)
+                    self.calls.append((from_where, called_func_name) + self.position(node)
+                                      + (self.qualified_name(node.func),))
+                except TypeError as e:
+                    logger.warning(f"Oops, TypeError {e}")
+                # logger.debug(f"Index: {from_where} -> {self.source[node.func.start_char: node.func.stop_char + 1]}")
+            elif isinstance(node.func, Name):
+                self.call_graph[from_where].append(node.func.id)
+                self.calls.append((from_where, node.func.id) + self.position(node) + (node.func.id,))
+                if node.func.id == "require" and len(node.args) > 0 and hasattr(node.args[0], "s"):
+                    self.require.append(node.args[0].s)
+                elif (node.func.id == "module" and from_where == "[G]" and len(node.args) > 0
+                      and isinstance(node.args[0], String)):
+                    self.module_name = node.args[0].s
+                # logger.debug(f"Name: {from_where} -> {node.func.id}")
 
-            if isinstance(node, Call):
-                if len(self.stack_for_function) > 0:
-                    from_where = self.stack_for_function[-1]
-                else:
-                    from_where = "[G]"
-                if from_where not in self.call_graph.keys():
-                    self.call_graph[from_where] = []
-                if isinstance(node.func, Index):
-                    try:
-                        called_func_name = self.source[node.func.start_char: node.func.stop_char + 1]
-                        self.call_graph[from_where].append(called_func_name)
-                    except TypeError as e:
-                        logger.warning(f"Oops, TypeError {e}")
-                    # logger.debug(f"Index: {from_where} -> {self.source[node.func.start_char: node.func.stop_char + 1]}")
-                elif isinstance(node.func, Name):
-                    self.call_graph[from_where].append(node.func.id)
-                    if node.func.id == "require" and len(node.args) > 0 and hasattr(node.args[0], "s"):
-                        self.require.append(node.args[0].s)
-                    # logger.debug(f"Name: {from_where} -> {node.func.id}")
+        if isinstance(node, (LocalAssign, Assign)):
+            for target, value in zip(node.targets, node.values):
+                module = self.required_module(value)
+                if module is not None and isinstance(target, Name):
+                    self.aliases[target.id] = module
+
+        if (isinstance(node, Return) and not self.stack_for_function
+                and len(node.values) == 1 and isinstance(node.values[0], Name)):
+            self.returned = node.values[0].id
 
+        for attr, attrValue in node.__dict__.items():
             if not attr.startswith(("_", "comments")):
                 if isinstance(attrValue, Node) or isinstance(attrValue, list):
                     res += (
@@ -324,6 +495,48 @@ class Lus4nVisitor(PythonStyleVisitor):
             logger.success(json.dumps(self.call_graph, indent=4))
         return self.call_graph, self.require
 
+    def sites(self):
+        """调用位置：(调用列表 [(调用方键, 被调用函数, 行, 列, 限定名), ...], 定义列表 [(键, 行, 列), ...], 模块信息)
+
+        与 output() 不同，同一调用出现多次时每次都记录；行号和列号从 1 开始。
+        限定名是被调用函数的点分写法 (例如 http.write)，无法静态确定时为 None；
+        模块信息为 (module() 声明的模块名, 顶层 return 的表名, require 别名 {局部变量: 模块})，
+        供 lus4n.resolve 把调用链接到其他文件中定义的函数
+        """
+        return self.calls, self.definitions, (self.module_name, self.returned, self.aliases)
+
+    def qualified_name(self, node):
+        """a.b.c / a["b"].c 形式的表达式的点分名称，其他形式返回 None"""
+        if isinstance(node, Name):
+            return node.id
+        if isinstance(node, Index):
+            base = self.qualified_name(node.value)
+            if base is None:
+                return None
+            if isinstance(node.idx, Name) and node.notation == IndexNotation.DOT:
+                return f"{base}.{node.idx.id}"
+            if isinstance(node.idx, String) and isinstance(node.idx.s, str):
+                return f"{base}.{node.idx.s}"
+        return None
+
+    @staticmethod
+    def required_module(node):
+        """require "x" / require("x") 调用的模块名，其他表达式返回 None"""
+        if (isinstance(node, Call) and isinstance(node.func, Name) and node.func.id == "require"
+                and len(node.args) > 0 and isinstance(node.args[0], String) and isinstance(node.args[0].s, str)):
+            return node.args[0].s
+        return None
+
+    def position(self, node):
+        """节点在源码中的 (行, 列)，从 1 开始；没有位置信息时为 (0, 0)"""
+        token = getattr(node, "_first_token", None)
+        if token is not None:
+            return token.line, token.column + 1
+        if node.start_char is not None:
+            line_start = self.source.rfind("\n", 0, node.start_char) + 1
+            return self.source.count("\n", 0, node.start_char) + 1, node.start_char - line_start + 1
+        return 0, 0
+
     def walk_func_name(self, node: Node, name: list):
         if isinstance(node, Name):
             name.append(node.id)
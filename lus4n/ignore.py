@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 文件发现模块
+按 .gitignore 语法的忽略规则遍历扫描路径：
+- 各级目录中的 .gitignore 和 .lus4nignore 文件 (只作用于所在目录及其子目录)
+- 调用方指定的排除模式 (优先级最高) 和包含模式 (指定后只扫描匹配的文件)
+- 被忽略的目录在遍历时直接剪枝，不再进入
+- 跟随符号链接时检测目录循环，同一文件 (相同 inode) 通过不同路径出现时只返回一次
+"""
+
+import os
+import re
+
+
+IGNORE_FILE_NAMES = (".gitignore", ".lus4nignore")
+
+# 始终排除的版本控制目录
+DEFAULT_EXCLUDES = (".git/", ".svn/", ".hg/")
+
+
+def _translate(pattern):
+    """把 gitignore 通配模式转换为正则表达式 (匹配以 '/' 分隔的相对路径)"""
+    result = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            if pattern.startswith("**", i):
+                i += 2
+                if i < n and pattern[i] == "/":
+                    # '**/' 匹配零个或多个目录
+                    result.append("(?:.*/)?")
+                    i += 1
+                else:
+                    result.append(".*")
+                continue
+            result.append("[^/]*")
+        elif c == "?":
+            result.append("[^/]")
+        elif c == "[":
+            j = pattern.find("]", i + 2)
+            if j == -1:
+                result.append(re.escape(c))
+            else:
+                body = pattern[i + 1:j].replace("\\", "\\\\")
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                result.append(f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+    return "".join(result)
+
+
+class _Rule:
+    """一条忽略规则"""
+
+    __slots__ = ("base", "regex", "negate", "dir_only")
+
+    def __init__(self, base, regex, negate, dir_only):
+        self.base = base            # 规则所在目录 (相对扫描路径，根目录为 '')
+        self.regex = regex
+        self.negate = negate        # '!' 开头：重新包含
+        self.dir_only = dir_only    # '/' 结尾：只匹配目录
+
+
+def parse_pattern(line, base=""):
+    """解析一行 gitignore 模式，空行和注释返回 None"""
+    line = line.rstrip("\r\n")
+    # 行尾未转义的空格被忽略
+    while line.endswith(" ") and not line.endswith("\\ "):
+        line = line[:-1]
+    if not line or line.startswith("#"):
+        return None
+    negate = line.startswith("!")
+    if negate:
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # 含有 '/' 的模式相对规则所在目录匹配，否则匹配任意层级的文件名
+    if "/" in line:
+        regex = _translate(line.lstrip("/"))
+    else:
+        regex = "(?:.*/)?" + _translate(line)
+    return _Rule(base, re.compile(regex + r"\Z", re.DOTALL), negate, dir_only)
+
+
+def _match(rules, rel_path, is_dir):
+    """按规则判断路径是否被忽略，后出现的规则优先；没有规则匹配时返回 None"""
+    for rule in reversed(rules):
+        if rule.dir_only and not is_dir:
+            continue
+        path = rel_path[len(rule.base) + 1:] if rule.base else rel_path
+        if rule.regex.match(path):
+            return not rule.negate
+    return None
+
+
+class IgnoreRules:
+    """扫描路径的忽略规则，各目录的忽略文件在首次用到时读取并缓存"""
+
+    def __init__(self, root, excludes=(), includes=(), use_ignore_files=True):
+        """
+        参数:
+        - root: 扫描路径
+        - excludes: 排除模式 (gitignore 语法，相对扫描路径)，优先于忽略文件
+        - includes: 包含模式，指定后只保留匹配的文件
+        - use_ignore_files: 是否读取 .gitignore 和 .lus4nignore
+        """
+        self.root = root
+        self.use_ignore_files = use_ignore_files
+        defaults = [parse_pattern(p) for p in DEFAULT_EXCLUDES]
+        self.excludes = [rule for rule in (parse_pattern(p) for p in excludes) if rule]
+        self.includes = [rule for rule in (parse_pattern(p) for p in includes) if rule]
+        self._dir_rules = {"": tuple(defaults) + self._read_ignore_files("")}
+        self._dir_ignored = {}
+
+    def _read_ignore_files(self, rel_dir):
+        if not self.use_ignore_files:
+            return ()
+        rules = []
+        directory = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        for name in IGNORE_FILE_NAMES:
+            try:
+                with open(os.path.join(directory, name), "r", encoding="utf-8", errors="replace") as f:
+                    rules.extend(rule for rule in (parse_pattern(line, rel_dir) for line in f) if rule)
+            except OSError:
+                continue
+        return tuple(rules)
+
+    def rules_for(self, rel_dir):
+        """目录中条目适用的规则 (根目录及各级父目录的忽略文件)"""
+        rules = self._dir_rules.get(rel_dir)
+        if rules is None:
+            parent = rel_dir.rpartition("/")[0]
+            rules = self.rules_for(parent) + self._read_ignore_files(rel_dir)
+            self._dir_rules[rel_dir] = rules
+        return rules
+
+    def ignored(self, rel_path, is_dir, rules=None):
+        """单个条目是否被忽略 (不检查父目录)"""
+        # 排除模式优先于忽略文件，其中的 '!' 规则可以重新包含被忽略文件排除的路径
+        result = _match(self.excludes, rel_path, is_dir)
+        if result is None:
+            if rules is None:
+                rules = self.rules_for(rel_path.rpartition("/")[0])
+            result = _match(rules, rel_path, is_dir)
+        return bool(result)
+
+    def included(self, rel_path):
+        """文件是否满足包含模式"""
+        return not self.includes or bool(_match(self.includes, rel_path, False))
+
+    def relative(self, path):
+        """绝对路径转换为相对扫描路径、以 '/' 分隔的形式"""
+        rel_path = os.path.relpath(path, self.root)
+        return "" if rel_path == "." else rel_path.replace(os.sep, "/")
+
+    def dir_ignored(self, rel_dir):
+        """目录自身或任一父目录是否被忽略 (结果按目录缓存)"""
+        if not rel_dir:
+            return False
+        result = self._dir_ignored.get(rel_dir)
+        if result is None:
+            parent = rel_dir.rpartition("/")[0]
+            result = self.dir_ignored(parent) or self.ignored(rel_dir, True)
+            self._dir_ignored[rel_dir] = result
+        return result
+
+    def accepts_relative(self, rel_path):
+        """相对路径 ('/' 分隔) 的文件是否应当被扫描：各级父目录和自身都未被忽略，且满足包含模式"""
+        if rel_path.startswith("../") or self.dir_ignored(rel_path.rpartition("/")[0]):
+            return False
+        return not self.ignored(rel_path, False) and self.included(rel_path)
+
+    def accepts(self, file_path):
+        """扫描路径下的文件是否应当被扫描"""
+        return self.accepts_relative(self.relative(file_path))
+
+
+class DiscoveryStats:
+    """文件发现过程的统计"""
+
+    __slots__ = ("files", "matched", "ignored", "pruned_dirs", "duplicates", "loops")
+
+    def __init__(self):
+        self.files = 0          # 遍历到的文件数
+        self.matched = 0        # 返回的文件数
+        self.ignored = 0        # 被忽略规则或包含模式排除的文件数
+        self.pruned_dirs = 0    # 被剪枝的目录数
+        self.duplicates = 0     # 通过其他路径重复出现的文件数
+        self.loops = 0          # 跳过的符号链接目录循环数
+
+
+def walk_files(root, extensions=None, rules=None, follow_symlinks=False, stats=None):
+    """遍历扫描路径，按 os.walk 的形式返回 (目录, 子目录名列表, 文件名列表)
+
+    与 os.walk 不同，文件名列表只包含需要扫描的文件 (符合后缀、未被忽略、未重复)，
+    被忽略的目录不会进入
+
+    参数:
+    - root: 扫描路径
+    - extensions: 文件后缀列表，None 表示不按后缀过滤
+    - rules: IgnoreRules，None 时使用默认规则
+    - follow_symlinks: 是否进入指向目录的符号链接 (会检测循环)
+    - stats: DiscoveryStats，用于收集统计信息
+    """
+    if rules is None:
+        rules = IgnoreRules(root)
+    if stats is None:
+        stats = DiscoveryStats()
+    seen_files = set()
+    seen_dirs = set()
+    try:
+        st = os.stat(root)
+        seen_dirs.add((st.st_dev, st.st_ino))
+    except OSError:
+        return
+
+    stack = [(root, "")]
+    while stack:
+        dir_path, rel_dir = stack.pop()
+        try:
+            dir_dev = os.stat(dir_path).st_dev
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        # 按名称排序保证结果稳定，同一文件的多条路径中优先保留非符号链接的路径
+        entries.sort(key=lambda entry: (entry.is_symlink(), entry.name))
+
+        dir_rules = rules.rules_for(rel_dir)
+        dir_names, file_names = [], []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=follow_symlinks)
+            except OSError:
+                continue
+
+            if is_dir:
+                if rules.ignored(rel_path, True, dir_rules):
+                    stats.pruned_dirs += 1
+                    continue
+                if entry.is_symlink():
+                    # 符号链接目录：通过 (设备, inode) 检测循环和重复
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    key = (st.st_dev, st.st_ino)
+                    if key in seen_dirs:
+                        stats.loops += 1
+                        continue
+                    seen_dirs.add(key)
+                elif follow_symlinks:
+                    st = entry.stat(follow_symlinks=False)
+                    seen_dirs.add((st.st_dev, st.st_ino))
+                dir_names.append(entry.name)
+                continue
+
+            if entry.is_symlink() and not entry.is_file():
+                continue
+            stats.files += 1
+            if extensions is not None and not any(entry.name.endswith(ext) for ext in extensions):
+                continue
+            if rules.ignored(rel_path, False, dir_rules) or not rules.included(rel_path):
+                stats.ignored += 1
+                continue
+            try:
+                if entry.is_symlink():
+                    st = entry.stat()
+                    key = (st.st_dev, st.st_ino)
+                else:
+                    # 普通文件与所在目录位于同一设备，inode 直接取自目录项，无需额外的 stat
+                    key = (dir_dev, entry.inode())
+            except OSError:
+                continue
+            if key in seen_files:
+                stats.duplicates += 1
+                continue
+            seen_files.add(key)
+            file_names.append(entry.name)
+
+        stats.matched += len(file_names)
+        yield dir_path, dir_names, file_names
+        # 逆序入栈，保持与 os.walk 相同的自顶向下、按目录项顺序的遍历
+        for name in reversed(dir_names):
+            stack.append((os.path.join(dir_path, name), f"{rel_dir}/{name}" if rel_dir else name))
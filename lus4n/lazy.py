@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 按需扫描模块
+从一个或多个入口文件出发，只解析 require 能到达的文件，不扫描整个根文件系统：
+- require 的模块名按 package.path 形式的模板 (例如 /usr/lib/lua/?.lua) 换算为扫描根目录下的文件
+- 按广度优先分轮进行：每一轮并行解析上一轮新发现的文件，再由它们的 require 得到下一轮的文件
+- 结果与 scan_path 的格式相同，只是范围限于入口文件真正依赖的文件
+"""
+
+import os
+import multiprocessing
+
+from loguru import logger
+
+from lus4n.graph import scan_one_file, CallGraphCollector
+from lus4n.resolve import normalize_module
+from lus4n.sites import node_sites
+
+
+# 默认的模块搜索模板，相对扫描根目录 (常见的 Lua 5.1 / OpenWrt 安装位置)
+DEFAULT_PACKAGE_PATH = ";".join((
+    "./?.lua", "./?/init.lua",
+    "/usr/lib/lua/?.lua", "/usr/lib/lua/?/init.lua",
+    "/usr/share/lua/?.lua", "/usr/share/lua/?/init.lua",
+    "/usr/share/lua/5.1/?.lua", "/usr/share/lua/5.1/?/init.lua",
+    "/usr/local/share/lua/5.1/?.lua", "/usr/local/share/lua/5.1/?/init.lua",
+))
+
+# 一轮中需要解析的文件数少于该值时不使用多进程
+MULTIPROCESS_THRESHOLD = 8
+
+
+def parse_package_path(package_path):
+    """把 package.path 形式的字符串 (以 ; 分隔) 拆成模板列表，忽略空项"""
+    return [template.strip() for template in package_path.split(";") if template.strip()]
+
+
+def find_module(root, module_name, templates):
+    """按模板在扫描根目录下查找模块对应的文件，找不到时返回 None
+
+    模板中的 ? 替换为模块名 (点换成目录分隔符)，模板按扫描根目录下的路径处理
+    """
+    name = normalize_module(module_name).replace(".", "/")
+    for template in templates:
+        relative = template.replace("?", name)
+        while relative.startswith("./"):
+            relative = relative[2:]
+        file_path = os.path.join(root, relative.lstrip("/"))
+        if os.path.isfile(file_path):
+            return file_path
+    return None
+
+
+def _entry_path(root, entry):
+    """入口文件的路径：优先按扫描根目录下的路径处理，其次按本机路径处理"""
+    candidate = os.path.join(root, entry.lstrip("/\\"))
+    if os.path.isfile(candidate):
+        return candidate
+    if os.path.isfile(entry) and os.path.abspath(entry).startswith(os.path.abspath(root) + os.sep):
+        return os.path.join(root, os.path.relpath(os.path.abspath(entry), os.path.abspath(root)))
+    raise ValueError(f"入口文件不存在: {entry}")
+
+
+def _scan_wave_file(file_path):
+    _, call_graph, require, status, sites = scan_one_file(file_path, None, False, with_sites=True)
+    return file_path, call_graph, require, status, sites
+
+
+def scan_closure(root, entries, package_path=None, rules=None, jobs=None):
+    """只扫描入口文件及其 require 闭包中的文件
+
+    参数:
+    - root: 扫描根目录 (例如解压后的根文件系统)
+    - entries: 入口文件，扫描根目录下的路径 (例如 /usr/sbin/service.lua) 或本机上位于根目录内的路径
+    - package_path: 模块搜索模板，';' 分隔，默认 DEFAULT_PACKAGE_PATH
+    - rules: lus4n.ignore.IgnoreRules，被排除的文件不解析 (入口文件除外)
+    - jobs: 工作进程数，1 表示在当前进程中解析，默认使用全部 CPU
+
+    返回:
+    - (各文件的调用图, 调用网络, 找不到文件的模块名列表)
+    """
+    root = root.rstrip("/\\") or root
+    templates = parse_package_path(package_path or DEFAULT_PACKAGE_PATH)
+    collector = CallGraphCollector()
+    wave = list(dict.fromkeys(_entry_path(root, entry) for entry in entries))
+    seen = set(wave)
+    missing = set()
+    pool = None
+    try:
+        round_count = 0
+        while wave:
+            round_count += 1
+            if jobs != 1 and len(wave) >= MULTIPROCESS_THRESHOLD:
+                if pool is None:
+                    pool = multiprocessing.Pool(jobs)
+                results = pool.imap_unordered(_scan_wave_file, wave, chunksize=4)
+            else:
+                results = map(_scan_wave_file, wave)
+            next_wave = []
+            for file_path, call_graph, require, status, sites in results:
+                relative_file_path = file_path[len(root):]
+                if not relative_file_path.startswith("/"):
+                    relative_file_path = "/" + relative_file_path
+                collector.add_file(relative_file_path, call_graph, require,
+                                   node_sites(relative_file_path, sites, require))
+                for module_name in require:
+                    found = find_module(root, module_name, templates)
+                    if found is None:
+                        missing.add(module_name)
+                    elif found not in seen and (rules is None or rules.accepts(found)):
+                        seen.add(found)
+                        next_wave.append(found)
+            logger.info(f"按需扫描第 {round_count} 轮：解析 {len(wave)} 个文件，发现 {len(next_wave)} 个新文件")
+            # 按路径排序，各轮的解析顺序与 imap_unordered 的完成顺序无关
+            wave = sorted(next_wave)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    whole_call_graph, network = collector.build()
+    return whole_call_graph, network, sorted(missing)
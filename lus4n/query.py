@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 查询输出模块
+以文本、JSON 或 CSV 格式输出调用关系查询结果，不依赖任何可视化组件
+
+命令行在解析参数前就会导入本模块，因此模块顶层只导入标准库
+"""
+
+import csv
+import json
+
+
+QUERY_DIRECTIONS = ("ancestors", "descendants")
+OUTPUT_FORMATS = ("text", "json", "csv")
+
+
+def node_role(graph, node):
+    """节点角色：文件节点为 'file'，其余为 'function'"""
+    return "file" if graph.nodes[node].get("role") == "file" else "function"
+
+
+def defining_file(graph, node):
+    """定义函数的文件节点 (通过 export/define 入边)，找不到时返回 None"""
+    for source, data in graph.pred[node].items():
+        if data.get("action") in ("export", "define"):
+            return source
+    return None
+
+
+def related_nodes(graph, name, direction="ancestors"):
+    """返回与 name 相关的节点 (不含自身)，按名称排序保证输出稳定"""
+    import networkx as nx
+    if direction == "descendants":
+        nodes = nx.descendants(graph, name)
+    else:
+        nodes = nx.ancestors(graph, name)
+    return sorted(nodes, key=str)
+
+
+def iter_records(graph, nodes):
+    """逐个生成 (节点, 角色, 定义文件) 记录"""
+    for node in nodes:
+        role = node_role(graph, node)
+        yield node, role, defining_file(graph, node) if role == "function" else None
+
+
+def write_query_result(graph, name, direction, fmt, out):
+    """将查询结果按指定格式写入 out
+
+    记录逐条写出，不在内存中拼接完整输出
+    """
+    records = iter_records(graph, related_nodes(graph, name, direction))
+    if fmt == "json":
+        out.write('{"query": %s, "direction": %s, "nodes": [' % (
+            json.dumps(name, ensure_ascii=False), json.dumps(direction)))
+        for i, (node, role, file) in enumerate(records):
+            if i:
+                out.write(", ")
+            out.write(json.dumps({"name": node, "role": role, "file": file}, ensure_ascii=False))
+        out.write("]}\n")
+    elif fmt == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(("name", "role", "file"))
+        for node, role, file in records:
+            writer.writerow((node, role, file or ""))
+    else:
+        for node, role, file in records:
+            out.write(f"{node}\t{role}\t{file or '-'}\n")
+
+
+def write_paths(source, target, paths, fmt, out):
+    """输出调用路径，text 格式每行一条路径"""
+    if fmt == "json":
+        json.dump({"source": source, "target": target, "paths": paths}, out, ensure_ascii=False)
+        out.write("\n")
+    else:
+        for path in paths:
+            out.write(" -> ".join(map(str, path)) + "\n")
+
+
+def graph_stats(graph, top=10):
+    """统计节点/边数量、文件与函数数量以及被调用次数最多的函数"""
+    file_count = 0
+    hotspots = []
+    in_degree = graph.in_degree
+    for node, role in graph.nodes(data="role"):
+        if role == "file":
+            file_count += 1
+            continue
+        called = in_degree(node)
+        if called > 0:
+            hotspots.append((called, node))
+    hotspots.sort(key=lambda item: (-item[0], str(item[1])))
+    return {
+        "nodes": graph.number_of_nodes(),
+        "edges": graph.number_of_edges(),
+        "files": file_count,
+        "functions": graph.number_of_nodes() - file_count,
+        "hotspots": [{"name": node, "called": called} for called, node in hotspots[:top]],
+    }
+
+
+def write_stats(stats, fmt, out):
+    """输出统计信息"""
+    if fmt == "json":
+        json.dump(stats, out, ensure_ascii=False)
+        out.write("\n")
+        return
+    out.write(f"nodes\t{stats['nodes']}\n")
+    out.write(f"edges\t{stats['edges']}\n")
+    out.write(f"files\t{stats['files']}\n")
+    out.write(f"functions\t{stats['functions']}\n")
+    for item in stats["hotspots"]:
+        out.write(f"hotspot\t{item['name']}\t{item['called']}\n")
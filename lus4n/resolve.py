@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 跨文件符号解析模块
+调用图中的被调用函数是源码中的原始写法 (例如 http.write、luci.util.exec)，而导出函数的节点名
+由 lus4n.builder 按文件名推测 (例如 luci/util.lua 中的 function M.exec 为 util.exec)，
+两者通常对不上。扫描结束后按以下信息把调用链接到定义函数的节点：
+- 模块表：require 路径 -> 文件。模块名取自 module("x") 声明和文件路径
+  (luci/http.lua 可以是 luci.http 或 http，x/init.lua 为 x)
+- 导出表：文件 -> {字段: 函数节点}，见 lus4n.sites.node_sites
+- 别名：local http = require "luci.http"
+
+解析结果保存为 ResolutionIndex，并以 action 为 resolve 的边加入调用网络，
+祖先/后代查询沿这些边直接到达定义函数的节点
+"""
+
+import os
+import re
+
+
+# 解析得到的调用边的 action
+RESOLVE_ACTION = "resolve"
+
+
+def module_names(relative_file_path):
+    """文件路径对应的候选模块名，由长到短
+
+    例如 '/usr/lib/lua/luci/http.lua' -> ['usr.lib.lua.luci.http', 'lib.lua.luci.http', ..., 'luci.http', 'http']
+    """
+    parts = [part for part in re.split(r"[\\/]", os.path.splitext(relative_file_path)[0]) if part]
+    if len(parts) > 1 and parts[-1] == "init":
+        parts.pop()
+    return [".".join(parts[i:]) for i in range(len(parts))]
+
+
+def normalize_module(name):
+    """require 路径统一为点分形式，例如 'luci/http' -> 'luci.http'"""
+    return name.replace("/", ".").replace("\\", ".")
+
+
+def _pick(files):
+    # 同一模块名对应多个文件时取路径最短的，长度相同时按名称排序，保证结果稳定
+    return min(files, key=lambda relative_file_path: (len(relative_file_path), relative_file_path))
+
+
+def build_module_map(declared_modules):
+    """由 {文件: module() 声明的模块名或 None} 构建模块表
+
+    返回:
+    - (模块表 {模块名: 文件}, 声明过的模块名集合)；声明的模块名优先于由路径推出的模块名
+    """
+    declared, candidates = {}, {}
+    for relative_file_path, module_name in declared_modules.items():
+        if module_name:
+            declared.setdefault(normalize_module(module_name), []).append(relative_file_path)
+        for name in module_names(relative_file_path):
+            candidates.setdefault(name, []).append(relative_file_path)
+    module_map = {name: _pick(files) for name, files in candidates.items()}
+    module_map.update((name, _pick(files)) for name, files in declared.items())
+    return module_map, set(declared)
+
+
+class ResolutionIndex:
+    """跨文件解析结果"""
+
+    def __init__(self):
+        self.modules = {}   # 解析中用到的模块 {模块名: 文件}
+        self.targets = {}   # 解析到的函数节点 {函数节点: 定义文件}
+        self.edges = {}     # 解析得到的调用边 {(调用方节点, 函数节点): 调用次数}
+        self.resolved = 0   # 解析成功的调用次数
+        self.unresolved = 0  # 点分形式但没有找到定义的调用次数
+
+    def __len__(self):
+        return len(self.edges)
+
+    def module_file(self, module_name):
+        """模块对应的文件，没有用到过的模块返回 None"""
+        return self.modules.get(normalize_module(module_name))
+
+    def callees_of(self, caller):
+        """caller 解析后调用的函数节点，按名称排序"""
+        return sorted(target for source, target in self.edges if source == caller)
+
+    def callers_of(self, target):
+        """解析后调用 target 的节点，按名称排序"""
+        return sorted(source for source, node in self.edges if node == target)
+
+    def apply(self, network):
+        """把解析得到的边加入调用网络，返回调用网络
+
+        已有的边保持不变；函数节点不在网络中时 (函数体内没有调用) 同时加入定义文件到该节点的 export 边
+        """
+        for (caller, target), weight in self.edges.items():
+            if target not in network:
+                network.add_edge(self.targets[target], target, action="export", weight=1)
+            if not network.has_edge(caller, target):
+                network.add_edge(caller, target, action=RESOLVE_ACTION, weight=weight)
+        return network
+
+
+class _Resolver:
+    """在一个调用表上解析限定名，同一文件中相同的限定名只解析一次"""
+
+    def __init__(self, file_modules, file_requires):
+        self.file_modules = file_modules
+        self.file_requires = file_requires
+        self.module_map, self.declared = build_module_map(
+            {relative_file_path: module[0] for relative_file_path, module in file_modules.items()})
+        self.used_modules = {}
+
+    def _export(self, module_name, field):
+        target_file = self.module_map.get(module_name)
+        if target_file is None:
+            return None
+        node = self.file_modules[target_file][3].get(field)
+        if node is None:
+            return None
+        self.used_modules[module_name] = target_file
+        return node, target_file
+
+    def resolve(self, relative_file_path, qualified):
+        """限定名对应的 (函数节点, 定义文件)，无法解析时返回 None
+
+        依次尝试：require 别名、本文件返回的表、全局模块名 (最长前缀)
+        """
+        base, _, field = qualified.partition(".")
+        if not field:
+            return None
+        module = self.file_modules.get(relative_file_path)
+        if module is not None:
+            _, returned, aliases, exports = module
+            if base in aliases:
+                return self._export(normalize_module(aliases[base]), field)
+            if base == returned:
+                node = exports.get(field)
+                return None if node is None else (node, relative_file_path)
+        # module("luci.http") 之类的模块在全局可见；单段的名称只在声明过或被本文件 require 时才当作模块
+        requires = self.file_requires.get(relative_file_path, ())
+        parts = qualified.split(".")
+        for i in range(len(parts) - 1, 0, -1):
+            prefix = ".".join(parts[:i])
+            if i == 1 and prefix not in self.declared and prefix not in requires:
+                continue
+            found = self._export(prefix, ".".join(parts[i:]))
+            if found is not None:
+                return found
+        return None
+
+
+def resolve_calls(call_sites, file_requires=None):
+    """解析调用表 (lus4n.sites.CallSiteTable) 中的点分调用，返回 ResolutionIndex
+
+    参数:
+    - call_sites: 全部文件的调用表，文件的模块信息取自其中
+    - file_requires: 各文件的 require 列表
+    """
+    names = call_sites.symbols.names
+    resolver = _Resolver({names[file_id]: module for file_id, module in call_sites.modules.items()},
+                         file_requires or {})
+    index = ResolutionIndex()
+    cache = {}
+    edges = index.edges
+    for caller, file_id, qualified in zip(call_sites.callers, call_sites.call_files, call_sites.call_qualified):
+        if qualified < 0:
+            continue
+        key = (file_id, qualified)
+        if key in cache:
+            found = cache[key]
+        else:
+            found = cache[key] = resolver.resolve(names[file_id], names[qualified])
+        if found is None:
+            if "." in names[qualified]:
+                index.unresolved += 1
+            continue
+        node, target_file = found
+        index.targets[node] = target_file
+        edge = (names[caller], node)
+        edges[edge] = edges.get(edge, 0) + 1
+        index.resolved += 1
+    index.modules = resolver.used_modules
+    return index
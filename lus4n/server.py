@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 本地查询服务
+常驻内存保存一个或多个调用图及其索引，通过本地 HTTP (TCP 或 Unix socket) 提供 JSON 查询接口
+
+接口 (GET，参数放在查询字符串中；只加载了一个存储文件时可省略 storage 参数):
+- /storages                                  已加载的存储文件
+- /ancestors?storage=&name=                  调用者
+- /descendants?storage=&name=                被调用者
+- /node?storage=&name=                       节点角色和定义文件
+- /paths?storage=&source=&target=[&all=1&max_depth=&max_paths=]
+- /hotspots?storage=[&top=]
+- /entries?storage=
+- /search?storage=&q=[&limit=]
+
+存储文件在磁盘上发生变化时会在后台重新加载，加载完成前继续使用旧数据应答
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from lus4n.api import GraphSession
+from lus4n.storage import storage_stamp
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# 检查存储文件是否变化的最小间隔 (秒)
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class QueryError(Exception):
+    """请求错误，附带 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ResidentStorage:
+    """常驻内存的存储文件，文件变化时在后台线程中重新加载后整体替换会话"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = os.path.abspath(path)
+        self.stamp = storage_stamp(self.path)
+        self.session = GraphSession(self.path)
+        self.loaded_at = time.time()
+        self.last_error = None
+        self._checked_at = time.monotonic()
+        self._reloading = False
+        self._lock = threading.Lock()
+
+    def current(self):
+        """返回当前会话，必要时触发后台重新加载"""
+        now = time.monotonic()
+        if now - self._checked_at >= RELOAD_CHECK_INTERVAL:
+            self._checked_at = now
+            self._check_reload()
+        return self.session
+
+    def _check_reload(self):
+        try:
+            stamp = storage_stamp(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if stamp == self.stamp or self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload, args=(stamp,), daemon=True).start()
+
+    def _reload(self, stamp):
+        try:
+            session = GraphSession(self.path)
+            with self._lock:
+                self.session = session
+                self.stamp = stamp
+                self.loaded_at = time.time()
+                self.last_error = None
+        except Exception as e:
+            # 文件可能仍在写入，保留旧会话，下次检查时重试
+            self.last_error = str(e)
+        finally:
+            with self._lock:
+                self._reloading = False
+
+    def describe(self):
+        graph = self.session.graph
+        return {
+            "name": self.name,
+            "path": self.path,
+            "nodes": graph.number_of_nodes(),
+            "edges": graph.number_of_edges(),
+            "loaded_at": self.loaded_at,
+            "last_error": self.last_error,
+        }
+
+
+class StorageRegistry:
+    """按名称管理多个常驻存储文件"""
+
+    def __init__(self, paths):
+        self.storages = {}
+        for spec in paths:
+            # 支持 name=path 形式指定名称，默认使用不带后缀的文件名
+            if "=" in spec and not os.path.exists(spec):
+                name, path = spec.split("=", 1)
+            else:
+                path = spec
+                name = os.path.splitext(os.path.basename(spec))[0]
+            if name in self.storages:
+                raise ValueError(f"存储名称重复: {name}")
+            self.storages[name] = ResidentStorage(name, path)
+
+    def session(self, name):
+        if not name:
+            if len(self.storages) != 1:
+                raise QueryError("加载了多个存储文件，需要通过 storage 参数指定")
+            return next(iter(self.storages.values())).current()
+        storage = self.storages.get(name)
+        if storage is None:
+            raise QueryError(f"未加载的存储: {name}", 404)
+        return storage.current()
+
+
+def _param(params, key, default=None, required=False):
+    values = params.get(key)
+    if not values:
+        if required:
+            raise QueryError(f"缺少参数: {key}")
+        return default
+    return values[0]
+
+
+def _int_param(params, key, default):
+    value = _param(params, key)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise QueryError(f"参数 {key} 必须是整数")
+
+
+def handle_query(registry, route, params):
+    """执行一次查询，返回可序列化为 JSON 的结果"""
+    if route == "/storages":
+        return [storage.describe() for storage in registry.storages.values()]
+
+    session = registry.session(_param(params, "storage"))
+    try:
+        if route in ("/ancestors", "/descendants"):
+            name = _param(params, "name", required=True)
+            nodes = session.ancestors(name) if route == "/ancestors" else session.descendants(name)
+            return {"name": name, "nodes": sorted(nodes, key=str)}
+        if route == "/node":
+            return session.node_info(_param(params, "name", required=True))._asdict()
+        if route == "/paths":
+            source = _param(params, "source", required=True)
+            target = _param(params, "target", required=True)
+            if _param(params, "all") in ("1", "true", "yes"):
+                paths = session.paths(source, target,
+                                      _int_param(params, "max_depth", 10),
+                                      _int_param(params, "max_paths", 100))
+            else:
+                path = session.shortest_path(source, target)
+                paths = [path] if path else []
+            return {"source": source, "target": target, "paths": paths}
+        if route == "/hotspots":
+            return [h._asdict() for h in session.hotspots(_int_param(params, "top", 20))]
+        if route == "/entries":
+            return session.entries()
+        if route == "/search":
+            return session.search(_param(params, "q", ""), _int_param(params, "limit", 50))
+    except ValueError as e:
+        raise QueryError(str(e), 404)
+    raise QueryError(f"未知接口: {route}", 404)
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """JSON 查询请求处理，使用 HTTP/1.1 以支持连接复用 (keep-alive)"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "lus4n"
+
+    def setup(self):
+        # 响应头和响应体分两次写出，TCP 连接上关闭 Nagle 算法，避免与延迟确认叠加造成每次约 40ms 的等待
+        self.disable_nagle_algorithm = self.request.family in (socket.AF_INET, socket.AF_INET6)
+        super().setup()
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, body = 200, handle_query(self.server.registry, url.path.rstrip("/") or "/",
+                                             parse_qs(url.query))
+        except QueryError as e:
+            status, body = e.status, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def address_string(self):
+        # Unix socket 连接没有客户端地址
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QueryHTTPServer(ThreadingHTTPServer):
+    """TCP 查询服务，每个连接一个线程"""
+
+    daemon_threads = True
+
+    def __init__(self, address, registry, verbose=False):
+        self.registry = registry
+        self.verbose = verbose
+        super().__init__(address, QueryRequestHandler)
+
+
+class UnixQueryHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket 查询服务"""
+
+    daemon_threads = True
+
+    def __init__(self, path, registry, verbose=False):
+        self.registry = registry
+        self.verbose = verbose
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, QueryRequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+
+
+def create_server(storage_paths, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, verbose=False):
+    """加载存储文件并创建 (未启动的) 查询服务"""
+    registry = StorageRegistry(storage_paths)
+    if unix_socket:
+        if not hasattr(socket, "AF_UNIX"):
+            raise ValueError("当前平台不支持 Unix socket")
+        return UnixQueryHTTPServer(unix_socket, registry, verbose)
+    return QueryHTTPServer((host, port), registry, verbose)
+
+
+def serve(storage_paths, host=DEFAULT_HOST, port=DEFAULT_PORT, unix_socket=None, verbose=False):
+    """启动查询服务并阻塞运行，Ctrl+C 退出"""
+    server = create_server(storage_paths, host, port, unix_socket, verbose)
+    if unix_socket:
+        print(f"lus4n serve: unix:{unix_socket}")
+    else:
+        print(f"lus4n serve: http://{server.server_address[0]}:{server.server_address[1]}")
+    for storage in server.registry.storages.values():
+        print(f"  {storage.name}: {storage.path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 调用位置模块
+解析时记录每一次调用和每个函数定义在源码中的位置，以列存形式与调用网络一起保存：
+- 调用表：调用方节点、被调用函数、文件、行、列 (同一调用出现几次就有几行)
+- 定义表：函数节点、文件、行、列
+- 模块信息：每个文件的模块名、返回的表名、require 别名和导出函数，供 lus4n.resolve 做跨文件解析
+
+调用方和函数都使用调用网络中的节点名 (由 [G]/[X]/[L] 键按 lus4n.builder 的规则换算)，
+名称保存为符号表编号。调用网络的边按调用表计算调用次数作为权重，
+查询界面可以直接列出调用发生的位置，不需要重新读取和解析源码
+"""
+
+from array import array
+
+from lus4n.builder import caller_node
+from lus4n.symbols import SymbolTable
+
+
+def node_sites(relative_file_path, sites, require=()):
+    """把 Lus4nVisitor.sites() 结果中的调用图键换算为调用网络节点名
+
+    返回:
+    - (调用列表 [(调用方节点, 被调用函数, 行, 列, 限定名), ...], 定义列表 [(函数节点, 行, 列), ...], 模块信息)
+
+    模块信息为 (模块名, 返回的表名, require 别名, 导出函数 {字段: 函数节点})，没有时为 None。
+    导出函数取自 [X] 定义：function M.f 在 M 为顶层返回的表时导出为字段 f，function f 导出为字段 f
+    (module() 声明的模块中的函数即为这种形式)
+    """
+    calls, definitions, module = sites
+    nodes = {}
+
+    def node_of(tmp_name):
+        node = nodes.get(tmp_name)
+        if node is None:
+            node = nodes[tmp_name] = caller_node(relative_file_path, tmp_name, require)[0]
+        return node
+
+    if module is not None:
+        module_name, returned, aliases = module
+        exports = {}
+        for tmp_name, _, _ in definitions:
+            if not tmp_name.startswith("[X]"):
+                continue
+            base, dot, field = tmp_name[3:].partition(".")
+            if not dot:
+                exports[base] = node_of(tmp_name)
+            elif base == returned:
+                exports[field] = node_of(tmp_name)
+        module = (module_name, returned, dict(aliases), exports)
+    return ([(node_of(tmp_name), called, line, column, qualified)
+             for tmp_name, called, line, column, qualified in calls],
+            [(node_of(tmp_name), line, column) for tmp_name, line, column in definitions],
+            module)
+
+
+def count_calls(calls):
+    """每条调用边的调用次数 {(调用方节点, 被调用函数): 次数}，calls 为 node_sites() 返回的调用列表"""
+    counts = {}
+    for caller, called, *_ in calls:
+        edge = (caller, called)
+        counts[edge] = counts.get(edge, 0) + 1
+    return counts
+
+
+class CallSiteTable:
+    """列存的调用表和定义表"""
+
+    def __init__(self, symbols=None):
+        """symbols: 名称所用的符号表，默认新建；传入扫描使用的符号表时名称与调用图共享同一批字符串对象"""
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        # 调用表
+        self.callers = array("l")
+        self.callees = array("l")
+        self.call_files = array("l")
+        self.call_lines = array("l")
+        self.call_columns = array("l")
+        self.call_qualified = array("l")  # 限定名的编号，没有时为 -1
+        # 定义表
+        self.def_names = array("l")
+        self.def_files = array("l")
+        self.def_lines = array("l")
+        self.def_columns = array("l")
+        # 模块信息 {文件编号: (模块名, 返回的表名, require 别名, 导出函数)}
+        self.modules = {}
+        # 按列建立的行号索引 {列名: {名称编号: [行, ...]}}，首次查询时建立，表有变化时清空
+        self._rows = {}
+
+    def __len__(self):
+        return len(self.callers)
+
+    def __getstate__(self):
+        # 行号索引可以由各列还原，不写入存储文件
+        state = dict(self.__dict__)
+        state.pop('_rows', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._rows = {}
+
+    def _rows_of(self, column, symbol_id):
+        """column 列中值为 symbol_id 的行"""
+        index = self._rows.get(column)
+        if index is None:
+            index = self._rows[column] = {}
+            for row, value in enumerate(getattr(self, column)):
+                rows = index.get(value)
+                if rows is None:
+                    index[value] = [row]
+                else:
+                    rows.append(row)
+        return index.get(symbol_id, ())
+
+    def add_file(self, relative_file_path, sites):
+        """加入一个文件的调用位置，sites 为 node_sites() 的结果"""
+        calls, definitions, module = sites
+        symbol_id = self.symbols.id
+        file_id = symbol_id(relative_file_path)
+        self._rows.clear()
+        for caller, called, line, column, qualified in calls:
+            self.callers.append(symbol_id(caller))
+            self.callees.append(symbol_id(called))
+            self.call_files.append(file_id)
+            self.call_lines.append(line)
+            self.call_columns.append(column)
+            self.call_qualified.append(-1 if qualified is None else symbol_id(qualified))
+        for node, line, column in definitions:
+            self.def_names.append(symbol_id(node))
+            self.def_files.append(file_id)
+            self.def_lines.append(line)
+            self.def_columns.append(column)
+        if module is not None:
+            self.modules[file_id] = self._intern_module(module)
+
+    def _intern_module(self, module):
+        intern = self.symbols.intern
+        module_name, returned, aliases, exports = module
+        return (None if module_name is None else intern(module_name),
+                None if returned is None else intern(returned),
+                {intern(alias): intern(required) for alias, required in aliases.items()},
+                {intern(field): intern(node) for field, node in exports.items()})
+
+    def merge(self, other, files=None):
+        """追加另一个调用表的行 (对方的名称编号重新映射)，files 不为 None 时只追加这些文件的行"""
+        names = other.symbols.names
+        symbol_id = self.symbols.id
+        remap = {}
+        self._rows.clear()
+
+        def mapped(other_id):
+            new_id = remap.get(other_id)
+            if new_id is None:
+                new_id = remap[other_id] = symbol_id(names[other_id])
+            return new_id
+
+        wanted = None if files is None else {i for i, name in enumerate(names) if name in files}
+        for row, file_id in enumerate(other.call_files):
+            if wanted is None or file_id in wanted:
+                self.callers.append(mapped(other.callers[row]))
+                self.callees.append(mapped(other.callees[row]))
+                self.call_files.append(mapped(file_id))
+                self.call_lines.append(other.call_lines[row])
+                self.call_columns.append(other.call_columns[row])
+                qualified = other.call_qualified[row]
+                self.call_qualified.append(-1 if qualified < 0 else mapped(qualified))
+        for row, file_id in enumerate(other.def_files):
+            if wanted is None or file_id in wanted:
+                self.def_names.append(mapped(other.def_names[row]))
+                self.def_files.append(mapped(file_id))
+                self.def_lines.append(other.def_lines[row])
+                self.def_columns.append(other.def_columns[row])
+        for file_id, module in other.modules.items():
+            if wanted is None or file_id in wanted:
+                self.modules[mapped(file_id)] = self._intern_module(module)
+        return self
+
+    def by_file(self):
+        """按文件拆分为 {文件: (调用列表, 定义列表, 模块信息)}，形式与 node_sites() 的结果相同"""
+        names = self.symbols.names
+        result = {}
+
+        def entry(file_id):
+            sites = result.get(file_id)
+            if sites is None:
+                sites = result[file_id] = ([], [], self.modules.get(file_id))
+            return sites
+
+        for caller, callee, file_id, line, column, qualified in zip(
+                self.callers, self.callees, self.call_files, self.call_lines, self.call_columns, self.call_qualified):
+            entry(file_id)[0].append((names[caller], names[callee], line, column,
+                                      None if qualified < 0 else names[qualified]))
+        for node, file_id, line, column in zip(self.def_names, self.def_files, self.def_lines, self.def_columns):
+            entry(file_id)[1].append((names[node], line, column))
+        for file_id in self.modules:
+            entry(file_id)
+        return {names[file_id]: sites for file_id, sites in result.items()}
+
+    def call_counts(self):
+        """各文件中每条调用边的调用次数 {文件: {(调用方节点, 被调用函数): 次数}}，与 count_calls() 的结果相同"""
+        names = self.symbols.names
+        result = {}
+        for caller, callee, file_id in zip(self.callers, self.callees, self.call_files):
+            counts = result.get(file_id)
+            if counts is None:
+                counts = result[file_id] = {}
+            edge = (names[caller], names[callee])
+            counts[edge] = counts.get(edge, 0) + 1
+        return {names[file_id]: counts for file_id, counts in result.items()}
+
+    def calls_to(self, callee):
+        """调用 callee 的位置 [(文件, 调用方节点, 行, 列), ...]，按文件和行排序"""
+        if callee not in self.symbols:
+            return []
+        names = self.symbols.names
+        return sorted((names[self.call_files[row]], names[self.callers[row]],
+                       self.call_lines[row], self.call_columns[row])
+                      for row in self._rows_of("callees", self.symbols.id(callee)))
+
+    def calls_from(self, caller):
+        """caller 发起的调用 [(文件, 被调用函数, 行, 列), ...]，按文件和行排序"""
+        if caller not in self.symbols:
+            return []
+        names = self.symbols.names
+        return sorted((names[self.call_files[row]], names[self.callees[row]],
+                       self.call_lines[row], self.call_columns[row])
+                      for row in self._rows_of("callers", self.symbols.id(caller)))
+
+    def definitions_of(self, node):
+        """函数节点的定义位置 [(文件, 行, 列), ...]"""
+        if node not in self.symbols:
+            return []
+        names = self.symbols.names
+        return sorted((names[self.def_files[row]], self.def_lines[row], self.def_columns[row])
+                      for row in self._rows_of("def_names", self.symbols.id(node)))
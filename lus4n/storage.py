@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 存储文件模块
+统一读取命令行 (直接保存 DiGraph) 和图形界面 (保存包含调用网络的字典) 生成的存储文件；
+lus4n deps 快速扫描保存的存储文件只有模块依赖图，查询时以依赖图代替调用网络
+
+字典形式的存储由基准快照 (存储文件本身) 和追加写入的日志 (<存储文件>.journal) 组成：
+- 完整保存写出新的基准快照 (带有新的 snapshot_id) 并删除日志
+- 增量扫描只把相对上次加载内容的变化作为一条记录追加到日志：按文件替换的调用图、require 列表
+  和调用位置，其余字典的增删项，调用网络中出边有变化的节点，其余有变化的值。调用网络只检查
+  由变化的文件和解析结果推出的节点，不比较整个图
+- 读取时在基准快照上依次重放日志；日志开头记录所属的 snapshot_id，与基准快照不符的日志
+  (基准快照已被替换) 不重放。最后一条记录写了一半时重放到此为止
+- 日志超过基准快照大小的 COMPACT_RATIO 后在后台线程中合并为新的基准快照
+"""
+
+import os
+import uuid
+import pickle
+import threading
+
+
+# pickle 协议 2 及以上的数据流以 PROTO 操作码开头
+PICKLE_PROTO = b"\x80"
+
+# 日志超过基准快照大小的该比例时合并
+COMPACT_RATIO = 0.25
+
+# 加载时记录的存储状态 (基准快照大小, 修改时间, 已重放的日志长度)，追加日志前据此确认存储未被改写
+STATE_KEY = 'storage_state'
+
+# 按文件替换的内容，只比较本次变化的文件 (扫描时可能直接在加载的旧字典上更新)
+FILE_KEYS = ('whole_call_graph', 'file_requires')
+
+# 调用网络只检查由变化的文件和解析结果推出的节点
+NETWORK_KEY = 'whole_call_network'
+RESOLUTION_KEY = 'resolution'
+
+# 基准快照写出、日志追加和合并互斥
+_lock = threading.RLock()
+
+
+def journal_path(storage_path):
+    """存储文件对应的日志文件"""
+    return f"{storage_path}.journal"
+
+
+def storage_stamp(storage_path):
+    """存储文件的标记 (基准快照和日志的大小、修改时间)，用于判断存储内容是否变化"""
+    st = os.stat(storage_path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    try:
+        st = os.stat(journal_path(storage_path))
+    except OSError:
+        return stamp
+    return stamp + (st.st_size, st.st_mtime_ns)
+
+
+class _NeedsJoblib(Exception):
+    """数据流中含有 joblib 写出的对象"""
+
+
+class _StorageUnpickler(pickle.Unpickler):
+    """标准 pickle 读取；遇到 joblib 的类 (例如 numpy 数组的 NumpyArrayWrapper) 时中止"""
+
+    def find_class(self, module, name):
+        if module.partition(".")[0] == "joblib":
+            raise _NeedsJoblib(f"{module}.{name}")
+        return super().find_class(module, name)
+
+
+def load_storage(storage_path):
+    """读取存储文件的内容，字典形式的存储同时重放日志
+
+    存储文件由 joblib.dump 写出且不含 numpy 数组时就是标准 pickle 数据流，
+    直接在打开的文件上用 pickle 读取，不把整个文件读入内存，也不导入 joblib (及其依赖的 numpy)；
+    开头不是 pickle 数据流的压缩文件，以及读取中遇到 joblib 对象的文件仍交给 joblib 处理
+    """
+    if not os.path.exists(storage_path):
+        raise FileNotFoundError(f"存储文件不存在: {storage_path}")
+    with open(storage_path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if f.read(len(PICKLE_PROTO)) == PICKLE_PROTO:
+            f.seek(0)
+            try:
+                data = _StorageUnpickler(f).load()
+                use_joblib = False
+            except _NeedsJoblib:
+                use_joblib = True
+        else:
+            use_joblib = True
+    if use_joblib:
+        from joblib import load
+        data = load(storage_path)
+    if isinstance(data, dict) and data.get('snapshot_id'):
+        data[STATE_KEY] = (st.st_size, st.st_mtime_ns, _replay_journal(data, storage_path))
+    return data
+
+
+def save_storage(data, storage_path):
+    """完整写出存储文件 (新的基准快照)，并删除日志
+
+    使用 C 实现的 pickle 直接写出标准 pickle 数据流 (joblib.load 和 load_storage 都能读取)，
+    比 joblib.dump 的纯 Python 序列化快得多；先写入临时文件再替换，读取方不会读到写了一半的文件
+
+    data 为字典时写出后在其中记录快照和存储状态，之后可以直接作为 save_delta 的 old_data
+    """
+    snapshot = data
+    if isinstance(data, dict):
+        snapshot = {key: value for key, value in data.items() if key != STATE_KEY}
+        snapshot['snapshot_id'] = uuid.uuid4().hex
+    temp_path = f"{storage_path}.tmp{os.getpid()}"
+    with _lock:
+        with open(temp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, storage_path)
+        # 先替换基准快照再删除日志：中途退出时留下的日志属于旧快照，读取时不会重放
+        if os.path.exists(journal_path(storage_path)):
+            os.remove(journal_path(storage_path))
+        if isinstance(data, dict):
+            data['snapshot_id'] = snapshot['snapshot_id']
+            data[STATE_KEY] = _current_state(storage_path)
+
+
+def save_delta(old_data, data, storage_path, changed_files=None, graph_changes=None):
+    """把 data 相对 old_data (由 load_storage 读取，或上一次 save_storage/save_delta 写出) 的变化
+    作为一条记录追加到日志；追加后 data 记录新的存储状态，可以作为下一次的 old_data
+
+    参数:
+    - changed_files: 内容变化 (新增、修改、删除) 的文件节点名，默认取 file_hashes 中有变化的文件
+    - graph_changes: {键: graph_changes() 的结果}，调用方自己记录了变化的图，不再与 old_data 中的图比较
+
+    返回:
+    - 是否已追加；old_data 不是带日志状态的字典或存储文件在加载后被改写时返回 False，需要完整保存
+    """
+    state = old_data.get(STATE_KEY) if isinstance(old_data, dict) else None
+    if state is None or not isinstance(data, dict):
+        return False
+    if changed_files is None:
+        if not isinstance(data.get('file_hashes'), dict):
+            return False
+        removed, changed = _dict_delta(old_data.get('file_hashes', {}), data['file_hashes'])
+        changed_files = set(removed) | set(changed)
+    with _lock:
+        if _current_state(storage_path) != state:
+            return False
+        record = _storage_delta(old_data, data, set(changed_files), graph_changes or {})
+        with open(journal_path(storage_path), "ab") as f:
+            if not state[2]:
+                # 新日志以所属的基准快照开头
+                pickle.dump({'base': old_data['snapshot_id']}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        data['snapshot_id'] = old_data['snapshot_id']
+        data[STATE_KEY] = _current_state(storage_path)
+    return True
+
+
+def graph_changes(graph, removed, touched):
+    """由调用方记录的变化生成图的日志内容，作为 save_delta 的 graph_changes 使用
+
+    参数:
+    - removed: 可能已删除的节点 (仍在图中的不算删除)
+    - touched: 属性或出边可能变化的节点，日志中记录它们当前的属性和全部出边
+
+    返回的内容复制了这些节点的属性和出边，之后继续修改图不影响它
+    """
+    nodes, adj = graph._node, graph._adj
+    touched = [node for node in touched if node in nodes]
+    return ([node for node in removed if node not in nodes],
+            {node: dict(nodes[node]) for node in touched},
+            {node: {successor: dict(attrs) for successor, attrs in adj[node].items()} for node in touched})
+
+
+def needs_compaction(storage_path):
+    """日志是否已大到需要合并"""
+    try:
+        journal_size = os.path.getsize(journal_path(storage_path))
+    except OSError:
+        return False
+    return journal_size > COMPACT_RATIO * os.path.getsize(storage_path)
+
+
+def compact_storage(storage_path):
+    """把日志合并为新的基准快照
+
+    返回:
+    - 合并前的存储标记 (storage_stamp)，没有日志时返回 None
+    """
+    with _lock:
+        if not os.path.exists(journal_path(storage_path)):
+            return None
+        old_stamp = storage_stamp(storage_path)
+        save_storage(load_storage(storage_path), storage_path)
+        return old_stamp
+
+
+def compact_in_background(storage_path, on_compacted=None):
+    """在后台线程中合并日志，返回线程
+
+    on_compacted: 合并完成后以合并前的存储标记调用，例如更新符号索引记录的标记
+    """
+    def run():
+        from loguru import logger
+        try:
+            old_stamp = compact_storage(storage_path)
+        except Exception as e:
+            logger.error(f"合并存储日志失败：{storage_path} - {str(e)}")
+            return
+        if old_stamp is not None and on_compacted is not None:
+            on_compacted(old_stamp)
+
+    thread = threading.Thread(target=run, name="lus4n-compact")
+    thread.start()
+    return thread
+
+
+def call_network_of(data):
+    """从存储内容中取出调用网络 (networkx.DiGraph)"""
+    import networkx as nx
+    if isinstance(data, nx.DiGraph):
+        return data
+    if isinstance(data, dict) and isinstance(data.get('whole_call_network'), nx.DiGraph):
+        return data['whole_call_network']
+    if isinstance(data, dict) and isinstance(data.get('dependency_network'), nx.DiGraph):
+        return data['dependency_network']
+    raise ValueError("存储文件中没有调用网络数据")
+
+
+def load_call_network(storage_path):
+    """加载存储文件中的调用网络"""
+    return call_network_of(load_storage(storage_path))
+
+
+# -----------------------------------------------------
+# 日志记录的生成与重放
+# -----------------------------------------------------
+def _current_state(storage_path):
+    st = os.stat(storage_path)
+    try:
+        journal_size = os.path.getsize(journal_path(storage_path))
+    except OSError:
+        journal_size = 0
+    return st.st_size, st.st_mtime_ns, journal_size
+
+
+def _replay_journal(data, storage_path):
+    """在基准快照上重放日志，返回重放到的日志长度 (日志不存在或不属于该快照时为 0)"""
+    try:
+        f = open(journal_path(storage_path), "rb")
+    except OSError:
+        return 0
+    site_updates = {}
+    with f:
+        try:
+            header = pickle.load(f)
+        except Exception:
+            return 0
+        if not isinstance(header, dict) or header.get('base') != data['snapshot_id']:
+            return 0
+        replayed = f.tell()
+        while True:
+            try:
+                record = pickle.load(f)
+            except Exception:
+                # 读完或最后一条记录写了一半
+                break
+            _apply_delta(data, record, site_updates)
+            replayed = f.tell()
+    for key, updates in site_updates.items():
+        data[key] = _replace_sites(data[key], updates)
+    return replayed
+
+
+def _dict_delta(old, new, keys=None):
+    """字典的变化 (删除的键, {新增或修改的键: 新值})；keys 不为 None 时只比较这些键"""
+    if keys is None:
+        removed = [key for key in old if key not in new]
+        changed = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    else:
+        removed = [key for key in keys if key not in new]
+        changed = {key: new[key] for key in keys if key in new}
+    return removed, changed
+
+
+def _apply_dict(target, delta):
+    removed, changed = delta
+    for key in removed:
+        target.pop(key, None)
+    target.update(changed)
+
+
+def _graph_delta(old, new, sources=None):
+    """有向图的变化 (删除的节点, {属性有变化的节点: 属性}, {出边有变化的节点: {后继: 边属性}})
+
+    直接比较 networkx 内部的节点和邻接字典；sources 不为 None 时只有这些节点的出边可能变化，
+    只比较它们以及它们在新旧图中的后继
+    """
+    old_nodes, old_adj = old._node, old._adj
+    new_nodes, new_adj = new._node, new._adj
+    if sources is None:
+        removed = [node for node in old_nodes if node not in new_nodes]
+        nodes = {node: attrs for node, attrs in new_nodes.items() if old_nodes.get(node) != attrs}
+        adj = {node: successors for node, successors in new_adj.items() if old_adj.get(node) != successors}
+        return removed, nodes, adj
+    candidates = set(sources)
+    for source in sources:
+        candidates.update(old_adj.get(source, ()))
+        candidates.update(new_adj.get(source, ()))
+    removed = [node for node in candidates if node in old_nodes and node not in new_nodes]
+    nodes = {node: new_nodes[node] for node in candidates
+             if node in new_nodes and old_nodes.get(node) != new_nodes[node]}
+    adj = {node: new_adj[node] for node in sources
+           if node in new_adj and old_adj.get(node) != new_adj[node]}
+    return removed, nodes, adj
+
+
+def _network_sources(old, new, changed_files, old_resolution, new_resolution):
+    """调用网络中出边可能变化的节点
+
+    调用网络的边都从文件节点或文件中的调用方节点出发 (见 lus4n.builder)，resolve 边从解析到的调用方出发：
+    - 变化的文件节点，以及它们在新旧网络中的后继 (文件中的调用方节点)
+    - 新旧解析结果中有变化的调用边的起点
+    - 以上节点的后继以及有变化的调用边的终点中，解析目标的定义文件 (目标是否已在网络中决定
+      是否加入定义文件到目标的 export 边)
+    """
+    old_targets = getattr(old_resolution, 'targets', {})
+    new_targets = getattr(new_resolution, 'targets', {})
+    sources = set(changed_files)
+    for relative_file_path in changed_files:
+        sources.update(old._adj.get(relative_file_path, ()))
+        sources.update(new._adj.get(relative_file_path, ()))
+    removed, changed = _dict_delta(getattr(old_resolution, 'edges', {}), getattr(new_resolution, 'edges', {}))
+    targets = set()
+    for caller, target in list(removed) + list(changed):
+        sources.add(caller)
+        targets.add(target)
+    for source in list(sources):
+        targets.update(old._adj.get(source, ()))
+        targets.update(new._adj.get(source, ()))
+    for target in targets:
+        for definitions in (old_targets, new_targets):
+            if target in definitions:
+                sources.add(definitions[target])
+    return sources
+
+
+def _apply_graph(graph, delta):
+    removed, nodes, adj = delta
+    graph.remove_nodes_from(removed)
+    for node, attrs in nodes.items():
+        graph.add_node(node)
+        graph.nodes[node].clear()
+        graph.nodes[node].update(attrs)
+    for node, successors in adj.items():
+        graph.remove_edges_from(list(graph.out_edges(node)))
+        graph.add_edges_from((node, successor, attrs) for successor, attrs in successors.items())
+
+
+def _storage_delta(old_data, data, changed_files, graph_changes):
+    """一条日志记录：{'removed': [删除的键], 'changes': {键: (类型, 内容)}}"""
+    import networkx as nx
+    from lus4n.sites import CallSiteTable
+    record = {'removed': [key for key in old_data if key not in data and key not in (STATE_KEY, 'snapshot_id')],
+              'changes': {}}
+    changes = record['changes']
+    for key, value in data.items():
+        if key in (STATE_KEY, 'snapshot_id'):
+            continue
+        if key in graph_changes:
+            changes[key] = ('graph', graph_changes[key])
+            continue
+        old = old_data.get(key)
+        if old is value and key not in FILE_KEYS:
+            continue
+        if key in FILE_KEYS and isinstance(old, dict) and isinstance(value, dict):
+            changes[key] = ('dict', _dict_delta(old, value, changed_files))
+        elif isinstance(old, nx.DiGraph) and type(old) is type(value):
+            sources = None
+            if key == NETWORK_KEY:
+                sources = _network_sources(old, value, changed_files,
+                                           old_data.get(RESOLUTION_KEY), data.get(RESOLUTION_KEY))
+            changes[key] = ('graph', _graph_delta(old, value, sources))
+        elif isinstance(old, CallSiteTable) and isinstance(value, CallSiteTable):
+            # 调用位置有变化的文件整体替换 (内容变化但沿用旧调用位置的文件保持原有的行)
+            before = CallSiteTable().merge(old, changed_files).by_file()
+            changed_sites = CallSiteTable().merge(value, changed_files)
+            after = changed_sites.by_file()
+            files = {relative_file_path for relative_file_path in changed_files
+                     if before.get(relative_file_path) != after.get(relative_file_path)}
+            changes[key] = ('sites', (files, CallSiteTable().merge(changed_sites, files)))
+        elif isinstance(old, dict) and isinstance(value, dict):
+            changes[key] = ('dict', _dict_delta(old, value))
+        elif old is not None and type(old) is type(value) and hasattr(value, '__dict__'):
+            # 例如 ResolutionIndex：字典属性记录增删项，其余属性有变化时整体记录
+            attrs = {}
+            for name, attr in vars(value).items():
+                before = vars(old).get(name)
+                if isinstance(before, dict) and isinstance(attr, dict):
+                    attrs[name] = ('dict', _dict_delta(before, attr))
+                elif before != attr:
+                    attrs[name] = ('value', attr)
+            changes[key] = ('object', attrs)
+        elif key not in old_data or old != value:
+            changes[key] = ('value', value)
+    return record
+
+
+def _apply_delta(data, record, site_updates):
+    """在 data 上重放一条日志记录；调用位置的替换收集到 site_updates，全部记录重放后统一处理"""
+    for key in record['removed']:
+        data.pop(key, None)
+    for key, (kind, change) in record['changes'].items():
+        if kind == 'dict':
+            _apply_dict(data[key], change)
+        elif kind == 'graph':
+            _apply_graph(data[key], change)
+        elif kind == 'sites':
+            site_updates.setdefault(key, []).append(change)
+        elif kind == 'object':
+            target = data[key]
+            for name, (attr_kind, attr_change) in change.items():
+                if attr_kind == 'dict':
+                    _apply_dict(getattr(target, name), attr_change)
+                else:
+                    setattr(target, name, attr_change)
+        else:
+            data[key] = change
+
+
+def _replace_sites(table, updates):
+    """按文件替换调用表中的调用位置，updates 为按日志顺序的 [(变化的文件, 这些文件的调用表), ...]"""
+    from lus4n.sites import CallSiteTable
+    names = table.symbols.names
+    replaced = set().union(*(files for files, _ in updates))
+    file_ids = set(table.call_files) | set(table.def_files) | set(table.modules)
+    result = CallSiteTable(table.symbols)
+    result.merge(table, {names[file_id] for file_id in file_ids} - replaced)
+    # 同一文件取最后一条记录中的调用位置；按日志顺序追加，行的顺序与每次完整保存时相同
+    later = []
+    replaced_later = set()
+    for files, _ in reversed(updates):
+        later.append(set(replaced_later))
+        replaced_later |= files
+    for (files, sites), skipped in zip(updates, reversed(later)):
+        result.merge(sites, files - skipped)
+    return result
@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 符号索引模块
+为函数名提供基于三元组 (trigram) 的子串检索和针对点分名称的模糊匹配，
+索引随调用图一起持久化，供查询补全使用
+"""
+
+import os
+import bisect
+import heapq
+from array import array
+
+from joblib import dump, load
+
+from lus4n.storage import storage_stamp
+
+
+# 模糊匹配时参与候选统计的倒排列表长度上限，过于常见的三元组区分度太低
+FUZZY_POSTING_LIMIT = 20000
+# 模糊匹配最多检查的候选数量
+FUZZY_CANDIDATE_LIMIT = 2000
+
+# 排名类别：数值越小越靠前
+RANK_EXACT = 0
+RANK_PREFIX = 1
+RANK_SEGMENT_PREFIX = 2
+RANK_SUBSTRING = 3
+
+
+def _split_segments(name):
+    """按 '.' 和 ':' 拆分点分名称，返回 (起始偏移, 片段) 列表"""
+    segments = []
+    start = 0
+    for i, ch in enumerate(name):
+        if ch in ".:":
+            segments.append((start, name[start:i]))
+            start = i + 1
+    segments.append((start, name[start:]))
+    return segments
+
+
+def _trigrams(text):
+    """返回字符串中所有不重复的三元组"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _fuzzy_score(query, name):
+    """子序列模糊匹配打分，匹配失败返回 None
+
+    查询中的 '.'/':' 分段会依次对齐名称中的片段 (例如 l.h.w -> luci.http.write)，
+    落在片段开头的字符不计间隔惩罚，分数越小越好
+    """
+    parts = [p for p in query.replace(":", ".").split(".") if p]
+    if len(parts) > 1:
+        segments = [seg for _, seg in _split_segments(name)]
+        pos = 0
+        for part in parts:
+            while pos < len(segments) and not segments[pos].startswith(part):
+                pos += 1
+            if pos >= len(segments):
+                return None
+            pos += 1
+        # 片段对齐成功，名称越短越靠前
+        return len(segments) - len(parts)
+
+    penalty = 0
+    last = -1
+    for ch in query:
+        idx = name.find(ch, last + 1)
+        if idx < 0:
+            return None
+        # 字符间隔越大惩罚越高；片段开头匹配不计惩罚
+        if idx > 0 and name[idx - 1] not in ".:_":
+            penalty += idx - last - 1
+        last = idx
+    return penalty
+
+
+class SymbolIndex:
+    """函数名索引
+
+    - 长度不小于 3 的查询走三元组倒排列表，只校验最短倒排列表中的候选
+    - 更短的查询走排序数组上的二分前缀检索 (整个名称或任一片段)
+    - 子串结果不足时补充模糊匹配结果
+    """
+
+    VERSION = 1
+
+    def __init__(self, names=(), source_stamp=None):
+        self.names = sorted(set(names))
+        self.source_stamp = source_stamp
+        self._lower = [n.lower() for n in self.names]
+        self._trigram_postings = {}
+        self._segment_keys = []
+        self._segment_ids = array('I')
+        self._build()
+
+    def _build(self):
+        """构建倒排列表和片段前缀表"""
+        postings = {}
+        segments = []
+        for name_id, lower in enumerate(self._lower):
+            for gram in _trigrams(lower):
+                posting = postings.get(gram)
+                if posting is None:
+                    posting = postings[gram] = array('I')
+                posting.append(name_id)
+            for offset, segment in _split_segments(lower):
+                if offset > 0 and segment:
+                    segments.append((segment, name_id))
+        segments.sort()
+        self._trigram_postings = postings
+        self._segment_keys = [seg for seg, _ in segments]
+        self._segment_ids = array('I', (name_id for _, name_id in segments))
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_graph(cls, graph, source_stamp=None):
+        """从调用图的函数节点构建索引 (跳过文件节点)"""
+        names = [
+            node for node, data in graph.nodes(data=True)
+            if isinstance(node, str) and data.get("role") != "file"
+        ]
+        return cls(names, source_stamp)
+
+    def _prefix_ids(self, keys, query):
+        """在有序列表 keys 中二分查找以 query 为前缀的区间"""
+        lo = bisect.bisect_left(keys, query)
+        hi = bisect.bisect_left(keys, query + "\uffff")
+        return lo, hi
+
+    def _rank(self, query, name_id):
+        lower = self._lower[name_id]
+        if lower == query:
+            return RANK_EXACT
+        if lower.startswith(query):
+            return RANK_PREFIX
+        for offset, segment in _split_segments(lower):
+            if offset > 0 and segment.startswith(query):
+                return RANK_SEGMENT_PREFIX
+        return RANK_SUBSTRING
+
+    def _substring_ids(self, query):
+        """返回包含 query 子串的名称 ID 集合"""
+        if len(query) < 3:
+            ids = set()
+            lo, hi = self._prefix_ids(self._lower, query)
+            ids.update(range(lo, hi))
+            lo, hi = self._prefix_ids(self._segment_keys, query)
+            ids.update(self._segment_ids[lo:hi])
+            return ids
+
+        postings = []
+        for gram in _trigrams(query):
+            posting = self._trigram_postings.get(gram)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        smallest = min(postings, key=len)
+        lower = self._lower
+        return {name_id for name_id in smallest if query in lower[name_id]}
+
+    def _fuzzy_ids(self, query, exclude):
+        """模糊匹配候选：按共享三元组数量或末段前缀收集，再做子序列打分"""
+        parts = [p for p in query.replace(":", ".").split(".") if p]
+        candidates = []
+        if len(parts) > 1:
+            # 选择命中最少的片段前缀作为候选来源
+            ranges = [self._prefix_ids(self._segment_keys, part) for part in parts[1:]]
+            lo, hi = min(ranges, key=lambda r: r[1] - r[0])
+            candidates = list(dict.fromkeys(self._segment_ids[lo:hi]))
+        elif len(query) >= 3:
+            counts = {}
+            for gram in _trigrams(query):
+                posting = self._trigram_postings.get(gram)
+                if posting is None or len(posting) > FUZZY_POSTING_LIMIT:
+                    continue
+                for name_id in posting:
+                    counts[name_id] = counts.get(name_id, 0) + 1
+            candidates = sorted(counts, key=counts.get, reverse=True)
+
+        scored = []
+        for name_id in candidates[:FUZZY_CANDIDATE_LIMIT]:
+            if name_id in exclude:
+                continue
+            score = _fuzzy_score(query, self._lower[name_id])
+            if score is not None:
+                scored.append((score, len(self._lower[name_id]), name_id))
+        scored.sort()
+        return [name_id for _, _, name_id in scored]
+
+    def search(self, query, limit=50):
+        """检索函数名，按 精确 > 前缀 > 片段前缀 > 子串 > 模糊 排序返回"""
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        ids = self._substring_ids(query)
+        result = heapq.nsmallest(
+            limit, ids,
+            key=lambda name_id: (self._rank(query, name_id), len(self._lower[name_id]), name_id)
+        )
+        if len(result) < limit:
+            result.extend(self._fuzzy_ids(query, ids)[:limit - len(result)])
+        return [self.names[name_id] for name_id in result]
+
+    # -------------------------------------------------
+    # 持久化
+    # -------------------------------------------------
+    @staticmethod
+    def index_path(storage_path):
+        """索引文件路径，与存储文件放在一起"""
+        return storage_path + ".idx"
+
+    @staticmethod
+    def storage_stamp(storage_path):
+        """存储文件的标记 (基准快照和日志的大小、修改时间)，用于判断索引是否过期"""
+        return storage_stamp(storage_path)
+
+    def save(self, path):
+        dump({
+            'version': self.VERSION,
+            'source_stamp': self.source_stamp,
+            'names': self.names,
+            'trigram_postings': self._trigram_postings,
+            'segment_keys': self._segment_keys,
+            'segment_ids': self._segment_ids,
+        }, path)
+
+    @classmethod
+    def load(cls, path):
+        data = load(path)
+        if not isinstance(data, dict) or data.get('version') != cls.VERSION:
+            raise ValueError(f"索引文件版本不匹配: {path}")
+        index = cls.__new__(cls)
+        index.names = data['names']
+        index.source_stamp = data['source_stamp']
+        index._lower = [n.lower() for n in index.names]
+        index._trigram_postings = data['trigram_postings']
+        index._segment_keys = data['segment_keys']
+        index._segment_ids = data['segment_ids']
+        return index
+
+    @classmethod
+    def build_for_storage(cls, storage_path, graph):
+        """为存储文件构建并保存索引"""
+        index = cls.from_graph(graph, cls.storage_stamp(storage_path))
+        index.save(cls.index_path(storage_path))
+        return index
+
+    @classmethod
+    def restamp(cls, storage_path, old_stamp):
+        """存储文件只是合并了日志、内容不变时，把标记为 old_stamp 的索引改为当前标记，不必重建
+
+        返回: 是否已更新
+        """
+        path = cls.index_path(storage_path)
+        try:
+            index = cls.load(path)
+        except Exception:
+            return False
+        if tuple(index.source_stamp or ()) != tuple(old_stamp):
+            return False
+        index.source_stamp = cls.storage_stamp(storage_path)
+        index.save(path)
+        return True
+
+    @classmethod
+    def load_or_build(cls, storage_path, graph_loader):
+        """加载与存储文件匹配的索引，过期或缺失时重新构建
+
+        参数:
+        - storage_path: 调用图存储文件路径
+        - graph_loader: 无参可调用对象，需要重建索引时才调用以获取调用图
+        """
+        path = cls.index_path(storage_path)
+        stamp = cls.storage_stamp(storage_path)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if tuple(index.source_stamp or ()) == stamp:
+                    return index
+            except Exception:
+                pass
+        return cls.build_for_storage(storage_path, graph_loader())
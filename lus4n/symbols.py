@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 符号表模块
+函数名、文件节点名等名称在各文件的调用图、require 列表和调用网络中大量重复出现。
+符号表为每个名称只保留一个字符串对象，并分配稳定的整数编号：
+- 扫描结果经符号表规范化后，内存中的调用图和调用网络共享同一批字符串对象
+- pickle 对同一对象只写出一次，之后以编号引用，存储文件随之变小
+- 工作进程把调用图编码为编号形式返回，进程间传递的数据中每个名称只出现一次
+"""
+
+
+class SymbolTable:
+    """名称 <-> 整数编号，编号按首次出现的顺序分配，加入后不再改变"""
+
+    def __init__(self, names=()):
+        self.names = []     # 编号 -> 名称
+        self._ids = {}      # 名称 -> 编号
+        for name in names:
+            self.id(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __getstate__(self):
+        # 名称 -> 编号的映射可以由名称列表还原，不随符号表传递
+        return self.names
+
+    def __setstate__(self, names):
+        self.names = names
+        self._ids = {name: symbol_id for symbol_id, name in enumerate(names)}
+
+    def id(self, name):
+        """名称的编号，首次出现时分配"""
+        symbol_id = self._ids.get(name)
+        if symbol_id is None:
+            symbol_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return symbol_id
+
+    def name(self, symbol_id):
+        """编号对应的名称"""
+        return self.names[symbol_id]
+
+    def intern(self, name):
+        """返回符号表中与 name 相等的唯一字符串对象"""
+        return self.names[self.id(name)]
+
+    def intern_list(self, names):
+        return [self.intern(name) for name in names]
+
+    def intern_call_graph(self, call_graph):
+        """把调用图中的名称替换为符号表中的字符串对象，返回新的调用图"""
+        intern = self.intern
+        return {intern(tmp_name): [intern(called) for called in called_list]
+                for tmp_name, called_list in call_graph.items()}
+
+    def encode_call_graph(self, call_graph):
+        """调用图编码为编号形式 {编号: [编号, ...]}"""
+        symbol_id = self.id
+        return {symbol_id(tmp_name): [symbol_id(called) for called in called_list]
+                for tmp_name, called_list in call_graph.items()}
+
+    @staticmethod
+    def decode_call_graph(encoded, names):
+        """把编号形式的调用图还原为名称
+
+        参数:
+        - encoded: 某个符号表 (例如工作进程的局部符号表) encode_call_graph() 的结果
+        - names: 该符号表的编号 -> 名称列表，通常先经 intern_list() 换成本符号表中的对象
+        """
+        return {names[tmp_id]: [names[called_id] for called_id in called_ids]
+                for tmp_id, called_ids in encoded.items()}
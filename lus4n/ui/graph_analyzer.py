@@ -7,7 +7,14 @@ Lus4n - 图分析模块
 
 import os
 import networkx as nx
-from joblib import load
+
+from lus4n.builder import build_network
+from lus4n.storage import load_storage
+from lus4n import depends
+
+
+# 所选聚合方式折叠后仍超出上限时，依次改用更粗的分组 ('directory' 之后按目录层级逐级上收)
+CLUSTER_FALLBACK_MODES = ("file", "directory")
 
 
 class GraphAnalyzer:
@@ -17,6 +24,9 @@ class GraphAnalyzer:
         self.graph = None
         self.storage_path = None
         self.whole_call_graph = None
+        self.call_sites = None  # 调用表和定义表 (lus4n.sites.CallSiteTable)，旧存储文件没有
+        self._storage_data = None
+        self._dependency_graph = None  # 模块依赖图 (lus4n.depends)，首次使用时构建
     
     def load_graph(self, storage_path):
         """从存储文件加载图数据"""
@@ -24,7 +34,10 @@ class GraphAnalyzer:
             raise FileNotFoundError(f"存储文件不存在: {storage_path}")
         
         self.storage_path = storage_path
-        loaded_data = load(storage_path)
+        loaded_data = load_storage(storage_path)
+        self.call_sites = None
+        self._storage_data = loaded_data
+        self._dependency_graph = None
         
         # 检查加载的数据类型，确保返回有效的 networkx 图对象
         if isinstance(loaded_data, dict):
@@ -32,61 +45,23 @@ class GraphAnalyzer:
             if 'whole_call_network' in loaded_data:
                 self.graph = loaded_data['whole_call_network']
                 self.whole_call_graph = loaded_data.get('whole_call_graph', {})
+                self.call_sites = loaded_data.get('call_sites')
+            elif 'dependency_network' in loaded_data:
+                # lus4n deps 快速扫描的结果只有模块依赖图，以依赖图代替调用网络
+                self.graph = loaded_data['dependency_network']
+                self.whole_call_graph = {}
             else:
-                # 如果没有找到预期的键，尝试把整个字典作为图的数据
-                self.graph = nx.DiGraph()
+                # 如果没有找到预期的键，尝试把整个字典作为各文件的调用图 (没有 require 信息)
                 self.whole_call_graph = loaded_data
-                
-                # 从字典构建图结构
-                for file_path, file_data in loaded_data.items():
-                    if isinstance(file_data, dict):
-                        self.graph.add_node(file_path, role='file')
-                        # 处理文件中的函数调用关系
-                        self._build_graph_from_call_data(file_path, file_data)
+                self.graph = build_network(
+                    {file_path: file_data for file_path, file_data in loaded_data.items() if isinstance(file_data, dict)}
+                )
         else:
             # 假设已经是 networkx 图对象
             self.graph = loaded_data
             
         return self.graph
     
-    def _build_graph_from_call_data(self, file_path, call_data):
-        """从调用数据构建图结构"""
-        if not isinstance(call_data, dict):
-            return
-            
-        package_name = os.path.basename(file_path).replace(".lua", "")
-        
-        for tmp_name, called_list in call_data.items():
-            # 处理全局调用
-            if tmp_name == "[G]":
-                import xxhash
-                default_main = f"{package_name}.main.{xxhash.xxh32(file_path).hexdigest()}"
-                self.graph.add_edge(file_path, default_main, action='export')
-                for called in called_list:
-                    self.graph.add_edge(default_main, called, action="call")
-                    
-            # 处理导出函数
-            elif tmp_name.startswith("[X]"):
-                exported = tmp_name.replace("[X]", "")
-                sub_names = exported.split('.')
-                if len(sub_names) > 1:
-                    father = sub_names[0]
-                    left = exported[len(father):]
-                    # 假设没有require数据，简单处理
-                    _exported = f"{package_name}{left}"
-                else:
-                    _exported = exported
-                self.graph.add_edge(file_path, _exported, action="export")
-                for called in called_list:
-                    self.graph.add_edge(_exported, called, action='call')
-                    
-            # 处理局部函数
-            elif tmp_name.startswith("[L]"):
-                defined = tmp_name.replace("[L]", "")
-                self.graph.add_edge(file_path, defined, action="define")
-                for called in called_list:
-                    self.graph.add_edge(defined, called, action='call')
-    
     def get_function_entries(self):
         """获取所有函数入口点（没有被其他函数调用的函数）"""
         if not self.graph:
@@ -102,7 +77,7 @@ class GraphAnalyzer:
             # 检查是否有调用该函数的其他函数（入边）
             has_incoming_calls = False
             for _, _, data in self.graph.in_edges(node, data=True):
-                if data.get('action') == 'call':
+                if data.get('action') in ('call', 'resolve'):
                     has_incoming_calls = True
                     break
                     
@@ -199,6 +174,176 @@ class GraphAnalyzer:
         
         return filtered_nodes
     
+    def group_nodes(self, nodes, mode, depth=None):
+        """按聚合方式为节点分组
+        
+        参数:
+        - nodes: 节点集合
+        - mode: 'file' (按定义文件), 'directory' (按定义文件所在目录),
+          'module' (按模块前缀), 'scc' (按强连通分量)
+        - depth: 'directory' 方式下只取目录的前 depth 级，None 表示完整目录
+        
+        返回:
+        - {分组名: [节点, ...]}，不属于任何分组的节点不出现在结果中
+        """
+        if not self.graph:
+            raise ValueError("请先加载图数据")
+        
+        groups = {}
+        if mode == "scc":
+            sg = self.graph.subgraph(nodes)
+            for i, component in enumerate(nx.strongly_connected_components(sg)):
+                if len(component) > 1:
+                    label = min(component, key=str)
+                    groups[f"环 {i + 1}: {label}"] = list(component)
+            return groups
+        
+        for node in nodes:
+            is_file = self.graph.nodes[node].get("role") == "file"
+            if mode == "file":
+                if is_file:
+                    key = node
+                else:
+                    key = self.get_defining_file(node) or "(未定义函数)"
+            elif mode == "directory":
+                file_node = node if is_file else self.get_defining_file(node)
+                if file_node is None:
+                    key = "(未定义函数)"
+                else:
+                    parts = os.path.dirname(file_node).replace("\\", "/").strip("/").split("/")
+                    parts = [part for part in parts if part]
+                    key = "/" + "/".join(parts if depth is None else parts[:depth])
+            elif mode == "module":
+                if is_file:
+                    key = os.path.dirname(node) or "/"
+                else:
+                    cut = max(node.rfind("."), node.rfind(":"))
+                    key = node[:cut] if cut > 0 else "(全局)"
+            else:
+                raise ValueError(f"未知的聚合方式: {mode}")
+            groups.setdefault(key, []).append(node)
+        return groups
+    
+    def cluster_nodes(self, nodes, mode, max_visible, keep=None):
+        """细节层次 (LOD) 聚合：折叠分组直到可见元素不超过 max_visible
+        
+        与 filter_nodes_by_importance 不同，这里不会丢弃任何节点，
+        超出预算的部分被折叠成簇，可在查看器中双击展开。
+        所选的聚合方式折叠后仍超出上限时 (例如大部分无环的图按强连通分量几乎无法折叠)，
+        依次改用按文件、按目录聚合，再把目录逐级上收，直到满足上限
+        
+        参数:
+        - nodes: 节点集合
+        - mode: 聚合方式，见 group_nodes
+        - max_visible: 可见元素 (节点 + 簇) 数量上限
+        - keep: 始终单独显示、不参与折叠的节点集合
+        
+        返回:
+        - (分组, 是否超出上限)：分组为 {分组名: [节点, ...]}，只包含需要折叠的分组；
+          所有分组方式都无法满足上限时 (例如 keep 本身已超出) 返回最粗的分组和 True
+        """
+        keep = set(keep or ())
+        if len(nodes) <= max_visible:
+            return {}, False
+        
+        for groups in self._coarser_groupings(nodes, mode):
+            clusters, visible = self._fold_groups(groups, len(nodes), max_visible, keep)
+            if visible <= max_visible:
+                return clusters, False
+        return clusters, True
+    
+    def _coarser_groupings(self, nodes, mode):
+        """依次生成所选方式、后备方式以及逐级上收的目录分组"""
+        directories = {}
+        for current in dict.fromkeys((mode,) + CLUSTER_FALLBACK_MODES):
+            groups = self.group_nodes(nodes, current)
+            if current == "directory":
+                directories = groups
+            yield groups
+        # 完整目录之后每次少取一级，直到全部归入根目录
+        max_depth = max((len(key.strip("/").split("/")) for key in directories if key.startswith("/") and key != "/"),
+                        default=0)
+        for depth in range(max_depth - 1, -1, -1):
+            yield self.group_nodes(nodes, "directory", depth)
+    
+    @staticmethod
+    def _fold_groups(groups, visible, max_visible, keep):
+        """按分组从大到小折叠，直到可见元素不超过 max_visible
+        
+        返回:
+        - ({分组名: [节点, ...]}, 折叠后的可见元素数)
+        """
+        candidates = []
+        for key, members in groups.items():
+            members = [n for n in members if n not in keep]
+            if len(members) > 1:
+                candidates.append((key, members))
+        # 优先折叠最大的分组，用最少的簇换取最多的可见元素
+        candidates.sort(key=lambda item: len(item[1]), reverse=True)
+        
+        clusters = {}
+        for key, members in candidates:
+            if visible <= max_visible:
+                break
+            clusters[key] = members
+            visible -= len(members) - 1
+        return clusters, visible
+    
+    def get_defining_file(self, node):
+        """获取定义函数的文件节点 (通过 export/define 入边)，找不到时返回 None"""
+        for source, _, data in self.graph.in_edges(node, data=True):
+            if data.get('action') in ('export', 'define'):
+                return source
+        return None
+    
+    def get_call_sites(self, function_name):
+        """函数被调用的位置 [(文件, 调用方, 行, 列), ...]，存储文件没有调用位置表时返回空列表"""
+        if self.call_sites is None:
+            return []
+        return self.call_sites.calls_to(function_name)
+    
+    def get_definition_sites(self, function_name):
+        """函数的定义位置 [(文件, 行, 列), ...]，存储文件没有调用位置表时返回空列表"""
+        if self.call_sites is None:
+            return []
+        return self.call_sites.definitions_of(function_name)
+    
+    def get_dependency_graph(self):
+        """模块依赖图 (文件 -require-> 文件/外部模块)，存储文件没有 require 信息时返回 None"""
+        if self._dependency_graph is None and self._storage_data is not None:
+            self._dependency_graph = depends.dependency_graph_of(self._storage_data)
+        return self._dependency_graph
+    
+    def _require_dependency_graph(self):
+        graph = self.get_dependency_graph()
+        if graph is None:
+            raise ValueError("存储文件中没有 require 信息")
+        return graph
+    
+    def get_module_dependencies(self, file_node, transitive=False):
+        """文件 require 的文件和外部模块，transitive 为 True 时包括间接依赖"""
+        graph = self._require_dependency_graph()
+        if file_node not in graph:
+            raise ValueError(f"依赖图中没有该文件: {file_node}")
+        nodes = nx.descendants(graph, file_node) if transitive else graph.successors(file_node)
+        return sorted(nodes)
+    
+    def get_module_dependents(self, file_node, transitive=False):
+        """require 该文件 (或外部模块) 的文件，transitive 为 True 时包括间接依赖它的文件"""
+        graph = self._require_dependency_graph()
+        if file_node not in graph:
+            raise ValueError(f"依赖图中没有该文件: {file_node}")
+        nodes = nx.ancestors(graph, file_node) if transitive else graph.predecessors(file_node)
+        return sorted(nodes)
+    
+    def get_dependency_layers(self):
+        """文件的拓扑分层，第 0 层不依赖其他文件，见 lus4n.depends.dependency_layers"""
+        return depends.dependency_layers(self._require_dependency_graph())
+    
+    def get_dependency_cycles(self):
+        """循环 require 的文件组"""
+        return depends.dependency_cycles(self._require_dependency_graph())
+    
     def separate_nodes_by_type(self, nodes):
         """将节点分为文件节点和函数节点"""
         if not self.graph:
@@ -306,7 +451,8 @@ class GraphAnalyzer:
         - top_n: 返回前 N 个热点函数
         
         返回:
-        - 列表,每项为 (函数名, 被调用次数, 调用者数量, 被调用者数量)
+        - 列表,每项为 (函数名, 被调用次数, 调用其他函数次数)；次数按边的权重 (调用发生的次数) 累加，
+          没有权重的旧存储文件按边数计算
         """
         if not self.graph:
             raise ValueError("请先加载图数据")
@@ -317,8 +463,8 @@ class GraphAnalyzer:
             if "role" in self.graph.nodes[node] and self.graph.nodes[node]["role"] == "file":
                 continue
             
-            in_degree = self.graph.in_degree(node)
-            out_degree = self.graph.out_degree(node)
+            in_degree = self.graph.in_degree(node, weight='weight')
+            out_degree = self.graph.out_degree(node, weight='weight')
             
             # 只统计被调用过的函数
             if in_degree > 0:
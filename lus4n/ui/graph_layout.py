@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 图布局模块
+在 Python 端预先计算节点坐标，渲染时直接使用固定坐标并关闭浏览器物理引擎
+"""
+
+import math
+from collections import OrderedDict, deque
+
+import networkx as nx
+
+# 检查 numpy 是否可用 (力导向布局的向量化实现依赖 numpy)
+NUMPY_AVAILABLE = False
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    pass
+
+
+# 节点数达到该值时在 Python 端预计算布局
+LAYOUT_PRECOMPUTE_THRESHOLD = 150
+
+# 布局缓存的最大条目数
+LAYOUT_CACHE_SIZE = 32
+
+NODE_SPACING = 150
+LEVEL_SEPARATION = 150
+
+# 力导向布局的向心力系数
+GRAVITY = 1.0
+
+
+def normalize_layout_option(layout_option):
+    """统一布局选项文本 (界面文本中括号前是否有空格并不固定)"""
+    return (layout_option or "").replace(" ", "")
+
+
+def _layer_assignment(graph):
+    """分层：在强连通分量缩点后的 DAG 上按最长路径分配层号"""
+    condensed = nx.condensation(graph)
+    members = condensed.graph["mapping"]
+    scc_layer = {}
+    for scc in nx.topological_sort(condensed):
+        preds = list(condensed.predecessors(scc))
+        scc_layer[scc] = max((scc_layer[p] + 1 for p in preds), default=0)
+    return {node: scc_layer[members[node]] for node in graph.nodes()}
+
+
+def _order_layers(graph, layer_of, sweeps=4):
+    """重心法 (barycenter) 排序每层节点，减少边交叉"""
+    layers = {}
+    for node, layer in layer_of.items():
+        layers.setdefault(layer, []).append(node)
+    ordered = [sorted(layers[i], key=str) for i in sorted(layers)]
+    position = {}
+    for nodes in ordered:
+        for i, node in enumerate(nodes):
+            position[node] = i
+
+    for sweep in range(sweeps):
+        downward = sweep % 2 == 0
+        indices = range(1, len(ordered)) if downward else range(len(ordered) - 2, -1, -1)
+        for idx in indices:
+            neighbors = graph.predecessors if downward else graph.successors
+            barycenter = {}
+            for node in ordered[idx]:
+                adjacent = [position[n] for n in neighbors(node) if n in position
+                            and layer_of[n] != layer_of[node]]
+                barycenter[node] = (sum(adjacent) / len(adjacent)) if adjacent else position[node]
+            ordered[idx].sort(key=lambda n: barycenter[n])
+            for i, node in enumerate(ordered[idx]):
+                position[node] = i
+    return ordered
+
+
+def hierarchical_layout(graph, direction="UD"):
+    """Sugiyama 风格分层布局：缩点分层、重心排序、居中摆放"""
+    if graph.number_of_nodes() == 0:
+        return {}
+    layer_of = _layer_assignment(graph)
+    ordered = _order_layers(graph, layer_of)
+    positions = {}
+    for level, nodes in enumerate(ordered):
+        offset = (len(nodes) - 1) * NODE_SPACING / 2
+        for i, node in enumerate(nodes):
+            along = i * NODE_SPACING - offset
+            across = level * LEVEL_SEPARATION
+            positions[node] = (across, along) if direction == "LR" else (along, across)
+    return positions
+
+
+def circular_layout(graph):
+    """圆形布局"""
+    nodes = sorted(graph.nodes(), key=str)
+    count = len(nodes)
+    if count == 0:
+        return {}
+    radius = max(200.0, count * NODE_SPACING / (2 * math.pi) / 2)
+    return {
+        node: (radius * math.cos(2 * math.pi * i / count), radius * math.sin(2 * math.pi * i / count))
+        for i, node in enumerate(nodes)
+    }
+
+
+def radial_layout(graph, center=None):
+    """放射状布局：以查询节点为中心，按无向 BFS 距离排列成同心圆"""
+    if graph.number_of_nodes() == 0:
+        return {}
+    undirected = graph.to_undirected(as_view=True)
+    if center is None or center not in graph:
+        center = max(graph.nodes(), key=graph.degree)
+
+    rings = {}
+    seen = {center}
+    queue = deque([(center, 0)])
+    while queue:
+        node, dist = queue.popleft()
+        rings.setdefault(dist, []).append(node)
+        for neighbor in undirected.neighbors(node):
+            if neighbor not in seen:
+                seen.add(neighbor)
+                queue.append((neighbor, dist + 1))
+    # 与中心不连通的节点放在最外圈
+    rest = [n for n in graph.nodes() if n not in seen]
+    if rest:
+        rings[max(rings) + 1] = rest
+
+    positions = {}
+    for dist, nodes in rings.items():
+        if dist == 0:
+            positions[nodes[0]] = (0.0, 0.0)
+            continue
+        radius = max(dist * LEVEL_SEPARATION, len(nodes) * NODE_SPACING / (2 * math.pi) / 2)
+        for i, node in enumerate(nodes):
+            angle = 2 * math.pi * i / len(nodes)
+            positions[node] = (radius * math.cos(angle), radius * math.sin(angle))
+    return positions
+
+
+def force_directed_layout(graph, iterations=60, seed=42):
+    """向量化 Fruchterman-Reingold 力导向布局
+
+    numpy 不可用时退回分层布局
+    """
+    nodes = list(graph.nodes())
+    count = len(nodes)
+    if count == 0:
+        return {}
+    if not NUMPY_AVAILABLE:
+        return hierarchical_layout(graph)
+    if count == 1:
+        return {nodes[0]: (0.0, 0.0)}
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges() if u != v], dtype=np.int64)
+    rng = np.random.default_rng(seed)
+    pos = rng.random((count, 2)) * math.sqrt(count)
+    k = 1.0
+    temperature = math.sqrt(count) / 10
+
+    for _ in range(iterations):
+        # 斥力：k^2 / d，沿位移方向分解后等价于 delta * k^2 / d^2
+        dx = pos[:, 0, None] - pos[None, :, 0]
+        dy = pos[:, 1, None] - pos[None, :, 1]
+        dist2 = dx * dx + dy * dy
+        np.fill_diagonal(dist2, np.inf)
+        np.maximum(dist2, 1e-4, out=dist2)
+        inv = (k * k) / dist2
+        displacement = np.stack(((dx * inv).sum(axis=1), (dy * inv).sum(axis=1)), axis=1)
+        # 引力：d^2 / k，只作用于有边相连的节点
+        if len(edges):
+            edge_delta = pos[edges[:, 0]] - pos[edges[:, 1]]
+            edge_distance = np.sqrt((edge_delta ** 2).sum(axis=-1))
+            force = edge_delta * (edge_distance / k)[:, None]
+            np.add.at(displacement, edges[:, 0], -force)
+            np.add.at(displacement, edges[:, 1], force)
+        # 向心力：避免孤立节点和小连通分量被斥力推得过远
+        displacement -= GRAVITY * (pos - pos.mean(axis=0))
+        length = np.maximum(np.sqrt((displacement ** 2).sum(axis=-1)), 0.01)
+        pos += displacement / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+
+    pos -= pos.mean(axis=0)
+    scale = NODE_SPACING / k
+    return {node: (float(pos[i, 0] * scale), float(pos[i, 1] * scale)) for i, node in enumerate(nodes)}
+
+
+class GraphLayout:
+    """布局计算入口，按 (子图的节点和边, 布局方式, 中心节点) 缓存结果"""
+
+    def __init__(self, cache_size=LAYOUT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def _cache_key(self, sg, layout_option, center):
+        # 布局只取决于子图本身：以子图的节点和边为键，重新加载或修改后的调用网络中
+        # 同一组节点的连线有变化时不会命中旧的坐标 (不能用 id(graph)，释放后的对象 id 会被复用)
+        return (frozenset(sg), frozenset(sg.edges()), normalize_layout_option(layout_option), center)
+
+    def compute(self, graph, nodes, layout_option, center=None):
+        """计算 nodes 构成的子图在指定布局方式下的坐标
+
+        返回:
+        - {节点: (x, y)}
+        """
+        sg = graph.subgraph(nodes)
+        key = self._cache_key(sg, layout_option, center)
+        positions = self._cache.get(key)
+        if positions is not None:
+            self._cache.move_to_end(key)
+            return positions
+
+        option = normalize_layout_option(layout_option)
+        if option == "分层布局(上到下)":
+            positions = hierarchical_layout(sg, "UD")
+        elif option == "分层布局(左到右)":
+            positions = hierarchical_layout(sg, "LR")
+        elif option == "圆形布局":
+            positions = circular_layout(sg)
+        elif option == "放射状布局":
+            positions = radial_layout(sg, center)
+        else:
+            positions = force_directed_layout(sg)
+
+        self._cache[key] = positions
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return positions
+
+    def clear(self):
+        """清空布局缓存"""
+        self._cache.clear()
@@ -5,14 +5,28 @@ Lus4n - 图形可视化模块
 用于处理调用图的可视化展示
 """
 
-import os
-import sys
-import uuid
-import shutil
 import webbrowser
 import tempfile
-from pyvis.network import Network as PyvisNetwork
-from .custom_network import CustomNetwork
+import networkx as nx
+from .graph_layout import GraphLayout, LAYOUT_PRECOMPUTE_THRESHOLD, normalize_layout_option
+from .viewer import export_standalone_html
+
+
+HIERARCHICAL_OPTIONS = {
+    "enabled": True,
+    "sortMethod": "directed",
+    "nodeSpacing": 150,
+    "levelSeparation": 150
+}
+
+EDGE_ARROWS = {'to': {'enabled': True, 'type': 'arrow'}}
+
+# 所有节点/边共有的属性放进选项的默认值，不在每个元素上重复序列化
+NODE_DEFAULTS = {"shape": "dot"}
+EDGE_DEFAULTS = {"arrows": EDGE_ARROWS}
+
+# 簇节点 ID 前缀，避免与函数名/文件路径冲突
+CLUSTER_ID_PREFIX = "__lus4n_cluster__:"
 
 
 class GraphVisualizer:
@@ -20,262 +34,213 @@ class GraphVisualizer:
     
     def __init__(self):
         self.temp_dir = tempfile.gettempdir()
+        self.layout = GraphLayout()
     
-    def create_network(self, height="800px", width="100%"):
-        """创建一个新的网络图实例"""
-        return CustomNetwork(notebook=True, height=height, width=width)
-    
-    def apply_layout(self, net, layout_option):
-        """应用指定的布局设置到网络图"""
-        if layout_option == "分层布局 (上到下)":
-            net.set_options("""
-            {
-              "layout": {
-                "hierarchical": {
-                  "enabled": true,
-                  "direction": "UD",
-                  "sortMethod": "directed",
-                  "nodeSpacing": 150,
-                  "levelSeparation": 150
-                }
-              }
-            }
-            """)
-        elif layout_option == "分层布局 (左到右)":
-            net.set_options("""
-            {
-              "layout": {
-                "hierarchical": {
-                  "enabled": true,
-                  "direction": "LR",
-                  "sortMethod": "directed",
-                  "nodeSpacing": 150,
-                  "levelSeparation": 150
-                }
-              }
-            }
-            """)
+    def layout_options(self, layout_option):
+        """获取布局方式对应的 vis.js 选项"""
+        layout_option = normalize_layout_option(layout_option)
+        if layout_option == "分层布局(上到下)":
+            return {"layout": {"hierarchical": dict(HIERARCHICAL_OPTIONS, direction="UD")}}
+        elif layout_option == "分层布局(左到右)":
+            return {"layout": {"hierarchical": dict(HIERARCHICAL_OPTIONS, direction="LR")}}
         elif layout_option == "圆形布局":
-            net.set_options("""
-            {
-              "layout": {
-                "circular": {
-                  "enabled": true
-                }
-              }
-            }
-            """)
+            return {"layout": {"circular": {"enabled": True}}}
         elif layout_option == "放射状布局":
-            net.set_options("""
-            {
-              "layout": {
-                "improvedLayout": true
-              }
-            }
-            """)
-        return net
+            return {"layout": {"improvedLayout": True}}
+        return {}
     
-    def _copy_static_files(self, target_dir):
-        """
-        复制静态资源文件到目标目录，用于离线环境
-        """
-        # 获取静态资源目录路径
-        static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+    @staticmethod
+    def _subgraph_elements(graph, nodes):
+        """一次遍历得到子图的节点列表和边列表
         
-        # 复制 vis.js 和 vis.css 文件到目标目录
-        try:
-            shutil.copy(os.path.join(static_dir, 'vis.min.js'), target_dir)
-            shutil.copy(os.path.join(static_dir, 'vis.min.css'), target_dir)
-            return True
-        except Exception as e:
-            print(f"复制静态资源文件失败：{e}")
-            return False
-            
-    def _check_static_resources(self):
-        """
-        检查静态资源文件是否可用
+        返回:
+        - (节点列表, [(起点, 终点), ...])
         """
-        static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-        vis_js_path = os.path.join(static_dir, 'vis.min.js')
-        vis_css_path = os.path.join(static_dir, 'vis.min.css')
-        
-        return os.path.exists(vis_js_path) and os.path.exists(vis_css_path)
+        node_list = [node for node in dict.fromkeys(nodes) if node in graph]
+        node_set = set(node_list)
+        succ = graph.succ
+        edge_list = [(u, v) for u in node_list for v in succ[u] if v in node_set]
+        return node_list, edge_list
     
-    def render_graph(self, graph, nodes, query_node=None, 
-                    show_physics=True, size_by_importance=True, 
-                    layout="力导向布局", ancestors=None, descendants=None):
-        """
-        渲染图形
+    @staticmethod
+    def _node_items(graph, node_list, edge_list, size_by_importance, ancestors, descendants):
+        """批量生成查看器使用的节点数据 (大小、颜色和提示文本)
         
-        参数:
-        - graph: networkx 图对象
-        - nodes: 要显示的节点集合
-        - query_node: 查询节点（如果有）
-        - show_physics: 是否显示物理引擎效果
-        - size_by_importance: 是否根据重要性调整节点大小
-        - layout: 布局方式
-        - ancestors: 调用者节点集合（用于双向查询时区分颜色）
-        - descendants: 被调用者节点集合（用于双向查询时区分颜色）
+        度数由边列表一次统计得到，不再对子图视图逐节点查询；
+        形状等公共属性由 NODE_DEFAULTS 提供，不写进每个节点
         
         返回:
-        - 生成的 HTML 文件路径
-        - 渲染后的网络图对象
+        - {节点: {"id": ..., "label": ..., "size": ..., "color": ..., "title": ...}}
         """
-        # 创建子图
-        sg = graph.subgraph(nodes)
-        
-        # 生成可视化
-        net = self.create_network()
-        
-        # 应用布局
-        self.apply_layout(net, layout)
-        
-        # 设置物理引擎
-        if not show_physics:
-            # 使用 options 直接设置物理引擎状态，避免使用 toggle_physics 可能导致的错误
-            physics_options = """
-            {
-              "physics": {
-                "enabled": false
-              }
-            }
-            """
-            net.set_options(physics_options)
-        
-        # 添加查询节点
-        if query_node and query_node in nodes:
-            net.add_node(query_node, color="#FF6D3F", size=25, title=f"查询：{query_node}")
-        
-        # 添加其他节点
-        for node in sg.nodes():
-            if node == query_node:
-                continue
-                
+        in_degree = dict.fromkeys(node_list, 0)
+        out_degree = dict.fromkeys(node_list, 0)
+        for u, v in edge_list:
+            out_degree[u] += 1
+            in_degree[v] += 1
+        
+        bidirectional = bool(ancestors and descendants)
+        node_data = graph.nodes
+        items = {}
+        for node in node_list:
+            called = in_degree[node]
             # 设置节点属性
             if size_by_importance:
-                # 计算节点度数作为重要性
-                importance = sg.in_degree(node) + sg.out_degree(node)
-                size = min(10 + importance * 2, 30)  # 限制最大尺寸
+                # 节点度数作为重要性，限制最大尺寸
+                size = min(10 + (called + out_degree[node]) * 2, 30)
             else:
                 size = 15  # 默认大小
             
-            # 设置节点颜色
-            if "role" in graph.nodes[node] and graph.nodes[node]["role"] == "file":
+            title = f"{node} (被调用：{called}次)"
+            if node_data[node].get("role") == "file":
                 color = "#6BAED6"  # 蓝色表示文件
-            elif ancestors and descendants:  # 双向查询模式
+            elif bidirectional:  # 双向查询模式
                 if node in ancestors:
                     color = "#8BC34A"  # 绿色表示调用者
                 elif node in descendants:
                     color = "#FFA726"  # 橙色表示被调用者
                 else:
                     color = "#C7E9B4"  # 默认浅绿色
-            else:
+            elif called > 10:
                 # 函数节点根据入度 (被调用次数) 设置颜色深浅
-                in_degree = sg.in_degree(node)
-                if in_degree > 10:
-                    color = "#2C7FB8"  # 深蓝色表示重要函数
-                elif in_degree > 5:
-                    color = "#7FCDBB"  # 中等蓝绿色
-                else:
-                    color = "#C7E9B4"  # 浅绿色
+                color = "#2C7FB8"  # 深蓝色表示重要函数
+            elif called > 5:
+                color = "#7FCDBB"  # 中等蓝绿色
+            else:
+                color = "#C7E9B4"  # 浅绿色
             
-            # 构建节点标题
-            title = f"{node} (被调用：{sg.in_degree(node)}次)"
-            if ancestors and descendants:
+            if bidirectional:
                 if node in ancestors:
                     title += " [调用者]"
                 elif node in descendants:
                     title += " [被调用者]"
             
-            net.add_node(node, size=size, color=color, title=title)
-        
-        # 添加边
-        for edge in sg.edges():
-            net.add_edge(edge[0], edge[1], arrows={'to': {'enabled': True, 'type': 'arrow'}})
-        
-        # 创建临时目录用于存放 HTML 和静态资源
-        temp_uuid = str(uuid.uuid4())
-        temp_output_dir = os.path.join(self.temp_dir, f"lus4n_{temp_uuid}")
-        os.makedirs(temp_output_dir, exist_ok=True)
-        
-        # 检查静态资源是否可用
-        static_resources_available = self._check_static_resources()
-        
-        # 复制静态资源文件到临时目录
-        copy_success = False
-        if static_resources_available:
-            copy_success = self._copy_static_files(temp_output_dir)
-        
-        # 获取模板路径
-        # 尝试多个可能的位置查找模板文件
-        template_paths = [
-            # 1. 标准路径
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'template.html'),
-            # 2. 打包环境中的路径
-            os.path.join(os.path.dirname(sys.executable), 'lus4n', 'ui', 'static', 'template.html') if getattr(sys, 'frozen', False) else None,
-            # 3. pyvis 包路径
-            os.path.join(os.path.dirname(sys.executable), 'pyvis', 'templates', 'template.html') if getattr(sys, 'frozen', False) else None
-        ]
-        
-        # 过滤掉 None 值
-        template_paths = [p for p in template_paths if p]
-        
-        # 查找第一个存在的模板路径
-        template_path = next((p for p in template_paths if p and os.path.exists(p)), None)
-        
-        # 同样处理备用模板
-        fallback_template_paths = [
-            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'fallback_template.html'),
-            os.path.join(os.path.dirname(sys.executable), 'lus4n', 'ui', 'static', 'fallback_template.html') if getattr(sys, 'frozen', False) else None,
-            os.path.join(os.path.dirname(sys.executable), 'pyvis', 'templates', 'fallback_template.html') if getattr(sys, 'frozen', False) else None
-        ]
+            items[node] = {"id": node, "label": node, "size": size, "color": color, "title": title}
+        return items
+    
+    def _precompute_positions(self, graph, nodes, sg, layout, query_node):
+        """节点较多时在 Python 端预计算坐标，否则返回 None 交给 vis.js 布局"""
+        if len(sg) >= LAYOUT_PRECOMPUTE_THRESHOLD:
+            return self.layout.compute(graph, nodes, layout, center=query_node)
+        return None
+    
+    def build_graph_data(self, graph, nodes, query_node=None,
+                         show_physics=True, size_by_importance=True,
+                         layout="力导向布局", ancestors=None, descendants=None,
+                         clusters=None):
+        """
+        构建查看器页面使用的图数据
         
-        fallback_template_paths = [p for p in fallback_template_paths if p]
-        fallback_template_path = next((p for p in fallback_template_paths if p and os.path.exists(p)), None)
+        节点和边数组在一次遍历中直接生成，公共属性放在 options 的 nodes/edges 默认值中，
+        大图序列化和 vis.DataSet 批量添加的数据量都只与每个元素自身的属性有关
         
-        # 保存到临时文件
-        show_path = os.path.join(temp_output_dir, "network.html")
+        参数:
+        - graph: networkx 图对象
+        - nodes: 要显示的节点集合
+        - query_node: 查询节点（如果有）
+        - show_physics: 是否显示物理引擎效果
+        - size_by_importance: 是否根据重要性调整节点大小
+        - layout: 布局方式
+        - ancestors: 调用者节点集合（用于双向查询时区分颜色）
+        - descendants: 被调用者节点集合（用于双向查询时区分颜色）
+        - clusters: 需要折叠显示的分组 {分组名: [节点, ...]}，
+          见 GraphAnalyzer.cluster_nodes；折叠的节点在查看器中双击簇后展开
         
-        # 根据静态资源可用性选择模板
-        if static_resources_available and copy_success and os.path.exists(template_path):
-            net.set_template(template_path)
-        elif os.path.exists(fallback_template_path):
-            # 使用备用模板（不依赖外部静态资源）
-            net.set_template(fallback_template_path)
+        返回:
+        - {"nodes": [...], "edges": [...], "options": {...}}，
+          有折叠分组时额外包含 "lod" (展开所需的成员节点和完整边表)
+        """
+        sg = graph.subgraph(nodes)
+        sg_nodes, sg_edges = self._subgraph_elements(graph, nodes)
+        
+        owner = {}
+        cluster_info = {}
+        for i, (key, members) in enumerate((clusters or {}).items()):
+            cluster_id = f"{CLUSTER_ID_PREFIX}{i}"
+            cluster_info[cluster_id] = (key, members)
+            for member in members:
+                owner[member] = cluster_id
+        
+        if owner:
+            # 折叠后的可见元素图，布局只针对可见元素计算
+            visible_graph = nx.DiGraph()
+            visible_graph.add_nodes_from(owner.get(n, n) for n in sg_nodes)
+            visible_graph.add_edges_from(
+                (owner.get(u, u), owner.get(v, v)) for u, v in sg_edges
+                if u not in owner or owner.get(u) != owner.get(v)
+            )
+            positions = self._precompute_positions(
+                visible_graph, visible_graph.nodes(), visible_graph, layout, query_node)
         else:
-            # 使用内联模板作为最后的备用方案
-            print("警告：找不到模板文件，使用内联模板")
-            inline_template = """
-<!doctype html>
-<html>
-<head>
-<meta charset="utf-8">
-<title>Lus4n Network</title>
-<script type="text/javascript" src="https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.min.js"></script>
-<link href="https://cdnjs.cloudflare.com/ajax/libs/vis/4.21.0/vis.min.css" rel="stylesheet" type="text/css" />
-<style type="text/css">
-    #mynetwork {
-        width: 100%;
-        height: 800px;
-        border: 1px solid lightgray;
-    }
-</style>
-</head>
-<body>
-<div id="mynetwork"></div>
-</body>
-</html>
-            """
-            # 创建临时模板文件
-            temp_template_path = os.path.join(temp_output_dir, "temp_template.html")
-            with open(temp_template_path, "w", encoding="utf-8") as f:
-                f.write(inline_template)
-            net.set_template(temp_template_path)
-            
-        net.show(show_path)
+            positions = self._precompute_positions(graph, nodes, sg, layout, query_node)
         
-        return show_path, net
+        # 查看器页面会复用同一个 vis.Network，需要显式关闭上一次的分层布局
+        options = {} if positions is not None else self.layout_options(layout)
+        options.setdefault("layout", {}).setdefault("hierarchical", {"enabled": False})
+        options["physics"] = {"enabled": bool(show_physics and positions is None)}
+        options["nodes"] = dict(NODE_DEFAULTS)
+        options["edges"] = dict(EDGE_DEFAULTS)
         
+        node_list = []
+        if query_node and query_node in nodes:
+            node_list.append(dict(
+                id=query_node, label=query_node,
+                color="#FF6D3F", size=25, title=f"查询：{query_node}",
+                **self._position_options(positions, query_node)
+            ))
+        member_data = {}
+        items = self._node_items(graph, sg_nodes, sg_edges, size_by_importance, ancestors, descendants)
+        for node in sg_nodes:
+            if node == query_node:
+                continue
+            item = items[node]
+            if node in owner:
+                member_data[node] = item
+                continue
+            if positions is not None and node in positions:
+                x, y = positions[node]
+                item["x"] = round(x, 1)
+                item["y"] = round(y, 1)
+            node_list.append(item)
+        
+        if not owner:
+            edge_list = [{"from": u, "to": v} for u, v in sg_edges]
+            return {"nodes": node_list, "edges": edge_list, "options": options}
+        
+        # 簇节点，以及簇之间/簇与节点之间合并后的边
+        lod_clusters = {}
+        for cluster_id, (key, members) in cluster_info.items():
+            cluster_node = dict(
+                id=cluster_id, label=f"{key} ({len(members)})", shape="box",
+                color="#B0BEC5", title=f"{key}：{len(members)} 个节点，双击展开"
+            )
+            lod_clusters[cluster_id] = {"node": cluster_node, "members": members}
+            node_list.append(dict(cluster_node, **self._position_options(positions, cluster_id)))
+        
+        edge_list = [{"from": u, "to": v} for u, v in visible_graph.edges()]
+        
+        return {
+            "nodes": node_list,
+            "edges": edge_list,
+            "options": options,
+            "lod": {
+                "clusters": lod_clusters,
+                "members": member_data,
+                "edges": [[u, v] for u, v in sg_edges],
+            }
+        }
+    
+    def export_html(self, graph_data):
+        """将图数据导出为可在外部浏览器打开的独立页面"""
+        return export_standalone_html(graph_data)
+    
+    @staticmethod
+    def _position_options(positions, node):
+        """预计算坐标对应的节点属性 (预计算坐标时物理引擎整体关闭)"""
+        if positions is None or node not in positions:
+            return {}
+        x, y = positions[node]
+        return {"x": round(x, 1), "y": round(y, 1)}
+    
     def display_graph(self, show_path):
         """在浏览器中显示图形"""
         webbrowser.open_new_tab(f"file://{show_path}")
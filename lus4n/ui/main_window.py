@@ -128,4 +128,6 @@ class Lus4nMainWindow(QMainWindow):
         
         # 保存设置
         self.save_settings()
+        self.scan_tab.stop_watch()
+        self.query_tab.shutdown()
         event.accept()
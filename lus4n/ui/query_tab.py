@@ -7,6 +7,7 @@ Lus4n - 查询选项卡模块
 
 import os
 import tempfile
+from html import escape
 from PySide6.QtCore import QSettings
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTextBrowser,
@@ -17,6 +18,7 @@ from PySide6.QtCore import Qt
 from lus4n.ui.graph_analyzer import GraphAnalyzer
 from lus4n.ui.graph_visualizer import GraphVisualizer
 from lus4n.ui.webview_window import WebViewWindow
+from lus4n.ui.symbol_search import SymbolIndexLoader
 from lus4n.ui.ui_components import (
     StorageSelector,
     VisualizationSettings,
@@ -43,6 +45,8 @@ class QueryTab(QWidget):
         # 设置数据
         self.settings = QSettings("Lusipad", "Lus4n")
         self.last_html_path = None
+        self.index_loaders = []
+        self.index_storage_path = None
         
         # 初始化 UI
         self.init_ui()
@@ -58,6 +62,7 @@ class QueryTab(QWidget):
         
         # 创建存储选择器
         self.storage_selector = StorageSelector(self)
+        self.storage_selector.storage_input.textChanged.connect(self._load_symbol_index)
         main_layout.addWidget(self.storage_selector.get_widget())
         
         # 创建查询输入组件
@@ -126,6 +131,50 @@ class QueryTab(QWidget):
         if self.status_callback:
             self.status_callback(message)
     
+    def _load_symbol_index(self, storage_path):
+        """在后台加载存储文件对应的符号索引"""
+        if not storage_path or not os.path.isfile(storage_path):
+            return
+        if storage_path == self.index_storage_path:
+            return
+        
+        # 旧的加载线程可能仍在运行，保留引用直到结束，过期结果在回调中丢弃
+        self.index_loaders = [t for t in self.index_loaders if t.isRunning()]
+        self.index_storage_path = storage_path
+        loader = SymbolIndexLoader(
+            storage_path, lambda: GraphAnalyzer().load_graph(storage_path)
+        )
+        loader.index_loaded.connect(self._on_symbol_index_loaded)
+        loader.load_error.connect(self._on_symbol_index_error)
+        self.index_loaders.append(loader)
+        loader.start()
+    
+    def refresh_storage(self, storage_path):
+        """存储文件被改写 (例如监视模式更新了调用图) 后重新加载符号索引"""
+        if storage_path != self.storage_selector.get_storage_path():
+            return
+        self.index_storage_path = None
+        self._load_symbol_index(storage_path)
+    
+    def _on_symbol_index_loaded(self, storage_path, index):
+        """符号索引加载完成"""
+        if storage_path != self.storage_selector.get_storage_path():
+            return
+        self.function_query.set_symbol_index(index)
+        self._update_status(f"符号索引已加载：{len(index)} 个函数")
+    
+    def _on_symbol_index_error(self, storage_path, error):
+        """符号索引加载失败，保留普通补全"""
+        if storage_path == self.index_storage_path:
+            self.index_storage_path = None
+        self._update_status(f"符号索引加载失败：{error}")
+    
+    def shutdown(self):
+        """关闭前停止后台线程"""
+        self.function_query.close()
+        for loader in self.index_loaders:
+            loader.wait()
+    
     def _save_settings(self):
         """保存设置"""
         # 保存存储路径
@@ -207,11 +256,21 @@ class QueryTab(QWidget):
             show_files = self.vis_settings.show_file_nodes()
             filtered_nodes = self.analyzer.filter_nodes_by_type(filtered_nodes_set, show_files)
             
-            # 根据最大节点数筛选
+            # 根据最大节点数筛选；启用聚合时不丢弃节点，超出部分折叠为簇
             max_nodes = self.vis_settings.get_max_nodes()
-            filtered_nodes = self.analyzer.filter_nodes_by_importance(
-                filtered_nodes, max_nodes, {function_name}
-            )
+            cluster_mode = self.vis_settings.get_cluster_mode()
+            clusters = {}
+            if cluster_mode:
+                clusters, overflow = self.analyzer.cluster_nodes(
+                    filtered_nodes, cluster_mode, max_nodes, keep={function_name}
+                )
+                if overflow:
+                    self._warn_cluster_overflow(max_nodes)
+                    return
+            else:
+                filtered_nodes = self.analyzer.filter_nodes_by_importance(
+                    filtered_nodes, max_nodes, {function_name}
+                )
             
             # 渲染可视化
             layout = self.vis_settings.get_layout_option()
@@ -220,14 +279,15 @@ class QueryTab(QWidget):
             
             self._update_status("正在生成可视化...")
             
-            html_path, net = self.visualizer.render_graph(
+            graph_data = self.visualizer.build_graph_data(
                 graph, filtered_nodes, 
                 query_node=function_name,
                 show_physics=show_physics, 
                 size_by_importance=size_by_importance,
                 layout=layout,
                 ancestors=ancestors_set,
-                descendants=descendants_set
+                descendants=descendants_set,
+                clusters=clusters
             )
             
             # 分离函数节点和文件节点
@@ -242,8 +302,9 @@ class QueryTab(QWidget):
                 <li>函数数量：{len(function_nodes)}</li>
                 <li>文件数量：{len(file_nodes)}</li>
                 <li>总节点数：{len(filtered_nodes)}</li>
-                <li>关系边数：{net.num_edges}</li>
+                <li>关系边数：{len(graph_data['edges'])}</li>
             """
+            result_html += self._cluster_summary_html(graph_data, clusters)
             
             if query_mode == 2:  # 双向关系时显示统计
                 result_html += f"""
@@ -251,20 +312,11 @@ class QueryTab(QWidget):
                 <li>被调用者数量：{len(descendants_set)}</li>
             """
             
-            result_html += """
-            </ul>
-            <p><a href='file://{html_path}' target='_blank'>在浏览器中打开可视化</a></p>
-            """
+            result_html += "</ul>"
+            result_html += self._sites_html(function_name)
             
             self.result_browser.setHtml(result_html)
-            
-            # 在 WebView 中显示 (如果可用),否则在浏览器中打开
-            if self.webview_window:
-                self.webview_window.load_html(html_path)
-            else:
-                self.visualizer.display_graph(html_path)
-            
-            self.last_html_path = html_path
+            self._show_graph_data(graph_data)
             
             self._update_status("查询完成")
             
@@ -277,6 +329,60 @@ class QueryTab(QWidget):
             msgBox.exec_()
             self._update_status("查询失败")
     
+    def _sites_html(self, function_name, limit=50):
+        """函数的定义位置和被调用位置 (取自存储文件中的调用位置表，不需要读取源码)"""
+        definitions = self.analyzer.get_definition_sites(function_name)
+        calls = self.analyzer.get_call_sites(function_name)
+        if not definitions and not calls:
+            return ""
+        html = ""
+        if definitions:
+            html += "<p><b>定义位置：</b></p><ul>"
+            for file_path, line, column in definitions[:limit]:
+                html += f"<li>{escape(file_path)}:{line}:{column}</li>"
+            html += "</ul>"
+        if calls:
+            html += f"<p><b>被调用位置：</b>共 {len(calls)} 处</p><ul>"
+            for file_path, caller, line, column in calls[:limit]:
+                html += f"<li>{escape(file_path)}:{line}:{column}（{escape(caller)}）</li>"
+            if len(calls) > limit:
+                html += f"<li>... 还有 {len(calls) - limit} 处 (未显示)</li>"
+            html += "</ul>"
+        return html
+    
+    def _warn_cluster_overflow(self, max_nodes):
+        """聚合后可见元素仍超过最大节点数时提示，不渲染超出上限的图"""
+        msgBox = QMessageBox(self)
+        msgBox.setWindowTitle("节点过多")
+        msgBox.setText(f"按文件、目录逐级聚合后可见元素仍超过最大节点数 {max_nodes}，未生成可视化。\n\n"
+                       "请调大最大节点数，或关闭聚合改为按重要性筛选节点。")
+        msgBox.setIcon(QMessageBox.Warning)
+        msgBox.setStyleSheet("QLabel{min-width: 400px; color: black;}")
+        msgBox.exec_()
+        self._update_status("聚合后节点仍超出上限")
+    
+    def _cluster_summary_html(self, graph_data, clusters):
+        """聚合统计 (可见元素数、簇数)，未折叠任何分组时返回空串"""
+        if not clusters:
+            return ""
+        folded = sum(len(members) for members in clusters.values())
+        return f"""
+                <li>可见元素数：{len(graph_data['nodes'])}（其中簇 {len(clusters)} 个，折叠节点 {folded} 个，双击簇可展开）</li>
+            """
+    
+    def _show_graph_data(self, graph_data):
+        """显示图数据
+        
+        内嵌 WebView 可用时直接替换常驻查看器中的数据集，否则导出页面并在浏览器中打开
+        """
+        if self.webview_window:
+            self.webview_window.show_graph(graph_data)
+            self.last_html_path = None
+        else:
+            html_path = self.visualizer.export_html(graph_data)
+            self.visualizer.display_graph(html_path)
+            self.last_html_path = html_path
+    
     def list_all_function_entries(self):
         """列出所有函数入口点"""
         storage_path = self.storage_selector.get_storage_path()
@@ -432,11 +538,19 @@ class QueryTab(QWidget):
             show_files = self.vis_settings.show_file_nodes()
             filtered_nodes = self.analyzer.filter_nodes_by_type(all_nodes, show_files)
             
-            # 根据最大节点数筛选
+            # 根据最大节点数筛选；启用聚合时不丢弃节点，超出部分折叠为簇
             max_nodes = self.vis_settings.get_max_nodes()
-            filtered_nodes = self.analyzer.filter_nodes_by_importance(
-                filtered_nodes, max_nodes
-            )
+            cluster_mode = self.vis_settings.get_cluster_mode()
+            clusters = {}
+            if cluster_mode:
+                clusters, overflow = self.analyzer.cluster_nodes(filtered_nodes, cluster_mode, max_nodes)
+                if overflow:
+                    self._warn_cluster_overflow(max_nodes)
+                    return
+            else:
+                filtered_nodes = self.analyzer.filter_nodes_by_importance(
+                    filtered_nodes, max_nodes
+                )
             
             # 渲染可视化
             layout = self.vis_settings.get_layout_option()
@@ -445,11 +559,12 @@ class QueryTab(QWidget):
             
             self._update_status("正在生成可视化...")
             
-            html_path, net = self.visualizer.render_graph(
+            graph_data = self.visualizer.build_graph_data(
                 graph, filtered_nodes, 
                 show_physics=show_physics, 
                 size_by_importance=size_by_importance,
-                layout=layout
+                layout=layout,
+                clusters=clusters
             )
             
             # 分离函数节点和文件节点
@@ -463,21 +578,16 @@ class QueryTab(QWidget):
                 <li>函数数量：{len(function_nodes)}</li>
                 <li>文件数量：{len(file_nodes)}</li>
                 <li>总节点数：{len(filtered_nodes)}</li>
-                <li>关系边数：{net.num_edges}</li>
+                <li>关系边数：{len(graph_data['edges'])}</li>
+            """
+            result_html += self._cluster_summary_html(graph_data, clusters)
+            result_html += """
             </ul>
-            <p><a href='file://{html_path}' target='_blank'>在浏览器中打开可视化</a></p>
             <p>说明：节点大小和颜色深浅表示函数的重要性（被调用次数）。</p>
             """
             
             self.result_browser.setHtml(result_html)
-            
-            # 在 WebView 中显示 (如果可用),否则在浏览器中打开
-            if self.webview_window:
-                self.webview_window.load_html(html_path)
-            else:
-                self.visualizer.display_graph(html_path)
-            
-            self.last_html_path = html_path
+            self._show_graph_data(graph_data)
             
             self._update_status("显示完成")
             
@@ -12,6 +12,8 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtGui import QTextCursor
 from lus4n.ui.scan_thread import ScanThread
+from lus4n.ui.watch_thread import WatchThread
+from lus4n.ignore import IgnoreRules
 
 
 class ScanTab(QWidget):
@@ -22,6 +24,7 @@ class ScanTab(QWidget):
         self.parent = parent
         self.status_callback = status_callback
         self.scan_thread = None
+        self.watch_thread = None
         self.scanning = False
         self.progress_bar = None
         self.default_storage_path = None  # 将在外部设置
@@ -36,7 +39,7 @@ class ScanTab(QWidget):
         path_group = QGroupBox("代码路径")
         path_layout = QHBoxLayout(path_group)
         self.path_input = QLineEdit()
-        self.path_input.setPlaceholderText("选择要扫描的 Lua 代码路径")
+        self.path_input.setPlaceholderText("选择要扫描的 Lua 代码路径，也可以填写 tar/zip 压缩包")
         path_browse_btn = QPushButton("浏览...")
         path_browse_btn.clicked.connect(self.browse_path)
         path_layout.addWidget(self.path_input)
@@ -65,6 +68,32 @@ class ScanTab(QWidget):
         extensions_layout.addWidget(self.extensions_input)
         layout.addWidget(extensions_group)
         
+        # 忽略规则区域
+        ignore_group = QGroupBox("忽略规则")
+        ignore_layout = QVBoxLayout(ignore_group)
+        ignore_help = QLabel("使用 .gitignore 语法，多个模式用逗号分隔；排除模式优先于 .gitignore 和 .lus4nignore 文件")
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setStyleSheet("color: #000000; background-color: #ffffff;")
+        self.exclude_input.setPlaceholderText("排除模式，例如 build/,tests/fixtures/,*.min.lua")
+        self.include_input = QLineEdit()
+        self.include_input.setStyleSheet("color: #000000; background-color: #ffffff;")
+        self.include_input.setPlaceholderText("包含模式 (可选)，指定后只扫描匹配的文件，例如 usr/lib/lua/**")
+        ignore_options_layout = QHBoxLayout()
+        self.ignore_files_checkbox = QCheckBox("读取 .gitignore 和 .lus4nignore 文件")
+        self.ignore_files_checkbox.setChecked(True)
+        self.ignore_files_checkbox.setStyleSheet("QCheckBox { color: black; }")
+        self.follow_symlinks_checkbox = QCheckBox("进入符号链接指向的目录")
+        self.follow_symlinks_checkbox.setChecked(False)
+        self.follow_symlinks_checkbox.setStyleSheet("QCheckBox { color: black; }")
+        ignore_options_layout.addWidget(self.ignore_files_checkbox)
+        ignore_options_layout.addWidget(self.follow_symlinks_checkbox)
+        ignore_options_layout.addStretch()
+        ignore_layout.addWidget(ignore_help)
+        ignore_layout.addWidget(self.exclude_input)
+        ignore_layout.addWidget(self.include_input)
+        ignore_layout.addLayout(ignore_options_layout)
+        layout.addWidget(ignore_group)
+        
         # 扫描选项区域
         options_group = QGroupBox("扫描选项")
         options_layout = QHBoxLayout(options_group)
@@ -74,8 +103,16 @@ class ScanTab(QWidget):
         self.incremental_checkbox = QCheckBox("启用增量扫描 (只扫描修改的文件)")
         self.incremental_checkbox.setChecked(True)
         self.incremental_checkbox.setStyleSheet("QCheckBox { color: black; }")
+        self.git_checkbox = QCheckBox("使用 git 检测变化 (git 仓库中跳过未修改文件的读取和哈希)")
+        self.git_checkbox.setChecked(False)
+        self.git_checkbox.setStyleSheet("QCheckBox { color: black; }")
+        self.watch_checkbox = QCheckBox("扫描完成后持续监视文件变化 (自动更新调用图)")
+        self.watch_checkbox.setChecked(False)
+        self.watch_checkbox.setStyleSheet("QCheckBox { color: black; }")
         options_layout.addWidget(self.multiprocess_checkbox)
         options_layout.addWidget(self.incremental_checkbox)
+        options_layout.addWidget(self.git_checkbox)
+        options_layout.addWidget(self.watch_checkbox)
         options_layout.addStretch()
         layout.addWidget(options_group)
         
@@ -162,11 +199,17 @@ class ScanTab(QWidget):
         extensions = [ext.strip() for ext in self.extensions_input.text().split(",")]
         use_multiprocess = self.multiprocess_checkbox.isChecked()
         use_incremental = self.incremental_checkbox.isChecked()
+        use_git = self.git_checkbox.isChecked()
+        rules = self.get_ignore_rules(path)
+        follow_symlinks = self.follow_symlinks_checkbox.isChecked()
         
         # 显示进度条 (初始为不确定模式,收到进度信号后切换为确定模式)
         if self.progress_bar:
             self.progress_bar.setVisible(True)
             self.progress_bar.setRange(0, 0)  # 初始不确定进度模式,收集文件时使用
+        # 扫描与监视会写同一个存储文件，先停止正在进行的监视
+        self.stop_watch()
+        
         self.update_status("正在扫描...")
         self.scanning = True
         
@@ -185,7 +228,8 @@ class ScanTab(QWidget):
                 pass  # 忽略断开连接时的错误
         
         # 创建并启动扫描线程
-        self.scan_thread = ScanThread(path, storage, extensions, use_multiprocess, use_incremental)
+        self.scan_thread = ScanThread(path, storage, extensions, use_multiprocess, use_incremental, use_git,
+                                      rules, follow_symlinks)
         
         # 连接信号
         self.scan_thread.update_log.connect(self.log)
@@ -216,6 +260,13 @@ class ScanTab(QWidget):
         if hasattr(self.parent, 'query_tab') and self.parent.query_tab:
             self.parent.query_tab.set_storage_path(self.storage_input.text())
         
+        # 启动文件监视
+        if self.watch_checkbox.isChecked() and not os.path.isdir(self.scan_thread.path):
+            self.log("压缩包无法监视文件变化，已跳过监视模式")
+        elif self.watch_checkbox.isChecked():
+            self.start_watch(self.scan_thread.path, self.scan_thread.storage, self.scan_thread.extensions,
+                             self.scan_thread.rules, self.scan_thread.follow_symlinks)
+        
         # 显示完成消息 - 使用自定义格式确保内容可见
         msgBox = QMessageBox(self)
         msgBox.setWindowTitle("扫描完成")
@@ -241,6 +292,12 @@ class ScanTab(QWidget):
         msgBox.setStyleSheet("QLabel{min-width: 400px; color: black;}")
         msgBox.exec_()
     
+    def get_ignore_rules(self, path):
+        """根据界面上的排除/包含模式构建忽略规则"""
+        excludes = [p.strip() for p in self.exclude_input.text().split(",") if p.strip()]
+        includes = [p.strip() for p in self.include_input.text().split(",") if p.strip()]
+        return IgnoreRules(path, excludes, includes, self.ignore_files_checkbox.isChecked())
+    
     def get_path(self):
         """获取当前路径"""
         return self.path_input.text()
@@ -257,9 +314,30 @@ class ScanTab(QWidget):
         """设置存储路径"""
         self.storage_input.setText(path)
     
+    def start_watch(self, path, storage, extensions, rules=None, follow_symlinks=False):
+        """启动文件监视线程"""
+        self.stop_watch()
+        self.watch_thread = WatchThread(path, storage, extensions, rules, follow_symlinks)
+        self.watch_thread.update_log.connect(self.log)
+        self.watch_thread.graph_updated.connect(self.on_graph_updated)
+        self.watch_thread.start()
+    
+    def stop_watch(self):
+        """停止文件监视线程 (等待其保存尚未写回的修改)"""
+        if self.watch_thread:
+            self.watch_thread.stop()
+            self.watch_thread.wait()
+            self.watch_thread = None
+    
+    def on_graph_updated(self, storage):
+        """监视线程写回存储文件后，通知查询选项卡刷新符号索引"""
+        if hasattr(self.parent, 'query_tab') and self.parent.query_tab:
+            self.parent.query_tab.refresh_storage(storage)
+    
     def stop_thread(self):
-        """停止扫描线程"""
+        """停止扫描线程和文件监视线程"""
+        self.stop_watch()
         if self.scan_thread and self.scanning:
+            # 协作式停止：扫描线程写出检查点后自行结束，下次扫描从检查点继续
             self.scan_thread.stop()
-            self.scan_thread.terminate()
             self.scan_thread.wait()
@@ -9,26 +9,74 @@ import networkx as nx
 import multiprocessing
 import xxhash
 from PySide6.QtCore import QThread, Signal
-from joblib import dump, load
-from lus4n.graph import scan_one_file
+from lus4n.graph import scan_one_file, source_chunks, parse_chunk, merge_chunks, NO_SITES
+from lus4n.storage import load_storage, save_storage, save_delta, journal_path, needs_compaction, compact_in_background
+from lus4n.git_changes import collect_changes
+from lus4n.ignore import IgnoreRules, DiscoveryStats, walk_files
+from lus4n.symbol_index import SymbolIndex
+from lus4n.archive import is_archive, scan_archive
+from lus4n.bytecode import is_bytecode
+from lus4n.builder import build_network, build_table, reduce_tables, NETWORK_VERSION
+from lus4n.symbols import SymbolTable
+from lus4n.sites import CallSiteTable, node_sites, count_calls
+from lus4n.resolve import resolve_calls
+from lus4n.checkpoint import ScanCheckpoint, CHECKPOINT_FILES
 
 
 def scan_file_wrapper(args):
     """包装函数,用于多进程调用 scan_one_file
     
-    返回: (file_path, relative_path, call_graph, require, status, encoding)
+    返回: (file_path, relative_path, call_graph, require, status, encoding, sites)
     """
     file_path, encoding, base_path = args
     
     # 调用原始扫描函数
-    _, call_graph, require, status = scan_one_file(file_path, "json", False, encoding)
+    _, call_graph, require, status, sites = scan_one_file(file_path, "json", False, encoding, with_sites=True)
     
     # 计算相对路径
     relative_file_path = file_path[len(base_path):]
     if not relative_file_path.startswith("/"):
         relative_file_path = "/" + relative_file_path
     
-    return (file_path, relative_file_path, call_graph, require, status, encoding)
+    return (file_path, relative_file_path, call_graph, require, status, encoding,
+            node_sites(relative_file_path, sites, require))
+
+
+def scan_chunk_wrapper(args):
+    """多进程扫描一个文件块，同时为其中解析成功的文件生成部分边表和调用位置表
+    
+    调用图、require 列表和调用位置都编码为块内符号表的编号，每个名称在返回数据中只出现一次
+    
+    返回: (块序号, 符号表, [scan_file_wrapper 的前 6 项 (调用图和 require 为编号形式), ...], EdgeTable, CallSiteTable)
+    """
+    chunk_index, chunk, base_path = args
+    results = [scan_file_wrapper((file_path, encoding, base_path)) for file_path, encoding in chunk]
+    succeeded = [result for result in results if result[4] == "成功"]
+    table = build_table((relative_file_path, call_graph, require, count_calls(sites[0]))
+                        for _, relative_file_path, call_graph, require, _, _, sites in succeeded)
+    symbols = SymbolTable()
+    call_sites = CallSiteTable(symbols)
+    for _, relative_file_path, _, _, _, _, sites in succeeded:
+        call_sites.add_file(relative_file_path, sites)
+    encoded = [(file_path, relative_file_path, symbols.encode_call_graph(call_graph or {}),
+                [symbols.id(name) for name in require or ()], status, encoding)
+               for file_path, relative_file_path, call_graph, require, status, encoding, _ in results]
+    return chunk_index, symbols, encoded, table, call_sites
+
+
+def parse_chunk_wrapper(args):
+    """多进程解析大文件的一块
+    
+    返回: (文件路径, 块序号, parse_chunk 的结果)
+    """
+    file_path, index, text, line_offset = args
+    return file_path, index, parse_chunk(file_path, text, line_offset)
+
+
+def _split(items, parts):
+    """把列表分成至多 parts 个连续的块"""
+    size = max(1, -(-len(items) // parts))
+    return [items[i:i + size] for i in range(0, len(items), size)]
 
 
 class ScanThread(QThread):
@@ -40,14 +88,25 @@ class ScanThread(QThread):
     scan_finished = Signal(tuple)        # 扫描完成的信号，传递结果
     scan_error = Signal(str)             # 扫描错误的信号
     
-    def __init__(self, path, storage, extensions, use_multiprocess=True, use_incremental=True):
+    def __init__(self, path, storage, extensions, use_multiprocess=True, use_incremental=True, use_git=False,
+                 rules=None, follow_symlinks=False):
         super().__init__()
         self.path = path
         self.storage = storage
         self.extensions = extensions
         self.use_multiprocess = use_multiprocess
         self.use_incremental = use_incremental
+        self.use_git = use_git
+        self.rules = rules or IgnoreRules(path)
+        self.follow_symlinks = follow_symlinks
         self.stopped = False
+        self.file_requires = {}
+        self._partial_tables = None  # 多进程扫描得到的 (部分边表列表, 已生成边表的文件)
+        self.symbols = SymbolTable()  # 本次扫描的符号表，调用图和调用网络中的名称都取自这里
+        self.call_sites = CallSiteTable(self.symbols)  # 本次解析的文件的调用位置
+        self._sites_recorded = set()  # 本次解析成功、调用位置已记录的文件
+        self._checkpoint = None  # 本次扫描的检查点，中途取消或崩溃后下次扫描从这里继续
+        self._file_hashes = {}  # 本次扫描的文件哈希，写入检查点时使用
     
     def run(self):
         """线程主函数，执行扫描操作"""
@@ -61,34 +120,68 @@ class ScanThread(QThread):
             self.update_log.emit(f"存储文件：{self.storage}")
             self.update_log.emit(f"多进程扫描：{'启用' if self.use_multiprocess else '禁用'}")
             self.update_log.emit(f"增量扫描：{'启用' if self.use_incremental else '禁用'}")
+            self.update_log.emit(f"使用 git 检测变化：{'启用' if self.use_git else '禁用'}")
             
             # 确保存储文件目录存在
             storage_dir = os.path.dirname(self.storage)
             if storage_dir and not os.path.exists(storage_dir):
                 os.makedirs(storage_dir, exist_ok=True)
             
+            self.symbols = SymbolTable()
+            self.call_sites = CallSiteTable(self.symbols)
+            self._sites_recorded = set()
+            self._checkpoint = None
+            self._file_hashes = {}
+            
+            # 压缩包直接读取成员扫描，不做增量比较
+            if os.path.isfile(self.path) and is_archive(self.path):
+                self._scan_archive()
+                return
+            
             # 加载旧的哈希缓存 (用于增量扫描)
             old_file_hashes = {}
             old_call_graph = {}
             old_call_network = nx.DiGraph()
+            old_file_requires = {}
+            old_git_state = {}
+            old_network_version = None
+            old_call_sites = None
+            old_data = None  # 加载的旧存储内容，保存时只把相对它的变化追加到日志
             
             if self.use_incremental and os.path.exists(self.storage):
                 try:
                     self.update_log.emit("加载现有扫描数据用于增量扫描...")
-                    loaded_data = load(self.storage)
+                    loaded_data = load_storage(self.storage)
                     if isinstance(loaded_data, dict):
                         old_file_hashes = loaded_data.get('file_hashes', {})
                         old_call_graph = loaded_data.get('whole_call_graph', {})
                         old_call_network = loaded_data.get('whole_call_network', nx.DiGraph())
+                        old_file_requires = loaded_data.get('file_requires', {})
+                        old_git_state = loaded_data.get('git_state', {})
+                        old_network_version = loaded_data.get('network_version')
+                        old_call_sites = loaded_data.get('call_sites')
+                        old_data = loaded_data
                         self.update_log.emit(f"已加载 {len(old_file_hashes)} 个文件的哈希缓存")
                 except Exception as e:
                     self.update_log.emit(f"加载缓存失败，将进行全量扫描: {str(e)}")
                     old_file_hashes = {}
             
+            # 上次未完成的扫描留下的检查点
+            self._checkpoint = ScanCheckpoint(self.storage, {
+                'path': os.path.abspath(self.path),
+                'extensions': sorted(self.extensions or [".lua"]),
+                'network_version': NETWORK_VERSION,
+            })
+            checkpoint_results = self._checkpoint.load()
+            if checkpoint_results:
+                self.update_log.emit(f"发现上次未完成扫描的检查点：{len(checkpoint_results)} 个文件已解析")
+            resumed = []  # 从检查点恢复的文件 (文件路径, 文件节点名, 检查点中的结果)
+            
             # 收集文件阶段
             self.update_log.emit("正在收集要扫描的文件...")
-            whole_call_graph = old_call_graph.copy() if self.use_incremental else {}
-            whole_call_network = old_call_network.copy() if self.use_incremental else nx.DiGraph()
+            # 旧数据是刚从存储文件读出的独立对象，直接在其上更新，不再复制；调用网络在扫描结束后重新构建
+            whole_call_graph = old_call_graph if self.use_incremental else {}
+            self.file_requires = dict(old_file_requires) if self.use_incremental else {}
             will_scan = []
             new_file_hashes = {}  # 新的哈希缓存
             skipped_by_incremental = 0  # 增量扫描跳过的文件数
@@ -97,29 +190,52 @@ class ScanThread(QThread):
             if not self.extensions:
                 self.extensions = [".lua"]
             
-            # 遍历目录，收集文件
-            all_files = []  # 记录所有文件
+            # 从 git 获取文件列表和变化信息，未修改的文件无需读取和计算哈希
+            git_changes = None
+            old_git_blobs = old_git_state.get('blobs', {})
+            if self.use_git:
+                git_changes = collect_changes(self.path, old_git_state.get('head') if self.use_incremental else None)
+                if git_changes is None:
+                    self.update_log.emit("扫描路径不在 git 仓库中或无法执行 git，改用文件哈希检测变化")
+                else:
+                    self.update_log.emit(
+                        f"git：{len(git_changes.blobs)} 个已跟踪文件，{len(git_changes.dirty)} 个工作区修改，"
+                        f"{len(git_changes.untracked)} 个未跟踪文件"
+                    )
+                    if git_changes.committed is not None and old_git_state.get('head'):
+                        self.update_log.emit(
+                            f"自上次扫描的提交 {old_git_state['head'][:10]} 以来变化 {len(git_changes.committed)} 个文件，"
+                            f"删除 {len(git_changes.deleted)} 个文件"
+                        )
+                    # 已删除文件的调用图不再保留
+                    for deleted in git_changes.deleted or ():
+                        deleted = self._relative_file_path(os.path.join(self.path, deleted))
+                        whole_call_graph.pop(deleted, None)
+                        self.file_requires.pop(deleted, None)
+            
+            # 遍历目录，收集文件 (忽略规则在遍历时生效，被忽略的目录不会进入)
+            discovery = DiscoveryStats()
             skipped_files = []  # 记录跳过的文件
             valid_extension_files = []  # 记录符合扩展名的文件
             
-            for path, dir_list, file_list in os.walk(self.path):
+            for path, dir_list, file_list in self._walk(git_changes, discovery):
                 for file_name in file_list:
                     if self.stopped:
                         self.update_status.emit("扫描已中止")
                         return
                     
                     file_path = os.path.join(path, file_name)
-                    all_files.append(file_path)
-                    
-                    # 1. 首先检查文件是否有指定的后缀，不符合的直接跳过
-                    has_valid_extension = any(file_name.endswith(ext) for ext in self.extensions)
-                    if not has_valid_extension:
-                        _, ext = os.path.splitext(file_name)
-                        skipped_files.append((file_path, f"不符合的文件后缀：{ext}"))
-                        continue
-                    
                     valid_extension_files.append(file_path)
                     
+                    # git 记录的内容与上次扫描时相同，直接复用旧数据
+                    if git_changes is not None and self.use_incremental:
+                        relative_file_path = self._relative_file_path(file_path)
+                        if (relative_file_path in old_file_hashes and self._reusable(relative_file_path, old_call_graph, old_file_requires, old_call_sites)
+                                and git_changes.is_unchanged(relative_file_path.lstrip("/\\"), old_git_blobs)):
+                            new_file_hashes[relative_file_path] = old_file_hashes[relative_file_path]
+                            skipped_by_incremental += 1
+                            continue
+                    
                     # 检查文件是否存在
                     if not os.path.exists(file_path):
                         skipped_files.append((file_path, "文件不存在"))
@@ -133,14 +249,12 @@ class ScanThread(QThread):
                             skipped_files.append((file_path, f"文件读取错误：{str(e)}"))
                             continue
                         
-                        # 2. 检查是否是 lua 字节码文件，不是字节码的就当作文本处理
-                        if content.startswith(b"\x1bL"):
-                            skipped_files.append((file_path, "Lua 字节码文件"))
-                            continue
+                        # 2. Lua 字节码文件由字节码解析器处理，不需要检测编码；其余当作文本处理
+                        bytecode = is_bytecode(content)
                             
                         # 直接进行编码检测，不再检查二进制特征
                         # 尝试检测编码
-                        encodings_to_try = ['utf-8', 'GBK', 'GB2312', 'latin-1']
+                        encodings_to_try = [] if bytecode else ['utf-8', 'GBK', 'GB2312', 'latin-1']
                         detected_encoding = None
                         decoded_content = None
                         
@@ -152,7 +266,7 @@ class ScanThread(QThread):
                             except UnicodeDecodeError:
                                 continue
                         
-                        if detected_encoding is None:
+                        if detected_encoding is None and not bytecode:
                             skipped_files.append((file_path, "无法解码的文件编码"))
                             continue
                         
@@ -164,7 +278,8 @@ class ScanThread(QThread):
                             relative_file_path = "/" + relative_file_path
                         
                         # 检查是否需要重新扫描
-                        if self.use_incremental and relative_file_path in old_file_hashes:
+                        if (self.use_incremental and relative_file_path in old_file_hashes
+                                and self._reusable(relative_file_path, old_call_graph, old_file_requires, old_call_sites)):
                             old_hash, old_mtime = old_file_hashes[relative_file_path]
                             if old_hash == file_hash:
                                 # 文件未修改,跳过扫描,复用旧数据
@@ -175,17 +290,27 @@ class ScanThread(QThread):
                         # 记录新哈希
                         new_file_hashes[relative_file_path] = (file_hash, file_mtime)
                         
+                        # 上次扫描中途停止前已解析过的文件，内容未变时取检查点中的结果
+                        checkpointed = checkpoint_results.get(relative_file_path)
+                        if checkpointed is not None and checkpointed[0] == file_hash:
+                            resumed.append((file_path, relative_file_path, checkpointed))
+                            continue
+                        
                         # 添加文件到扫描列表的条件
                         # 对于用户指定后缀的文件，直接处理，不再检查是否有 Lua 特征
                         will_scan.append((file_path, detected_encoding))
-                        if detected_encoding != 'utf-8':
+                        if detected_encoding not in (None, 'utf-8'):
                             self.update_log.emit(f"文件 {file_path} 使用 {detected_encoding} 编码")
                     except PermissionError:
                         skipped_files.append((file_path, "权限错误"))
                     except Exception as e:
                         skipped_files.append((file_path, f"未知错误：{str(e)}"))
             
-            self.update_log.emit(f"扫描范围：共找到 {len(all_files)} 个文件")
+            self.update_log.emit(f"扫描范围：共找到 {discovery.files} 个文件")
+            self.update_log.emit(
+                f"忽略规则排除 {discovery.ignored} 个文件，跳过 {discovery.pruned_dirs} 个目录；"
+                f"重复文件 {discovery.duplicates} 个，符号链接循环 {discovery.loops} 处"
+            )
             self.update_log.emit(f"符合后缀的文件：{len(valid_extension_files)} 个")
             
             if self.use_incremental:
@@ -193,6 +318,8 @@ class ScanThread(QThread):
                 self.update_log.emit(f"需要扫描：{len(will_scan)} 个新/修改文件")
             else:
                 self.update_log.emit(f"将处理 {len(will_scan)} 个文件")
+            if resumed:
+                self.update_log.emit(f"从检查点恢复：{len(resumed)} 个文件不再重新解析")
             
             # 发送进度信号:初始化进度
             total_files = len(will_scan)
@@ -211,22 +338,83 @@ class ScanThread(QThread):
             # 处理收集到的文件
             self.update_log.emit("\n开始处理文件...")
             processed_files = {}  # 记录处理状态
+            self._file_hashes = new_file_hashes
             
             # 根据设置选择单进程或多进程
             if self.use_multiprocess and total_files > 5:  # 文件数少于5个时不值得用多进程
-                self._scan_with_multiprocess(will_scan, whole_call_graph, whole_call_network, processed_files, total_files)
+                self._scan_with_multiprocess(will_scan, whole_call_graph, processed_files, total_files)
             else:
-                self._scan_with_single_process(will_scan, whole_call_graph, whole_call_network, processed_files, total_files)
+                self._scan_with_single_process(will_scan, whole_call_graph, processed_files, total_files)
+            if self.stopped:
+                self._save_checkpoint()
+                self.update_status.emit("扫描已中止")
+                return
+            
+            # 从检查点恢复的文件 (多进程扫描出错回退时会重置调用位置表，因此在扫描之后记录)
+            for file_path, relative_file_path, (_, status, call_graph, require, sites) in resumed:
+                processed_files[os.path.relpath(file_path, self.path)] = status
+                if status == "成功":
+                    self._record_call_graph(relative_file_path, call_graph, require, whole_call_graph, sites)
+            
+            # 已删除或被忽略的文件不再保留调用图
+            for relative_file_path in [rel for rel in whole_call_graph if rel not in new_file_hashes]:
+                whole_call_graph.pop(relative_file_path)
+                self.file_requires.pop(relative_file_path, None)
             
             # 保存扫描结果
-            self.update_log.emit("\n正在保存扫描结果...")
-            data = {
-                'whole_call_graph': whole_call_graph,
-                'whole_call_network': whole_call_network,
-                'file_status': processed_files,
-                'file_hashes': new_file_hashes  # 保存文件哈希用于下次增量扫描
-            }
-            dump(data, self.storage)
+            git_state = git_changes.state() if git_changes is not None else None
+            unchanged = (
+                self.use_incremental and not will_scan and not resumed
+                and new_file_hashes.keys() == old_file_hashes.keys()
+                and (git_changes is None or git_state['blobs'] == old_git_blobs)
+                and old_network_version == NETWORK_VERSION
+            )
+            if unchanged:
+                # 没有文件变化，存储文件和符号索引保持不变
+                whole_call_network = old_call_network
+                self.update_log.emit("没有文件发生变化，存储文件保持不变")
+            else:
+                # 由全部文件的调用图统一构建调用网络，增量扫描与全量扫描的结果相同
+                self.update_log.emit("\n正在构建调用网络...")
+                whole_call_graph, new_file_hashes = self._intern_scan_data(whole_call_graph, new_file_hashes)
+                call_sites = self._collect_call_sites(whole_call_graph, old_call_sites)
+                whole_call_network = self._build_call_network(whole_call_graph, call_sites.call_counts())
+                resolution = self._resolve_calls(call_sites, whole_call_network)
+                
+                self.update_log.emit("正在保存扫描结果...")
+                data = {
+                    'whole_call_graph': whole_call_graph,
+                    'whole_call_network': whole_call_network,
+                    'file_status': processed_files,
+                    'file_hashes': new_file_hashes,  # 保存文件哈希用于下次增量扫描
+                    'file_requires': self.file_requires,  # 各文件的 require 列表，监视模式据此重建调用网络
+                    'call_sites': call_sites,  # 调用表和定义表，用于边的权重和定位调用位置
+                    'resolution': resolution,  # 跨文件解析结果，解析得到的调用已作为 resolve 边加入调用网络
+                    'network_version': NETWORK_VERSION  # 调用网络的命名规则版本，版本不同时重新构建
+                }
+                if git_state is not None:
+                    data['git_state'] = git_state  # 本次扫描时的 HEAD 和各文件 blob，用于下次检测变化
+                # 同一调用网络版本的增量扫描只追加变化，不重写整个存储文件
+                appended = (old_data is not None and old_network_version == NETWORK_VERSION
+                            and save_delta(old_data, data, self.storage))
+                if appended:
+                    self.update_log.emit(f"变化已追加到存储日志：{journal_path(self.storage)}")
+                else:
+                    save_storage(data, self.storage)
+                
+                # 构建符号索引，供查询补全使用
+                self.update_log.emit("正在构建符号索引...")
+                index = SymbolIndex.build_for_storage(self.storage, whole_call_network)
+                self.update_log.emit(f"符号索引已保存：{SymbolIndex.index_path(self.storage)} ({len(index)} 个函数)")
+                
+                if appended and needs_compaction(self.storage):
+                    # 合并后存储内容不变，符号索引只需更新记录的存储标记
+                    self.update_log.emit("存储日志已较大，在后台合并到存储文件")
+                    storage = self.storage
+                    compact_in_background(storage, lambda old_stamp: SymbolIndex.restamp(storage, old_stamp))
+            
+            # 扫描结果已完整保存，不再需要检查点
+            self._checkpoint.remove()
             
             # 显示处理结果统计
             status_counts = {}
@@ -257,14 +445,125 @@ class ScanThread(QThread):
             
         except Exception as e:
             self.update_log.emit(f"扫描出错：{str(e)}")
+            self._save_checkpoint()
             self.scan_error.emit(str(e))
             self.update_status.emit("扫描出错")
+        finally:
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+    
+    def _save_checkpoint(self):
+        """扫描中止或出错时写出检查点中尚未写出的结果，下次扫描从这里继续"""
+        if self._checkpoint is None:
+            return
+        try:
+            self._checkpoint.flush()
+        except OSError as e:
+            self.update_log.emit(f"写入检查点失败：{str(e)}")
+            return
+        if self._checkpoint.count:
+            self.update_log.emit(f"已保存检查点：{self._checkpoint.count} 个文件的解析结果，下次扫描时继续")
+    
+    def _checkpoint_file(self, relative_file_path, status, call_graph, require, sites):
+        """把一个文件的解析结果记入检查点，sites 为 node_sites 的形式"""
+        file_hash = self._file_hashes.get(relative_file_path)
+        if self._checkpoint is None or file_hash is None:
+            return
+        try:
+            self._checkpoint.add(relative_file_path, file_hash[0], status, call_graph, require, sites)
+        except OSError as e:
+            # 检查点只用于恢复，写入失败不影响本次扫描
+            self.update_log.emit(f"写入检查点失败，本次扫描不再记录检查点：{str(e)}")
+            self._checkpoint.close()
+            self._checkpoint = None
+    
+    def _scan_archive(self):
+        """扫描 tar/zip 压缩包中的 Lua 文件，每次都全量扫描"""
+        self.update_log.emit("输入为压缩包，直接读取其中的文件进行扫描")
+        whole_call_graph = {}
+        self.file_requires = {}
+        processed_files = {}
+        file_hashes = {}
+        
+        jobs = None if self.use_multiprocess else 1
+        for relative_file_path, file_path, call_graph, require, status, content_hash, sites in scan_archive(
+                self.path, self.extensions or [".lua"], self.rules, jobs):
+            if self.stopped:
+                self.update_status.emit("扫描已中止")
+                self.update_log.emit("扫描已被用户中止")
+                return
+            processed_files[relative_file_path.lstrip("/")] = status
+            file_hashes[relative_file_path] = (content_hash, 0)
+            if status == "成功":
+                self._record_call_graph(relative_file_path, call_graph, require, whole_call_graph, sites)
+            self.update_status.emit(f"正在扫描... ({len(processed_files)} 个文件)")
+        
+        self.update_log.emit(f"共扫描 {len(processed_files)} 个文件")
+        whole_call_graph, file_hashes = self._intern_scan_data(whole_call_graph, file_hashes)
+        call_sites = self._collect_call_sites(whole_call_graph, None)
+        whole_call_network = build_network(whole_call_graph, self.file_requires, symbols=self.symbols,
+                                           call_counts=call_sites.call_counts())
+        resolution = self._resolve_calls(call_sites, whole_call_network)
+        save_storage({
+            'whole_call_graph': whole_call_graph,
+            'whole_call_network': whole_call_network,
+            'file_status': processed_files,
+            'file_hashes': file_hashes,
+            'file_requires': self.file_requires,
+            'call_sites': call_sites,
+            'resolution': resolution,
+            'network_version': NETWORK_VERSION
+        }, self.storage)
+        
+        self.update_log.emit("正在构建符号索引...")
+        index = SymbolIndex.build_for_storage(self.storage, whole_call_network)
+        self.update_log.emit(f"符号索引已保存：{SymbolIndex.index_path(self.storage)} ({len(index)} 个函数)")
+        
+        status_counts = {}
+        for status in processed_files.values():
+            status_counts[status] = status_counts.get(status, 0) + 1
+        self.update_log.emit("\n扫描结果统计：")
+        for status, count in status_counts.items():
+            self.update_log.emit(f"- {status}：{count} 个文件")
+        self.update_log.emit("\n扫描完成")
+        
+        self.scan_finished.emit((whole_call_graph, whole_call_network))
+        self.update_status.emit("扫描完成")
+    
+    def _relative_file_path(self, file_path):
+        """文件在调用图中的节点名：相对扫描路径并以 '/' 开头"""
+        relative_file_path = file_path[len(self.path):]
+        if not relative_file_path.startswith("/"):
+            relative_file_path = "/" + relative_file_path
+        return relative_file_path
+    
+    def _walk(self, git_changes, discovery):
+        """按 os.walk 的形式返回要扫描的文件 (已按后缀和忽略规则过滤)
+
+        使用 git 时只列出已跟踪和未跟踪 (未忽略) 的文件
+        """
+        if git_changes is None:
+            yield from walk_files(self.path, self.extensions, self.rules, self.follow_symlinks, discovery)
+            return
+        directories = {}
+        for relative_file_path in git_changes.files():
+            discovery.files += 1
+            if not any(relative_file_path.endswith(ext) for ext in self.extensions):
+                continue
+            if not self.rules.accepts_relative(relative_file_path.replace(os.sep, "/")):
+                discovery.ignored += 1
+                continue
+            discovery.matched += 1
+            directory, file_name = os.path.split(relative_file_path)
+            directories.setdefault(directory, []).append(file_name)
+        for directory, file_list in directories.items():
+            yield os.path.join(self.path, directory) if directory else self.path, [], file_list
     
     def stop(self):
         """安全停止线程"""
         self.stopped = True
     
-    def _scan_with_single_process(self, will_scan, whole_call_graph, whole_call_network, processed_files, total_files):
+    def _scan_with_single_process(self, will_scan, whole_call_graph, processed_files, total_files):
         """单进程扫描"""
         self.update_log.emit(f"使用单进程模式扫描...")
         
@@ -282,16 +581,13 @@ class ScanThread(QThread):
             self.update_status.emit(f"正在扫描... {progress}% ({i + 1}/{total_files})")
             
             # 扫描并处理文件
-            self._process_scan_result(
-                file_path, encoding, self.path,
-                whole_call_graph, whole_call_network, processed_files
-            )
+            self._process_scan_result(file_path, encoding, self.path, whole_call_graph, processed_files)
             
             # 每处理 20 个文件显示一次状态
             if (i + 1) % 20 == 0 or i == len(will_scan) - 1:
                 self.update_log.emit(f"已处理：{i + 1}/{total_files} 个文件")
     
-    def _scan_with_multiprocess(self, will_scan, whole_call_graph, whole_call_network, processed_files, total_files):
+    def _scan_with_multiprocess(self, will_scan, whole_call_graph, processed_files, total_files):
         """多进程扫描"""
         # 计算进程数
         cpu_count = multiprocessing.cpu_count()
@@ -299,102 +595,210 @@ class ScanThread(QThread):
         self.update_log.emit(f"使用多进程模式扫描 (进程数: {process_count}, CPU核心数: {cpu_count})...")
         
         try:
-            # 准备参数列表
-            args_list = [(file_path, encoding, self.path) for file_path, encoding in will_scan]
+            # 大文件在顶层语句边界切分，各块作为单独的任务分发，不让一个进程长时间独占
+            large = self._split_large_files(will_scan)
+            chunk_tasks = [(file_path, index, text, line_offset)
+                           for file_path, chunks in large.items()
+                           for index, (line_offset, text) in enumerate(chunks)]
+            # 其余文件按文件块分发，工作进程在解析的同时为块内的文件生成部分边表；
+            # 块不超过 CHECKPOINT_FILES 个文件，每完成一块都能记入检查点
+            normal = [item for item in will_scan if item[0] not in large]
+            block_count = max(process_count * 4, -(-len(normal) // CHECKPOINT_FILES))
+            args_list = [(i, chunk, self.path) for i, chunk in enumerate(_split(normal, block_count))]
+            tables = [None] * len(args_list)
+            scanned = set()
             
             # 创建进程池
             with multiprocessing.Pool(processes=process_count) as pool:
+                # 大文件的块先进入任务队列，与其余文件块同时解析
+                chunk_results = pool.imap_unordered(parse_chunk_wrapper, chunk_tasks)
                 # 使用 imap_unordered 进行异步处理
                 completed = 0
-                for result in pool.imap_unordered(scan_file_wrapper, args_list, chunksize=max(1, total_files // (process_count * 4))):
+                for chunk_index, chunk_symbols, results, table, call_sites in self._poll(
+                        pool.imap_unordered(scan_chunk_wrapper, args_list)):
                     if self.stopped:
                         pool.terminate()
                         self.update_status.emit("扫描已中止")
                         return
+                    tables[chunk_index] = table
+                    self.call_sites.merge(call_sites)
+                    names = self.symbols.intern_list(chunk_symbols.names)
+                    chunk_sites = call_sites.by_file() if self._checkpoint is not None else {}
                     
-                    # 解包结果
-                    file_path, relative_file_path, call_graph, require, status, encoding = result
-                    
-                    # 处理结果
-                    rel_path = os.path.relpath(file_path, self.path)
-                    processed_files[rel_path] = status
-                    
-                    if status == "成功" and call_graph:
-                        self._add_to_call_network(
-                            relative_file_path, call_graph, require, file_path,
-                            whole_call_graph, whole_call_network
-                        )
-                    
-                    # 更新进度
-                    completed += 1
-                    if completed % 5 == 0 or completed == total_files:
-                        self.update_progress.emit(completed, total_files)
+                    for file_path, relative_file_path, call_graph, require, status, encoding in results:
+                        call_graph = SymbolTable.decode_call_graph(call_graph, names)
+                        require = [names[symbol_id] for symbol_id in require]
+                        # 处理结果
+                        rel_path = os.path.relpath(file_path, self.path)
+                        processed_files[rel_path] = status
+                        
+                        if status == "成功":
+                            self._record_call_graph(relative_file_path, call_graph, require, whole_call_graph)
+                            self._sites_recorded.add(relative_file_path)
+                            scanned.add(relative_file_path)
+                        self._checkpoint_file(relative_file_path, status, call_graph, require,
+                                              chunk_sites.get(relative_file_path, NO_SITES))
+                        
+                        # 更新进度
+                        completed += 1
+                        if completed % 5 == 0 or completed == total_files:
+                            self.update_progress.emit(completed, total_files)
+                        
+                        if completed % 20 == 0 or completed == total_files:
+                            self.update_log.emit(f"已处理：{completed}/{total_files} 个文件")
                     
                     progress = int(completed / total_files * 100)
                     self.update_status.emit(f"正在扫描... {progress}% ({completed}/{total_files})")
-                    
-                    if completed % 20 == 0 or completed == total_files:
-                        self.update_log.emit(f"已处理：{completed}/{total_files} 个文件")
+                
+                # 大文件的各块都解析完后按块的顺序合并；这些文件的边表在构建调用网络时生成
+                parts = {}
+                for file_path, index, result in self._poll(chunk_results):
+                    if self.stopped:
+                        pool.terminate()
+                        self.update_status.emit("扫描已中止")
+                        return
+                    file_parts = parts.setdefault(file_path, {})
+                    file_parts[index] = result
+                    if len(file_parts) < len(large[file_path]):
+                        continue
+                    del parts[file_path]
+                    call_graph, require, status, sites = merge_chunks(
+                        file_path, [file_parts[i] for i in range(len(file_parts))], "json")
+                    processed_files[os.path.relpath(file_path, self.path)] = status
+                    relative_file_path = self._relative_file_path(file_path)
+                    sites = node_sites(relative_file_path, sites, require)
+                    if status == "成功":
+                        self._record_call_graph(relative_file_path, call_graph, require, whole_call_graph, sites)
+                    self._checkpoint_file(relative_file_path, status, call_graph, require, sites)
+                    completed += 1
+                    self.update_progress.emit(completed, total_files)
+                    self.update_status.emit(f"正在扫描... {int(completed / total_files * 100)}% ({completed}/{total_files})")
+            
+            self._partial_tables = (tables, scanned)
                 
         except Exception as e:
             self.update_log.emit(f"多进程扫描出错，切换到单进程模式: {str(e)}")
-            # 回退到单进程模式
-            self._scan_with_single_process(will_scan, whole_call_graph, whole_call_network, processed_files, total_files)
+            # 回退到单进程模式，已合并的部分结果由单进程扫描重新生成
+            self._partial_tables = None
+            self.call_sites = CallSiteTable(self.symbols)
+            self._sites_recorded = set()
+            self._scan_with_single_process(will_scan, whole_call_graph, processed_files, total_files)
+    
+    def _poll(self, results):
+        """逐个取出 imap_unordered 的结果，等待期间定期检查是否已请求停止，停止后不再等待"""
+        while True:
+            try:
+                yield results.next(0.5)
+            except multiprocessing.TimeoutError:
+                if self.stopped:
+                    return
+            except StopIteration:
+                return
+    
+    def _split_large_files(self, will_scan):
+        """读取并切分需要切分的大文件，返回 {文件路径: [(行偏移, 源码块), ...]}"""
+        large = {}
+        for file_path, encoding in will_scan:
+            chunks = source_chunks(file_path, encoding)
+            if chunks is not None:
+                large[file_path] = chunks
+        if large:
+            self.update_log.emit(f"{len(large)} 个大文件切分为 {sum(map(len, large.values()))} 块并行解析")
+        return large
+    
+    def _build_call_network(self, whole_call_graph, call_counts):
+        """由全部文件的调用图构建调用网络，call_counts 为各文件的调用次数 (边的权重)
+        
+        多进程扫描后直接使用工作进程生成的部分边表；其余文件 (增量扫描复用的旧调用图)
+        在主进程中生成一个边表，全部边表拼接后统一去重一次再插入，不再另开进程池
+        """
+        if self._partial_tables is None:
+            return build_network(whole_call_graph, self.file_requires, symbols=self.symbols, call_counts=call_counts)
+        tables, scanned = self._partial_tables
+        self._partial_tables = None
+        pending = [(relative_file_path, call_graph, self.file_requires.get(relative_file_path, ()),
+                    call_counts.get(relative_file_path))
+                   for relative_file_path, call_graph in whole_call_graph.items() if relative_file_path not in scanned]
+        if pending:
+            tables = tables + [build_table(pending)]
+        return reduce_tables(tables).to_network(symbols=self.symbols)
     
-    def _process_scan_result(self, file_path, encoding, base_path, whole_call_graph, whole_call_network, processed_files):
+    def _resolve_calls(self, call_sites, whole_call_network):
+        """跨文件解析调用 (模块表、导出表、require 别名)，解析得到的边加入调用网络，返回 ResolutionIndex"""
+        resolution = resolve_calls(call_sites, self.file_requires)
+        resolution.apply(whole_call_network)
+        self.update_log.emit(f"跨文件解析：{resolution.resolved} 次调用链接到定义 ({len(resolution)} 条边)，"
+                             f"{resolution.unresolved} 次点分调用未解析")
+        return resolution
+    
+    def _collect_call_sites(self, whole_call_graph, old_call_sites):
+        """汇总调用位置表：本次解析的文件取新记录，复用旧调用图的文件沿用旧表中的记录
+        
+        只保留仍在调用图中的文件
+        """
+        call_sites = CallSiteTable(self.symbols)
+        if old_call_sites is not None:
+            call_sites.merge(old_call_sites, {relative_file_path for relative_file_path in whole_call_graph
+                                              if relative_file_path not in self._sites_recorded})
+        call_sites.merge(self.call_sites, {relative_file_path for relative_file_path in whole_call_graph
+                                           if relative_file_path in self._sites_recorded})
+        return call_sites
+    
+    def _intern_scan_data(self, whole_call_graph, file_hashes):
+        """把调用图、require 列表和文件哈希中的名称换成符号表中的字符串对象
+        
+        同一个名称在内存中只保留一份，保存时 pickle 也只写出一次
+        
+        返回: (调用图, 文件哈希)
+        """
+        intern = self.symbols.intern
+        whole_call_graph = {intern(relative_file_path): self.symbols.intern_call_graph(call_graph)
+                            for relative_file_path, call_graph in whole_call_graph.items()}
+        self.file_requires = {intern(relative_file_path): self.symbols.intern_list(require)
+                              for relative_file_path, require in self.file_requires.items()}
+        file_hashes = {intern(relative_file_path): file_hash for relative_file_path, file_hash in file_hashes.items()}
+        return whole_call_graph, file_hashes
+    
+    def _process_scan_result(self, file_path, encoding, base_path, whole_call_graph, processed_files):
         """处理单个文件的扫描结果 (单进程使用)"""
         rel_path = os.path.relpath(file_path, base_path)
+        relative_file_path = file_path[len(base_path):]
+        if not relative_file_path.startswith("/"):
+            relative_file_path = "/" + relative_file_path
         try:
             # 使用检测到的编码解析文件
-            _, call_graph, require, status = scan_one_file(file_path, "json", False, encoding)
+            _, call_graph, require, status, sites = scan_one_file(file_path, "json", False, encoding, with_sites=True)
+            sites = node_sites(relative_file_path, sites, require)
             
             # 记录处理状态
             processed_files[rel_path] = status
             
-            # 如果文件成功解析并且有调用关系，则添加到调用图中
-            if status == "成功" and call_graph:
-                relative_file_path = file_path[len(base_path):]
-                if not relative_file_path.startswith("/"):
-                    relative_file_path = "/" + relative_file_path
-                
-                self._add_to_call_network(
-                    relative_file_path, call_graph, require, file_path,
-                    whole_call_graph, whole_call_network
-                )
+            # 如果文件成功解析，则记录其调用图
+            if status == "成功":
+                self._record_call_graph(relative_file_path, call_graph, require, whole_call_graph, sites)
+            self._checkpoint_file(relative_file_path, status, call_graph, require, sites)
         except Exception as e:
             self.update_log.emit(f"解析 {rel_path} 时出错：{str(e)}")
             processed_files[rel_path] = f"解析错误：{str(e)}"
     
-    def _add_to_call_network(self, relative_file_path, call_graph, require, file_path, whole_call_graph, whole_call_network):
-        """将调用关系添加到网络图中"""
-        import xxhash
-        
-        whole_call_graph[relative_file_path] = call_graph
-        whole_call_network.add_node(relative_file_path, role='file')
-        package_name = os.path.basename(file_path).replace(".lua", "")
-        
-        # 处理调用关系
-        for tmp_name in call_graph.keys():
-            if tmp_name == "[G]":
-                default_main = f"{package_name}.main.{xxhash.xxh32(file_path.encode()).hexdigest()}"
-                for called in call_graph["[G]"]:
-                    whole_call_network.add_edge(relative_file_path, default_main, action='export')
-                    whole_call_network.add_edge(default_main, called, action="call")
-            if tmp_name.startswith("[X]"):
-                exported = tmp_name.replace("[X]", "")
-                sub_names = exported.split('.')
-                if len(sub_names) > 1:
-                    father = sub_names[0]
-                    left = exported[len(father):]
-                    _exported = f"{package_name}{left}" if father not in require else exported
-                else:
-                    _exported = exported
-                whole_call_network.add_edge(relative_file_path, _exported, action="export")
-                for called in call_graph[tmp_name]:
-                    whole_call_network.add_edge(_exported, called, action='call')
-            if tmp_name.startswith("[L]"):
-                defined = tmp_name.replace("[L]", "")
-                whole_call_network.add_edge(relative_file_path, defined, action="define")
-                for called in call_graph[tmp_name]:
-                    whole_call_network.add_edge(defined, called, action='call')
+    def _record_call_graph(self, relative_file_path, call_graph, require, whole_call_graph, sites=None):
+        """记录文件的调用图和调用位置 (node_sites 的形式)，调用网络在扫描结束后统一构建"""
+        if sites is not None:
+            self.call_sites.add_file(relative_file_path, sites)
+            self._sites_recorded.add(relative_file_path)
+        if call_graph:
+            whole_call_graph[relative_file_path] = call_graph
+            self.file_requires[relative_file_path] = list(require)
+        else:
+            # 文件已没有调用关系
+            whole_call_graph.pop(relative_file_path, None)
+            self.file_requires.pop(relative_file_path, None)
+    
+    @staticmethod
+    def _reusable(relative_file_path, old_call_graph, old_file_requires, old_call_sites):
+        """未修改文件的旧调用图能否直接复用 (旧存储文件缺少 require 列表、调用位置表或模块信息时需要重新解析)"""
+        if relative_file_path not in old_call_graph:
+            return True
+        return (relative_file_path in old_file_requires
+                and getattr(old_call_sites, 'modules', None) is not None)
 
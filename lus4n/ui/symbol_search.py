@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 符号检索线程模块
+在后台线程中加载符号索引并响应补全查询，避免输入时阻塞 UI
+"""
+
+import threading
+from PySide6.QtCore import QThread, Signal
+
+from lus4n.symbol_index import SymbolIndex
+
+
+class SymbolIndexLoader(QThread):
+    """后台加载 (必要时重建) 存储文件对应的符号索引"""
+    index_loaded = Signal(str, object)   # (存储路径, SymbolIndex)
+    load_error = Signal(str, str)        # (存储路径, 错误信息)
+
+    def __init__(self, storage_path, graph_loader):
+        super().__init__()
+        self.storage_path = storage_path
+        self.graph_loader = graph_loader
+
+    def run(self):
+        try:
+            index = SymbolIndex.load_or_build(self.storage_path, self.graph_loader)
+            self.index_loaded.emit(self.storage_path, index)
+        except Exception as e:
+            self.load_error.emit(self.storage_path, str(e))
+
+
+class SymbolSearchThread(QThread):
+    """常驻检索线程
+
+    只保留最新一次请求，连续输入时旧请求会被直接丢弃
+    """
+    results_ready = Signal(str, list)    # (查询文本, 匹配的函数名列表)
+
+    def __init__(self, limit=50):
+        super().__init__()
+        self.limit = limit
+        self.index = None
+        self._pending = None
+        self._stopped = False
+        self._cond = threading.Condition()
+
+    def set_index(self, index):
+        """切换使用的索引"""
+        with self._cond:
+            self.index = index
+
+    def request(self, text):
+        """提交检索请求"""
+        with self._cond:
+            self._pending = text
+            self._cond.notify()
+
+    def stop(self):
+        """停止线程"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                text, self._pending = self._pending, None
+                index = self.index
+            if index is None:
+                continue
+            self.results_ready.emit(text, index.search(text, self.limit))
@@ -12,6 +12,8 @@ from PySide6.QtWidgets import (
 )
 from PySide6.QtCore import Qt, QStringListModel
 
+from lus4n.ui.symbol_search import SymbolSearchThread
+
 
 class StorageSelector:
     """存储文件选择器组件"""
@@ -60,6 +62,15 @@ class StorageSelector:
 class VisualizationSettings:
     """可视化设置组件"""
     
+    # 聚合选项文本 -> GraphAnalyzer.group_nodes 的分组方式
+    CLUSTER_MODES = {
+        "不聚合": None,
+        "按文件聚合": "file",
+        "按目录聚合": "directory",
+        "按模块前缀聚合": "module",
+        "按强连通分量聚合": "scc",
+    }
+    
     def __init__(self, parent=None):
         self.parent = parent
         self.layout_combo = None
@@ -68,6 +79,7 @@ class VisualizationSettings:
         self.max_nodes_value = None
         self.physics_checkbox = None
         self.node_size_checkbox = None
+        self.cluster_combo = None
         self.group = self._create_ui()
     
     def _create_ui(self):
@@ -115,6 +127,18 @@ class VisualizationSettings:
         filter_layout.addWidget(self.max_nodes_value)
         main_layout.addLayout(filter_layout)
         
+        # 节点聚合 (超出最大显示节点数时折叠为簇，双击可展开)
+        cluster_layout = QHBoxLayout()
+        cluster_label = QLabel("聚合方式:")
+        cluster_label.setStyleSheet("QLabel { color: black; }")
+        
+        self.cluster_combo = QComboBox()
+        self.cluster_combo.addItems(list(self.CLUSTER_MODES))
+        
+        cluster_layout.addWidget(cluster_label)
+        cluster_layout.addWidget(self.cluster_combo)
+        main_layout.addLayout(cluster_layout)
+        
         # 高级选项
         advanced_layout = QHBoxLayout()
         
@@ -144,6 +168,10 @@ class VisualizationSettings:
         """获取最大节点数"""
         return self.max_nodes_slider.value()
     
+    def get_cluster_mode(self):
+        """获取聚合方式，不聚合时返回 None"""
+        return self.CLUSTER_MODES.get(self.cluster_combo.currentText())
+    
     def use_physics(self):
         """是否启用物理引擎"""
         return self.physics_checkbox.isChecked()
@@ -167,7 +195,13 @@ class FunctionQueryInput:
         self.on_show_all = on_show_all
         self.function_input = None
         self.query_mode_combo = None
+        self.symbol_index = None
         self.group = self._create_ui()
+        
+        # 后台检索线程，按键时只提交请求，不在 UI 线程中扫描名称
+        self.search_thread = SymbolSearchThread()
+        self.search_thread.results_ready.connect(self._on_search_results)
+        self.search_thread.start()
     
     def _create_ui(self):
         """创建UI组件"""
@@ -193,11 +227,13 @@ class FunctionQueryInput:
         self.function_input = QLineEdit()
         self.function_input.setPlaceholderText("输入要查询的函数名（例如：os.execute）")
         
-        # 创建自动完成器
-        self.completer = QCompleter([])
+        # 创建自动完成器 (加载符号索引后由索引提供候选)
+        self.completer_model = QStringListModel([])
+        self.completer = QCompleter(self.completer_model)
         self.completer.setCaseSensitivity(Qt.CaseInsensitive)
         self.completer.setFilterMode(Qt.MatchContains)
         self.function_input.setCompleter(self.completer)
+        self.function_input.textEdited.connect(self._on_text_edited)
         
         query_btn = QPushButton("查询")
         query_btn.setObjectName("primaryButton")
@@ -235,7 +271,35 @@ class FunctionQueryInput:
     
     def update_completer_items(self, items):
         """更新自动完成器的项目列表"""
-        self.completer.setModel(QStringListModel(items))
+        self.completer_model.setStringList(items)
+    
+    def set_symbol_index(self, index):
+        """设置符号索引，之后的补全候选由索引检索得到"""
+        self.symbol_index = index
+        self.search_thread.set_index(index)
+        if index is not None:
+            # 候选已由索引排好序，补全器不再二次过滤
+            self.completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        else:
+            self.completer.setCompletionMode(QCompleter.PopupCompletion)
+    
+    def _on_text_edited(self, text):
+        """输入变化时提交后台检索"""
+        if self.symbol_index is not None and text.strip():
+            self.search_thread.request(text)
+    
+    def _on_search_results(self, text, names):
+        """检索结果回调，丢弃已过期的结果"""
+        if text != self.function_input.text():
+            return
+        self.completer_model.setStringList(names)
+        if names:
+            self.completer.complete()
+    
+    def close(self):
+        """停止后台检索线程"""
+        self.search_thread.stop()
+        self.search_thread.wait()
     
     def get_widget(self):
         """获取组件Widget"""
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 查看器页面模块
+常驻查看器页面 (static/viewer.html) 的路径与数据序列化
+"""
+
+import os
+import json
+import shutil
+import tempfile
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+VIEWER_PAGE = os.path.join(STATIC_DIR, 'viewer.html')
+VIEWER_ASSETS = ('vis.min.js', 'vis.min.css')
+
+# 导出到外部浏览器时使用的固定目录，静态资源只复制一次
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), 'lus4n_viewer')
+
+
+def to_json(graph_data):
+    """将图数据序列化为可安全嵌入 <script> 的 JSON"""
+    return json.dumps(graph_data, ensure_ascii=False).replace("</", "<\\/")
+
+
+def set_data_script(graph_data):
+    """生成在查看器页面中替换数据集的脚本"""
+    return f"lus4nSetData({to_json(graph_data)});"
+
+
+def export_standalone_html(graph_data, file_name="network.html", output_dir=EXPORT_DIR):
+    """导出带初始数据的独立页面，供外部浏览器打开
+
+    参数:
+    - output_dir: 输出目录，静态资源已存在时不再复制
+
+    返回:
+    - 生成的 HTML 文件路径
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    for asset in VIEWER_ASSETS:
+        target = os.path.join(output_dir, asset)
+        if not os.path.exists(target):
+            shutil.copy(os.path.join(STATIC_DIR, asset), target)
+
+    with open(VIEWER_PAGE, 'r', encoding='utf-8') as f:
+        page = f.read()
+    bootstrap = f'<script type="text/javascript">window.LUS4N_INITIAL_DATA = {to_json(graph_data)};</script>\n'
+    page = page.replace('<script type="text/javascript" src="vis.min.js"></script>',
+                        bootstrap + '<script type="text/javascript" src="vis.min.js"></script>', 1)
+
+    html_path = os.path.join(output_dir, file_name)
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return html_path
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 文件监视线程模块
+扫描完成后在后台监视源码目录，文件变化时原地更新调用图并写回存储文件
+"""
+
+import os
+import threading
+from PySide6.QtCore import QThread, Signal
+
+from lus4n.watch import LiveCallGraph, watch, INOTIFY_AVAILABLE
+
+
+class WatchThread(QThread):
+    """文件监视线程类"""
+
+    update_log = Signal(str)        # 更新日志的信号
+    graph_updated = Signal(str)     # 存储文件已更新的信号，传递存储文件路径
+
+    def __init__(self, path, storage, extensions, rules=None, follow_symlinks=False):
+        super().__init__()
+        self.path = path
+        self.storage = storage
+        self.extensions = extensions or [".lua"]
+        self.rules = rules
+        self.follow_symlinks = follow_symlinks
+        self._stop_event = threading.Event()
+
+    def run(self):
+        """线程主函数：加载扫描结果，对齐磁盘状态后进入监视循环"""
+        try:
+            live = LiveCallGraph(self.path, self.extensions, self.rules, self.follow_symlinks)
+            live.load_storage(self.storage)
+            scanned, removed = live.sync(use_multiprocess=False)
+            if scanned or removed:
+                live.save(self.storage)
+                self.graph_updated.emit(self.storage)
+            self.update_log.emit(
+                f"开始监视文件变化 ({'inotify' if INOTIFY_AVAILABLE else '轮询'})：{self.path}"
+            )
+            watch(live, self.storage, self._stop_event,
+                  on_change=lambda count: self.update_log.emit(f"检测到 {count} 个文件变化，调用图已更新"),
+                  on_persist=self.graph_updated.emit)
+            self.update_log.emit("已停止监视文件变化")
+        except Exception as e:
+            self.update_log.emit(f"文件监视出错：{str(e)}")
+
+    def stop(self):
+        """请求停止监视，退出前会保存尚未写回的修改"""
+        self._stop_event.set()
@@ -7,6 +7,7 @@ Lus4n - WebView 窗口模块
 
 import os
 from PySide6.QtCore import QUrl, Qt
+from lus4n.ui.viewer import VIEWER_PAGE, set_data_script, export_standalone_html
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QLabel, QSizePolicy
@@ -29,6 +30,8 @@ class WebViewWindow(QWidget):
         super().__init__(parent)
         self.html_path = html_path
         self.webview = None
+        self.graph_data = None          # 当前显示的图数据
+        self.viewer_loaded = False      # 常驻查看器页面是否已加载完成
         
         self.init_ui()
         
@@ -112,12 +115,48 @@ class WebViewWindow(QWidget):
             return
         
         # 转换为文件 URL
+        self.viewer_loaded = False
+        self.graph_data = None
         file_url = QUrl.fromLocalFile(os.path.abspath(html_path))
         self.webview.setUrl(file_url)
         self.status_label.setText(f"加载中... {os.path.basename(html_path)}")
     
+    def show_graph(self, graph_data):
+        """在常驻查看器页面中显示图数据
+        
+        查看器页面只加载一次，之后每次查询仅通过 JavaScript 替换数据集，
+        不写磁盘、不重新加载页面
+        """
+        if not WEBENGINE_AVAILABLE:
+            return
+        
+        self.graph_data = graph_data
+        self.html_path = None
+        
+        if not self.viewer_loaded:
+            # 页面加载完成后在 on_load_finished 中推送数据
+            if self.webview.url() != QUrl.fromLocalFile(VIEWER_PAGE):
+                self.webview.setUrl(QUrl.fromLocalFile(VIEWER_PAGE))
+            self.status_label.setText("加载查看器...")
+            return
+        
+        self._push_graph_data()
+    
+    def _push_graph_data(self):
+        """将当前图数据推送到查看器页面"""
+        if self.graph_data is None:
+            return
+        self.webview.page().runJavaScript(set_data_script(self.graph_data))
+        self.status_label.setText(
+            f"✓ 节点：{len(self.graph_data['nodes'])}，边：{len(self.graph_data['edges'])}"
+        )
+    
     def on_load_finished(self, success):
         """加载完成回调"""
+        self.viewer_loaded = success and self.webview.url() == QUrl.fromLocalFile(VIEWER_PAGE)
+        if self.viewer_loaded:
+            self._push_graph_data()
+            return
         if success:
             self.status_label.setText(f"✓ 已加载: {os.path.basename(self.html_path) if self.html_path else ''}")
         else:
@@ -126,11 +165,16 @@ class WebViewWindow(QWidget):
     def refresh(self):
         """刷新页面"""
         if WEBENGINE_AVAILABLE and self.webview:
+            # 重新加载后由 on_load_finished 再次推送当前数据
+            self.viewer_loaded = False
             self.webview.reload()
             self.status_label.setText("刷新中...")
     
     def open_in_browser(self):
         """在外部浏览器中打开"""
+        if self.graph_data is not None and not self.html_path:
+            # 查看器中的数据只在需要时导出为独立页面
+            self.html_path = export_standalone_html(self.graph_data)
         if self.html_path and os.path.exists(self.html_path):
             import webbrowser
             webbrowser.open_new_tab(f"file://{self.html_path}")
@@ -0,0 +1,642 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lus4n - 文件监视模块
+监视扫描根目录下的文件变化 (Linux 下使用 inotify，其他平台退回轮询)，
+只重新解析受影响的文件，在内存中原地修补调用图，并定期把变化追加到存储日志
+"""
+
+import os
+import sys
+import time
+import errno
+import struct
+import select
+import threading
+import multiprocessing
+
+import networkx as nx
+import xxhash
+from loguru import logger
+
+from lus4n.graph import scan_one_file
+from lus4n.builder import file_edges, NETWORK_VERSION
+from lus4n.symbols import SymbolTable
+from lus4n.sites import CallSiteTable, node_sites, count_calls
+from lus4n.resolve import resolve_calls, RESOLVE_ACTION
+from lus4n.ignore import IgnoreRules, walk_files
+from lus4n.storage import load_storage, save_storage, save_delta, graph_changes, needs_compaction
+from lus4n.symbol_index import SymbolIndex
+
+
+# 检查 inotify 是否可用 (仅 Linux)
+INOTIFY_AVAILABLE = False
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        import ctypes
+        import ctypes.util
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _libc.inotify_init1.argtypes = [ctypes.c_int]
+        _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        INOTIFY_AVAILABLE = True
+    except (OSError, AttributeError):
+        _libc = None
+
+
+# inotify 事件掩码 (见 <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE
+              | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+# 事件合并窗口 (秒)：编辑器保存一个文件通常会连续产生多个事件
+DEBOUNCE_INTERVAL = 0.2
+# 两次保存之间的最小间隔 (秒)
+PERSIST_INTERVAL = 2.0
+# 轮询模式的扫描间隔 (秒)
+POLL_INTERVAL = 1.0
+# 初始同步时需要解析的文件数达到该值才使用多进程
+SYNC_MULTIPROCESS_THRESHOLD = 20
+
+
+def relative_node_path(root, file_path):
+    """文件节点名：相对扫描根目录的路径，以 '/' 开头 (与扫描线程一致)"""
+    relative_file_path = file_path[len(root):]
+    if not relative_file_path.startswith("/"):
+        relative_file_path = "/" + relative_file_path
+    return relative_file_path
+
+
+def _scan_for_sync(file_path):
+    """初始同步时在工作进程中解析文件"""
+    _, call_graph, require, status, sites = scan_one_file(file_path, None, False, with_sites=True)
+    return file_path, call_graph, require, status, sites
+
+
+class LiveCallGraph:
+    """可原地修补的调用图
+
+    记录每个文件贡献的边，并对边做引用计数：一个文件变化时只撤下它自己的边、加上新解析出的边，
+    被多个文件共享的边 (例如多个文件都调用 print) 在最后一个贡献者移除后才从图中删除
+
+    跨文件解析得到的边在每次保存时并入内存中的调用网络 (不计入引用计数)，内存中的网络与保存的网络相同；
+    两次保存之间变化的文件和出边有变化的节点都记录下来，保存时只把这些变化追加到存储日志
+    """
+
+    def __init__(self, root, extensions=None, rules=None, follow_symlinks=False):
+        self.root = root
+        self.extensions = extensions or [".lua"]
+        self.rules = rules or IgnoreRules(root)
+        self.follow_symlinks = follow_symlinks
+        self.whole_call_graph = {}
+        self.whole_call_network = nx.DiGraph()
+        self.file_status = {}
+        self.file_hashes = {}
+        self.file_requires = {}
+        self.file_sites = {}  # 各文件的调用位置 (lus4n.sites.node_sites 的形式)
+        self.lock = threading.RLock()
+        self.version = 0
+        # 名称都取自符号表，调用图和调用网络共享同一批字符串对象；符号表只增不减，已删除的名称占用很少
+        self.symbols = SymbolTable()
+        self.git_state = None  # 存储文件中上次扫描的 git 状态，保存时沿用 (变化过的文件不再记录 blob)
+        self._file_edges = {}
+        self._edge_refs = {}
+        self._resolved_edges = set()  # 跨文件解析加入的边
+        # 上次保存之后的变化：内容变化的文件，属性或出边变化的节点，删除的节点
+        self._changed_files = set()
+        self._touched = set()
+        self._removed_nodes = set()
+        self._saved = None  # 上次写出的存储内容，下次保存时只追加相对它的变化
+
+    def matches(self, file_path):
+        """是否为需要扫描的文件 (符合后缀且未被忽略规则排除)"""
+        return any(file_path.endswith(ext) for ext in self.extensions) and self.rules.accepts(file_path)
+
+    def iter_files(self):
+        """遍历扫描根目录下需要扫描的文件"""
+        for dir_path, _, file_list in walk_files(self.root, self.extensions, self.rules, self.follow_symlinks):
+            for file_name in file_list:
+                yield os.path.join(dir_path, file_name)
+
+    def absolute_path(self, relative_file_path):
+        return os.path.join(self.root, relative_file_path.lstrip("/\\"))
+
+    # -------------------------------------------------
+    # 边的引用计数维护
+    # -------------------------------------------------
+    def _replace_file_edges(self, relative_file_path, edges):
+        """用新的边列表替换文件原先贡献的边"""
+        graph = self.whole_call_network
+        refs = self._edge_refs
+        old_edges = self._file_edges.pop(relative_file_path, ())
+
+        # 先加新边再撤旧边，两次解析都有的边不会被删除后重新加入；边的权重是各文件调用次数之和
+        touched = self._touched
+        for u, v, action, weight in edges:
+            touched.add(u)
+            count = refs.get((u, v), 0)
+            refs[(u, v)] = count + 1
+            if count == 0:
+                graph.add_edge(u, v, action=action, weight=weight)
+            else:
+                graph[u][v]["weight"] += weight
+        if edges:
+            self._file_edges[relative_file_path] = edges
+
+        for u, v, _, weight in old_edges:
+            touched.add(u)
+            count = refs[(u, v)] - 1
+            if count:
+                refs[(u, v)] = count
+                graph[u][v]["weight"] -= weight
+                continue
+            del refs[(u, v)]
+            graph.remove_edge(u, v)
+            self._drop_isolated((u, v))
+
+    def _drop_isolated(self, nodes):
+        """删除已没有任何边的函数节点"""
+        graph = self.whole_call_network
+        for node in nodes:
+            if (node in graph and graph.degree(node) == 0
+                    and graph.nodes[node].get("role") != "file"):
+                graph.remove_node(node)
+                self._removed_nodes.add(node)
+
+    def _in_file_network(self, node):
+        """节点是否在只由各文件的边构成的调用网络中 (不计跨文件解析加入的边)"""
+        graph, refs = self.whole_call_network, self._edge_refs
+        if node not in graph:
+            return False
+        if graph.nodes[node].get("role") == "file":
+            return True
+        return (any((node, successor) in refs for successor in graph.succ[node])
+                or any((predecessor, node) in refs for predecessor in graph.pred[node]))
+
+    def _apply_resolution(self, resolution):
+        """把跨文件解析得到的边并入内存中的调用网络，撤下上一次解析加入而这次不再需要的边
+
+        结果与 ResolutionIndex.apply 在由各文件的边构成的网络上的结果相同：文件自己的边优先，
+        函数节点不在网络中时同时加入定义文件到该节点的 export 边
+        """
+        graph, refs = self.whole_call_network, self._edge_refs
+        wanted = {}
+        present = set()  # 本次解析已经加入网络的节点
+        for (caller, target), weight in resolution.edges.items():
+            if target not in present and not self._in_file_network(target):
+                wanted[(resolution.targets[target], target)] = ("export", 1)
+                present.add(resolution.targets[target])
+            if (caller, target) not in refs and (caller, target) not in wanted:
+                wanted[(caller, target)] = (RESOLVE_ACTION, weight)
+            present.update((caller, target))
+
+        for u, v in self._resolved_edges - wanted.keys():
+            if (u, v) in refs or not graph.has_edge(u, v):
+                continue
+            graph.remove_edge(u, v)
+            self._touched.add(u)
+            self._drop_isolated((u, v))
+        for (u, v), (action, weight) in wanted.items():
+            if graph.get_edge_data(u, v) != {"action": action, "weight": weight}:
+                graph.add_edge(u, v, action=action, weight=weight)
+                self._touched.add(u)
+        self._resolved_edges = set(wanted)
+
+    def _mark_changed(self, relative_file_path):
+        """记录内容变化的文件；变化过的文件不再沿用 git 记录的 blob，下次基于 git 的扫描会重新解析"""
+        self._changed_files.add(relative_file_path)
+        self._touched.add(relative_file_path)
+        if self.git_state is not None:
+            self.git_state['blobs'].pop(relative_file_path.lstrip("/\\"), None)
+
+    def _apply(self, relative_file_path, call_graph, require, sites):
+        """记录文件的解析结果并修补调用图，sites 为 node_sites() 形式的调用位置"""
+        symbols = self.symbols
+        intern = symbols.intern
+        relative_file_path = intern(relative_file_path)
+        self.whole_call_graph[relative_file_path] = symbols.intern_call_graph(call_graph)
+        self.file_requires[relative_file_path] = symbols.intern_list(require)
+        calls, definitions, module = sites
+        self.file_sites[relative_file_path] = (
+            [(intern(caller), intern(called), line, column, qualified)
+             for caller, called, line, column, qualified in calls],
+            [(intern(node), line, column) for node, line, column in definitions],
+            module,
+        )
+        self.whole_call_network.add_node(relative_file_path, role='file')
+        self._replace_file_edges(relative_file_path, file_edges(relative_file_path, call_graph, require, symbols,
+                                                                count_calls(calls)))
+
+    def _forget(self, relative_file_path):
+        """移除文件及其贡献的边"""
+        self._mark_changed(relative_file_path)
+        self._replace_file_edges(relative_file_path, [])
+        self.whole_call_graph.pop(relative_file_path, None)
+        self.file_requires.pop(relative_file_path, None)
+        self.file_sites.pop(relative_file_path, None)
+        self.file_hashes.pop(relative_file_path, None)
+        self.file_status.pop(relative_file_path.lstrip("/\\"), None)
+        if relative_file_path in self.whole_call_network:
+            self.whole_call_network.remove_node(relative_file_path)
+            self._removed_nodes.add(relative_file_path)
+
+    # -------------------------------------------------
+    # 文件更新
+    # -------------------------------------------------
+    def _read_hash(self, file_path):
+        """读取文件并计算哈希，文件不存在或不可读时返回 None"""
+        try:
+            with open(file_path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        return xxhash.xxh64(content).hexdigest(), os.path.getmtime(file_path)
+
+    def _record_result(self, file_path, file_hash, call_graph, require, status, sites):
+        relative_file_path = relative_node_path(self.root, file_path)
+        self._mark_changed(relative_file_path)
+        self.file_hashes[relative_file_path] = file_hash
+        self.file_status[os.path.relpath(file_path, self.root)] = status
+        if status == "成功" and call_graph:
+            self._apply(relative_file_path, call_graph, require, node_sites(relative_file_path, sites, require))
+        elif status == "成功" or relative_file_path not in self.whole_call_graph:
+            # 文件已没有调用关系，或从未成功解析过；与完整构建一样，没有调用关系的文件不在调用网络中
+            self._replace_file_edges(relative_file_path, [])
+            self.whole_call_graph.pop(relative_file_path, None)
+            self.file_requires.pop(relative_file_path, None)
+            self.file_sites.pop(relative_file_path, None)
+            if relative_file_path in self.whole_call_network:
+                self.whole_call_network.remove_node(relative_file_path)
+                self._removed_nodes.add(relative_file_path)
+        # 其余情况 (编辑过程中出现语法错误等) 保留上一次成功解析的结果
+
+    def update_file(self, file_path):
+        """重新解析单个文件，文件已删除时移除其数据
+
+        返回:
+        - 调用图是否可能发生变化
+        """
+        relative_file_path = relative_node_path(self.root, file_path)
+        stamp = self._read_hash(file_path) if os.path.isfile(file_path) else None
+        with self.lock:
+            if stamp is None:
+                if relative_file_path not in self.file_hashes and relative_file_path not in self.whole_call_graph:
+                    return False
+                self._forget(relative_file_path)
+                self.version += 1
+                return True
+            old = self.file_hashes.get(relative_file_path)
+            if old is not None and old[0] == stamp[0]:
+                return False
+        _, call_graph, require, status, sites = scan_one_file(file_path, None, False, with_sites=True)
+        with self.lock:
+            self._record_result(file_path, stamp, call_graph, require, status, sites)
+            self.version += 1
+        return True
+
+    def known_files_under(self, path):
+        """已记录的、位于 path (文件或目录) 下的文件绝对路径"""
+        prefix = relative_node_path(self.root, path).rstrip("/\\")
+        result = []
+        for relative_file_path in set(self.file_hashes) | set(self.whole_call_graph):
+            if relative_file_path == prefix or relative_file_path.startswith(prefix + "/") \
+                    or relative_file_path.startswith(prefix + os.sep) or prefix == "":
+                result.append(self.absolute_path(relative_file_path))
+        return result
+
+    def refresh_paths(self, paths):
+        """处理一批变化的路径 (文件或目录)
+
+        返回:
+        - 实际发生变化的文件数
+        """
+        files = set()
+        for path in paths:
+            if os.path.isdir(path):
+                for dir_path, dir_list, file_list in os.walk(path):
+                    if self.rules.dir_ignored(self.rules.relative(dir_path)):
+                        dir_list[:] = []
+                        continue
+                    files.update(file_path for file_path in (os.path.join(dir_path, name) for name in file_list)
+                                 if self.matches(file_path))
+            elif self.matches(path):
+                files.add(path)
+            # 已删除或移走的目录：其下已记录的文件都需要检查
+            files.update(self.known_files_under(path))
+        return sum(1 for file_path in sorted(files) if self.update_file(file_path))
+
+    # -------------------------------------------------
+    # 初始同步与持久化
+    # -------------------------------------------------
+    def load_storage(self, storage):
+        """从存储文件恢复状态
+
+        只恢复记录了 require 列表的文件 (旧存储文件缺少该信息，这些文件会在 sync 中重新解析)，
+        调用网络由各文件的调用图重新构建，不沿用存储中的网络，因此之后的第一次保存写出完整的存储文件；
+        存储文件没有调用位置表时不恢复任何文件，全部重新解析
+        """
+        if not os.path.exists(storage):
+            return 0
+        data = load_storage(storage)
+        if not isinstance(data, dict):
+            return 0
+        if getattr(data.get('call_sites'), 'modules', None) is None:
+            # 旧存储文件缺少调用位置表或模块信息，全部重新解析
+            return 0
+        requires = data.get('file_requires', {})
+        hashes = data.get('file_hashes', {})
+        sites = data['call_sites'].by_file()
+        with self.lock:
+            self.file_status = dict(data.get('file_status', {}))
+            for relative_file_path, call_graph in data.get('whole_call_graph', {}).items():
+                if relative_file_path not in requires or relative_file_path not in hashes:
+                    continue
+                self._apply(relative_file_path, call_graph, requires[relative_file_path],
+                            sites.get(relative_file_path, ((), (), None)))
+            for relative_file_path, file_hash in hashes.items():
+                # 没有调用关系的文件只记录哈希；缺少 require 信息的文件不记录，以便重新解析
+                if relative_file_path in self.whole_call_graph or relative_file_path not in data.get('whole_call_graph', {}):
+                    self.file_hashes[relative_file_path] = tuple(file_hash)
+            git_state = data.get('git_state')
+            if git_state:
+                self.git_state = {'head': git_state.get('head'), 'blobs': dict(git_state.get('blobs', {}))}
+            self._changed_files.clear()
+            self._touched.clear()
+            self._removed_nodes.clear()
+            self.version += 1
+        return len(self.whole_call_graph)
+
+    def sync(self, use_multiprocess=True):
+        """与磁盘上的源码对齐：解析新增和修改的文件，移除已删除的文件
+
+        返回:
+        - (重新解析的文件数, 移除的文件数)
+        """
+        on_disk = {relative_node_path(self.root, file_path): file_path for file_path in self.iter_files()}
+
+        removed = [rel for rel in set(self.file_hashes) | set(self.whole_call_graph) if rel not in on_disk]
+        with self.lock:
+            for relative_file_path in removed:
+                self._forget(relative_file_path)
+
+        pending = {}
+        for relative_file_path, file_path in on_disk.items():
+            stamp = self._read_hash(file_path)
+            if stamp is None:
+                continue
+            old = self.file_hashes.get(relative_file_path)
+            if old is None or old[0] != stamp[0]:
+                pending[file_path] = stamp
+
+        if use_multiprocess and len(pending) >= SYNC_MULTIPROCESS_THRESHOLD:
+            process_count = min(multiprocessing.cpu_count(), max(1, len(pending) // 10))
+            with multiprocessing.Pool(processes=process_count) as pool:
+                results = pool.imap_unordered(_scan_for_sync, list(pending), chunksize=8)
+                for file_path, call_graph, require, status, sites in results:
+                    with self.lock:
+                        self._record_result(file_path, pending[file_path], call_graph, require, status, sites)
+        else:
+            for file_path, stamp in pending.items():
+                _, call_graph, require, status, sites = scan_one_file(file_path, None, False, with_sites=True)
+                with self.lock:
+                    self._record_result(file_path, stamp, call_graph, require, status, sites)
+
+        with self.lock:
+            self.version += 1
+        return len(pending), len(removed)
+
+    def save(self, storage):
+        """保存为与扫描线程相同的存储格式，并重建符号索引
+
+        锁内只复制各字典、取出上次保存后的变化；调用位置表的重建和跨文件解析在锁外进行，
+        解析得到的边再回到锁内并入内存中的调用网络。之后只把变化追加到存储日志 (save_delta)，
+        第一次保存或日志需要合并时写出完整的存储文件。上次扫描的 git 状态随之保存
+        """
+        with self.lock:
+            whole_call_graph = dict(self.whole_call_graph)
+            file_requires = dict(self.file_requires)
+            file_sites = dict(self.file_sites)
+            data = {
+                'whole_call_graph': whole_call_graph,
+                'file_status': dict(self.file_status),
+                'file_hashes': dict(self.file_hashes),
+                'file_requires': file_requires,
+                'network_version': NETWORK_VERSION,
+            }
+            if self.git_state is not None:
+                data['git_state'] = {'head': self.git_state['head'], 'blobs': dict(self.git_state['blobs'])}
+            changed_files, self._changed_files = self._changed_files, set()
+
+        call_sites = CallSiteTable()
+        for relative_file_path in whole_call_graph:
+            call_sites.add_file(relative_file_path, file_sites.get(relative_file_path, ((), (), None)))
+        resolution = resolve_calls(call_sites, file_requires)
+        data['call_sites'] = call_sites
+        data['resolution'] = resolution
+
+        old_data, self._saved = self._saved, None
+        append = old_data is not None and not needs_compaction(storage)
+        with self.lock:
+            self._apply_resolution(resolution)
+            network = self.whole_call_network
+            if append:
+                changes = graph_changes(network, self._removed_nodes, self._touched)
+                names = [node for node, attrs in network.nodes(data=True)
+                         if isinstance(node, str) and attrs.get("role") != "file"]
+            else:
+                network = network.copy()
+            self._touched = set()
+            self._removed_nodes = set()
+        data['whole_call_network'] = network
+
+        if append and save_delta(old_data, data, storage, changed_files, {'whole_call_network': changes}):
+            index = SymbolIndex(names, SymbolIndex.storage_stamp(storage))
+            index.save(SymbolIndex.index_path(storage))
+        else:
+            if append:
+                # 存储文件在上次保存后被改写，内存中的网络只能完整写出
+                with self.lock:
+                    data['whole_call_network'] = self.whole_call_network.copy()
+            save_storage(data, storage)
+            SymbolIndex.build_for_storage(storage, data['whole_call_network'])
+        self._saved = data
+
+
+# -----------------------------------------------------
+# 文件系统事件来源
+# -----------------------------------------------------
+class InotifyWatcher:
+    """基于 inotify 的递归目录监视，被忽略规则排除的目录不添加监视"""
+
+    def __init__(self, root, rules=None):
+        if not INOTIFY_AVAILABLE:
+            raise OSError("inotify 不可用")
+        self.root = root
+        self.rules = rules or IgnoreRules(root)
+        self.fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.watches = {}
+        self._add_tree(root)
+
+    def _add_watch(self, path):
+        wd = _libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                logger.warning(f"inotify 监视数量已达系统上限 (fs.inotify.max_user_watches)：{path}")
+            return
+        self.watches[wd] = path
+
+    def _add_tree(self, path):
+        for dir_path, dir_list, _ in os.walk(path):
+            if self.rules.dir_ignored(self.rules.relative(dir_path)):
+                dir_list[:] = []
+                continue
+            self._add_watch(dir_path)
+
+    def poll(self, timeout):
+        """等待事件，返回发生变化的路径集合 (文件或目录)"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].split(b"\0", 1)[0]
+            offset += name_len
+
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，只能重新检查整个目录树
+                changed.add(self.root)
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None:
+                continue
+            if not name:
+                # 被监视目录自身被删除或移走
+                changed.add(directory)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(path)
+            changed.add(path)
+        return changed
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class PollingWatcher:
+    """轮询监视：定期比较文件的大小和修改时间"""
+
+    def __init__(self, live, interval=POLL_INTERVAL):
+        self.live = live
+        self.interval = interval
+        self.snapshot = self._take_snapshot()
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for file_path in self.live.iter_files():
+            try:
+                st = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        snapshot = self._take_snapshot()
+        changed = {path for path, stamp in snapshot.items() if self.snapshot.get(path) != stamp}
+        changed.update(path for path in self.snapshot if path not in snapshot)
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def create_watcher(live, use_polling=False):
+    """优先使用 inotify，不可用时退回轮询"""
+    if not use_polling and INOTIFY_AVAILABLE:
+        try:
+            return InotifyWatcher(live.root, live.rules)
+        except OSError as e:
+            logger.warning(f"inotify 初始化失败，改用轮询：{e}")
+    return PollingWatcher(live)
+
+
+def watch(live, storage, stop_event=None, use_polling=False,
+          persist_interval=PERSIST_INTERVAL, on_change=None, on_persist=None):
+    """监视循环：合并短时间内的事件后批量修补调用图，并按间隔保存
+
+    参数:
+    - live: LiveCallGraph
+    - storage: 存储文件路径
+    - stop_event: threading.Event，设置后退出循环 (退出前保存未保存的修改)
+    - on_change: 回调 (变化的文件数)，每批修补后调用
+    - on_persist: 回调 (存储文件路径)，每次保存后调用
+    """
+    watcher = create_watcher(live, use_polling)
+    pending = set()
+    last_event = 0.0
+    dirty = False
+    last_persist = time.monotonic()
+    try:
+        while stop_event is None or not stop_event.is_set():
+            changed = watcher.poll(DEBOUNCE_INTERVAL)
+            now = time.monotonic()
+            if changed:
+                pending |= changed
+                last_event = now
+            elif pending and now - last_event >= DEBOUNCE_INTERVAL:
+                paths, pending = pending, set()
+                count = live.refresh_paths(paths)
+                if count:
+                    dirty = True
+                    if on_change:
+                        on_change(count)
+            if dirty and now - last_persist >= persist_interval:
+                live.save(storage)
+                dirty = False
+                last_persist = now
+                if on_persist:
+                    on_persist(storage)
+    finally:
+        watcher.close()
+        if pending:
+            dirty = live.refresh_paths(pending) > 0 or dirty
+        if dirty:
+            live.save(storage)
+            if on_persist:
+                on_persist(storage)
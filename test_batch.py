@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试批量查询的查询解析 (lus4n.batch)
+"""
+
+import io
+import json
+
+import networkx as nx
+import pytest
+
+from lus4n.batch import parse_query, run_batch
+
+
+@pytest.mark.parametrize("line", ["", "   ", "# 注释", "  # 缩进的注释"])
+def test_blank_and_comment(line):
+    assert parse_query(line) is None
+
+
+def test_text_and_json_queries():
+    assert parse_query("ancestors os.execute") == {"op": "ancestors", "name": "os.execute"}
+    assert parse_query("paths main os.execute") == {"op": "paths", "source": "main", "target": "os.execute"}
+    assert parse_query('{"op": "degree", "name": "f", "line": 3}') == {"op": "degree", "name": "f", "line": 3}
+
+
+@pytest.mark.parametrize("line, message", [
+    ("paths main", "paths 需要起始函数和目标函数两个参数"),
+    ("paths a b c", "paths 需要起始函数和目标函数两个参数"),
+    ("ancestors", "ancestors 需要一个函数名参数"),
+    ("degree a b", "degree 需要一个函数名参数"),
+    ("callers f", "不支持的查询类型: callers"),
+    ('["ancestors", "f"]', "JSON 查询必须是对象"),
+    ('{"name": "f"}', "不支持的查询类型: None"),
+    ('{"op": "ancestors"}', "ancestors 查询缺少字段: name"),
+    ('{"op": "paths", "source": "main"}', "paths 查询缺少字段: target"),
+    ('{"op": "paths", "target": "f"}', "paths 查询缺少字段: source"),
+])
+def test_parse_errors(line, message):
+    with pytest.raises(ValueError) as excinfo:
+        parse_query(line)
+    assert str(excinfo.value) == message
+
+
+def test_invalid_json():
+    with pytest.raises(json.JSONDecodeError):
+        parse_query('{"op": "ancestors", ')
+
+
+def test_errors_reported_per_line():
+    """解析失败的行输出带行号的错误记录，不影响其余查询"""
+    graph = nx.DiGraph([("main", "helper"), ("helper", "os.execute")])
+    lines = ["ancestors os.execute", "", "paths main", '{"op": "degree", "name": "helper", "line": 99}']
+    out = io.StringIO()
+    assert run_batch(graph, lines, out, jobs=1) == 3
+    records = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [record["line"] for record in records] == [1, 3, 4]
+    assert "error" not in records[0]
+    assert records[1]["error"] == "无法解析查询: paths 需要起始函数和目标函数两个参数"
+    assert "error" not in records[2]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试部分边表的合并 (lus4n.builder)：多进程扫描的结果与逐文件构建的调用网络相同
+"""
+
+import pickle
+
+import pytest
+
+from lus4n.builder import EdgeTable, build_network, build_table, reduce_tables
+from lus4n.graph import scan_source
+from lus4n.sites import count_calls, node_sites
+from lus4n.symbols import SymbolTable
+
+
+SOURCES = {
+    "lib/util.lua": """
+local M = {}
+function M.trim(s) return string.gsub(s, "^%s+", "") end
+function helper() print("x"); print("y") end
+return M
+""",
+    "app/main.lua": """
+local util = require "util"
+local json = require("cjson")
+function helper() print("x") end
+util.trim(" a ")
+util.trim(" b ")
+json.encode({})
+helper()
+""",
+    "app/cli.lua": """
+require "util"
+function helper() print("x"); os.exit(1) end
+helper()
+""",
+    "empty.lua": "local x = 1\n",
+}
+
+
+@pytest.fixture(scope="module")
+def items():
+    """[(文件节点名, 调用图, require 列表, 调用次数), ...]"""
+    result = []
+    for relative_file_path, source in SOURCES.items():
+        _, call_graph, require, status, sites = scan_source(relative_file_path, source.encode(), _format=None,
+                                                            with_sites=True)
+        assert status == "成功"
+        calls = node_sites(relative_file_path, sites, require)[0]
+        result.append((relative_file_path, call_graph, require, count_calls(calls)))
+    return result
+
+
+def _graph(network):
+    return (sorted(network.nodes(data=True)),
+            sorted((u, v, sorted(attrs.items())) for u, v, attrs in network.edges(data=True)))
+
+
+def _baseline(items):
+    whole_call_graph = {relative_file_path: call_graph for relative_file_path, call_graph, _, _ in items}
+    file_requires = {relative_file_path: require for relative_file_path, _, require, _ in items}
+    call_counts = {relative_file_path: counts for relative_file_path, _, _, counts in items}
+    return build_network(whole_call_graph, file_requires, call_counts=call_counts)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 10])
+def test_reduce_tables_matches_build_network(items, chunk_size):
+    """按块生成部分边表 (经过进程间传递的序列化) 再合并，节点、边、action 和权重都与逐文件构建相同"""
+    tables = [pickle.loads(pickle.dumps(build_table(items[i:i + chunk_size])))
+              for i in range(0, len(items), chunk_size)]
+    network = reduce_tables(tables).to_network()
+    assert _graph(network) == _graph(_baseline(items))
+
+
+def test_duplicate_edges_add_weights(items):
+    """不同文件中的相同边合并为一条，权重相加"""
+    network = reduce_tables([build_table([item]) for item in items]).to_network()
+    helper_print = [attrs["weight"] for u, v, attrs in network.edges(data=True) if u == "helper" and v == "print"]
+    assert helper_print == [4]
+
+
+def test_reduce_tables_empty():
+    assert len(reduce_tables([])) == 0
+    assert len(reduce_tables([EdgeTable(), build_table([])])) == 0
+
+
+def test_to_network_interns_names(items):
+    """传入符号表时节点名取自符号表"""
+    symbols = SymbolTable()
+    network = reduce_tables([build_table(items)]).to_network(symbols=symbols)
+    for node in network:
+        assert node in symbols
+        assert symbols.names[symbols.id(node)] is node
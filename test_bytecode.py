@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试 Lua 字节码解析 (lus4n.bytecode)
+
+test_fixtures/bytecode 中的 .luac 由 sample.lua 经 Lua 5.1 / LuaJIT 2.0 / LuaJIT 2.1 自带的
+string.dump 生成 (与 luac、luajit -b 写出的格式相同)，.stripped 为去掉调试信息的版本
+(Lua 5.1 的 string.dump 不支持去掉调试信息)。重新生成时在对应版本的解释器中执行：
+
+    local f = assert(io.open("sample.lua", "rb"))
+    local dump = string.dump(assert(loadstring(f:read("*a"), "=sample")), strip)
+"""
+
+import os
+
+import pytest
+
+from lus4n.bytecode import is_bytecode, scan_bytecode
+from lus4n.graph import scan_one_file, scan_source
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_fixtures", "bytecode")
+
+# 带调试信息时与源码解析的调用图键相同，局部函数 bar 的调用也能恢复
+EXPECTED = {
+    "[G]": ["bar", "require"],
+    "[L]bar": [".foo", "print"],
+    "[X]M.foo": [".c", ".execute", ".meth", ".write"],
+    "[X]baz": [".format", "bar"],
+}
+
+# 去掉调试信息后局部变量名未知：局部函数 bar 按匿名函数处理，其调用归入顶层，局部表 M 记为 '?'
+EXPECTED_STRIPPED = {
+    "[G]": [".foo", "print", "require"],
+    "[X]?.foo": [".c", ".execute", ".meth", ".write"],
+    "[X]baz": [".format"],
+}
+
+
+def _read(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def _sorted(call_graph):
+    return {key: sorted(called) for key, called in call_graph.items()}
+
+
+@pytest.mark.parametrize("name", ["sample.lua51.luac", "sample.luajit20.luac", "sample.luajit21.luac"])
+def test_scan_bytecode(name):
+    data = _read(name)
+    assert is_bytecode(data)
+    call_graph, require = scan_bytecode(data)
+    assert _sorted(call_graph) == EXPECTED
+    assert require == ["cjson"]
+
+
+@pytest.mark.parametrize("name", ["sample.luajit20.stripped.luac", "sample.luajit21.stripped.luac"])
+def test_scan_stripped_bytecode(name):
+    call_graph, require = scan_bytecode(_read(name))
+    assert _sorted(call_graph) == EXPECTED_STRIPPED
+    assert require == ["cjson"]
+
+
+def test_same_keys_as_source():
+    """字节码与源码解析得到相同的调用图键"""
+    _, call_graph, require, status = scan_source("sample.lua", _read("sample.lua"), _format=None)
+    assert status == "成功"
+    assert call_graph.keys() == EXPECTED.keys()
+    assert require == ["cjson"]
+
+
+def test_scan_one_file():
+    _, call_graph, require, status = scan_one_file(os.path.join(FIXTURES, "sample.luajit21.luac"), _format=None)
+    assert status == "成功"
+    assert _sorted(call_graph) == EXPECTED
+
+
+@pytest.mark.parametrize("name", ["sample.lua51.luac", "sample.luajit21.luac"])
+def test_truncated_bytecode(name):
+    """内容不完整的字节码报告错误，扫描时跳过该文件"""
+    data = _read(name)[:len(_read(name)) // 2]
+    with pytest.raises(ValueError):
+        scan_bytecode(data)
+    assert scan_source(name, data, _format=None)[1:] == ({}, [], "Lua 字节码文件")
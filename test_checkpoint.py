@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试扫描检查点 (lus4n.checkpoint)
+"""
+
+import os
+
+from lus4n.checkpoint import ScanCheckpoint, checkpoint_path
+
+
+HEADER = {"scan_path": "/src", "extensions": [".lua"]}
+
+
+def _result(index):
+    return (f"f{index}.lua", f"h{index}", "成功", {"[G]": [f"func{index}"]}, [], None)
+
+
+def _write(storage_path, count, every_files=2):
+    """写出 count 个文件的结果，每 every_files 个一批，返回写出后的检查点文件长度"""
+    checkpoint = ScanCheckpoint(storage_path, HEADER, every_files=every_files, every_seconds=3600)
+    for index in range(count):
+        checkpoint.add(*_result(index))
+    checkpoint.flush()
+    checkpoint.close()
+    return os.path.getsize(checkpoint_path(storage_path))
+
+
+def test_load_round_trip(tmp_path):
+    storage_path = str(tmp_path / "scan.lus4n")
+    _write(storage_path, 5)
+    checkpoint = ScanCheckpoint(storage_path, HEADER)
+    results = checkpoint.load()
+    assert results == {name: tuple(result) for name, *result in map(_result, range(5))}
+    assert checkpoint.count == 5
+
+
+def test_truncated_last_batch(tmp_path):
+    """最后一批写了一半时只读取完整的批，继续追加前截掉这部分"""
+    storage_path = str(tmp_path / "scan.lus4n")
+    complete_size = _write(storage_path, 4)
+    full_size = _write(storage_path, 6)
+    assert full_size > complete_size
+    with open(checkpoint_path(storage_path), "r+b") as f:
+        f.truncate(full_size - 3)
+
+    checkpoint = ScanCheckpoint(storage_path, HEADER, every_files=2, every_seconds=3600)
+    results = checkpoint.load()
+    assert sorted(results) == [f"f{index}.lua" for index in range(4)]
+    assert checkpoint.count == 4
+
+    checkpoint.add(*_result(10))
+    checkpoint.add(*_result(11))
+    checkpoint.close()
+    assert ScanCheckpoint(storage_path, HEADER).load().keys() == {
+        "f0.lua", "f1.lua", "f2.lua", "f3.lua", "f10.lua", "f11.lua"}
+
+
+def test_header_mismatch_discards(tmp_path):
+    """头记录与本次扫描不同时丢弃检查点"""
+    storage_path = str(tmp_path / "scan.lus4n")
+    _write(storage_path, 3)
+    checkpoint = ScanCheckpoint(storage_path, dict(HEADER, extensions=[".lua", ".luac"]))
+    assert checkpoint.load() == {}
+    assert not os.path.exists(checkpoint_path(storage_path))
+
+
+def test_truncated_header_discards(tmp_path):
+    storage_path = str(tmp_path / "scan.lus4n")
+    _write(storage_path, 3)
+    with open(checkpoint_path(storage_path), "r+b") as f:
+        f.truncate(5)
+    assert ScanCheckpoint(storage_path, HEADER).load() == {}
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试大文件切分 (lus4n.chunks)
+"""
+
+from lus4n.chunks import split_source, statement_boundaries
+from lus4n.graph import merge_chunks, parse_chunk
+
+
+SOURCE = """local M = {}
+local t = {
+    a = 1,
+    b = 2,
+}
+function M.foo(x)
+    local y = x
+    print(y)
+end
+-- function 注释中的关键字
+local s = [[
+function not_a_boundary()
+]]
+if M then
+    M.foo(1)
+end
+local ok = M
+    and M.foo
+    or nil
+M.foo(2)
+return M
+"""
+
+
+def _line_starts(source, names):
+    """各行行首的位置，按给定的行开头文本查找"""
+    return [source.index("\n" + name) + 1 for name in names]
+
+
+def test_statement_boundaries_only_at_top_level():
+    """切分点只在顶层语句开头：不在表构造、函数体、长字符串、if 块和 and/or 续行中"""
+    boundaries = statement_boundaries(SOURCE)
+    assert boundaries == _line_starts(SOURCE, [
+        "local t", "function M.foo", "local s", "if M", "local ok", "M.foo(2)", "return M"])
+    assert all(SOURCE[pos - 1] == "\n" for pos in boundaries)
+
+
+def test_statement_boundaries_none():
+    assert statement_boundaries("") == []
+    assert statement_boundaries("print(1)\n") == []
+    assert statement_boundaries("function f()\n  print(1)\n  print(2)\nend\n") == []
+
+
+def test_split_source_line_offsets():
+    """各块拼接后与原文相同，行偏移为块之前的行数"""
+    chunks = split_source(SOURCE, chunk_size=40)
+    assert len(chunks) > 2
+    assert "".join(text for _, text in chunks) == SOURCE
+    consumed = ""
+    for line_offset, text in chunks:
+        assert line_offset == consumed.count("\n")
+        assert consumed == "" or consumed.endswith("\n")
+        consumed += text
+
+
+def test_split_source_single_chunk():
+    """没有切分点或源码小于块长度时只有一块"""
+    assert split_source(SOURCE) == [(0, SOURCE)]
+    source = "function f()\n" + "  print(1)\n" * 100 + "end\n"
+    assert split_source(source, chunk_size=10) == [(0, source)]
+
+
+def test_split_source_merges_small_tail():
+    """最后一块小于块长度的四分之一时并入前一块"""
+    body = "print(1)\n" * 20
+    source = body + "print(2)\n"
+    chunks = split_source(source, chunk_size=len(body))
+    assert [text for _, text in chunks] == [source]
+    source = body + body
+    chunks = split_source(source, chunk_size=len(body))
+    assert chunks == [(0, body), (20, body)]
+
+
+def test_parse_chunks_matches_whole_file():
+    """分块解析合并后的调用图与调用位置行号与整体解析相同"""
+    whole = merge_chunks("t.lua", [parse_chunk("t.lua", SOURCE)])
+    chunks = split_source(SOURCE, chunk_size=40)
+    merged = merge_chunks("t.lua", [parse_chunk("t.lua", text, offset) for offset, text in chunks])
+    assert merged[2] == whole[2] == "成功"
+    assert {k: sorted(v) for k, v in merged[0].items()} == {k: sorted(v) for k, v in whole[0].items()}
+    assert sorted(merged[3][0]) == sorted(whole[3][0])
+    assert sorted(merged[3][1]) == sorted(whole[3][1])
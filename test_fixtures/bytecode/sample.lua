@@ -0,0 +1,7 @@
+local json = require("cjson")
+local M = {}
+function M.foo(a) io.write(a); os.execute("x"); a.b.c(1); obj:meth(2); local t = {} t[1]() end
+local function bar() M.foo(1); print("x") end
+function baz() bar(); string.format("%d", 1) end
+bar()
+return M
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试忽略规则 (lus4n.ignore) 中的 '!' 重新包含
+"""
+
+import os
+
+from lus4n.ignore import IgnoreRules, walk_files
+
+
+def _make_tree(root, files):
+    """按 {相对路径: 内容} 创建文件"""
+    for rel_path, content in files.items():
+        path = os.path.join(root, *rel_path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def _scanned(root, rules=None):
+    """walk_files 返回的文件 (相对路径)"""
+    rules = rules or IgnoreRules(str(root))
+    return sorted(rules.relative(os.path.join(dir_path, name))
+                  for dir_path, _, names in walk_files(str(root), [".lua"], rules) for name in names)
+
+
+def test_negation_reincludes_file(tmp_path):
+    """后出现的 '!' 规则重新包含前面规则忽略的文件"""
+    _make_tree(tmp_path, {
+        ".gitignore": "*.lua\n!keep.lua\n",
+        "a.lua": "", "keep.lua": "", "sub/keep.lua": "", "sub/b.lua": "",
+    })
+    assert _scanned(tmp_path) == ["keep.lua", "sub/keep.lua"]
+
+
+def test_later_rule_wins(tmp_path):
+    """'!' 规则之后再次忽略时以最后一条为准"""
+    _make_tree(tmp_path, {
+        ".gitignore": "*.lua\n!keep*.lua\nkeep_not.lua\n",
+        "keep.lua": "", "keep_not.lua": "", "other.lua": "",
+    })
+    assert _scanned(tmp_path) == ["keep.lua"]
+
+
+def test_negation_in_subdirectory(tmp_path):
+    """子目录的忽略文件可以重新包含上级目录忽略的文件，只作用于该子目录"""
+    _make_tree(tmp_path, {
+        ".gitignore": "gen_*.lua\n",
+        "gen_a.lua": "",
+        "proto/.gitignore": "!gen_*.lua\n",
+        "proto/gen_b.lua": "",
+        "other/gen_c.lua": "",
+    })
+    assert _scanned(tmp_path) == ["proto/gen_b.lua"]
+
+
+def test_negation_under_ignored_directory(tmp_path):
+    """父目录被忽略时其中的文件不能重新包含 (与 git 相同)，目录直接剪枝"""
+    _make_tree(tmp_path, {
+        ".gitignore": "build/\n!build/keep.lua\n",
+        "build/keep.lua": "", "main.lua": "",
+    })
+    rules = IgnoreRules(str(tmp_path))
+    assert _scanned(tmp_path, rules) == ["main.lua"]
+    assert not rules.accepts_relative("build/keep.lua")
+
+
+def test_negation_of_directory_contents(tmp_path):
+    """忽略目录的内容而不是目录本身时，可以重新包含其中的文件"""
+    _make_tree(tmp_path, {
+        ".gitignore": "vendor/**\n!vendor/**/\n!vendor/lib/*.lua\n",
+        "vendor/a.lua": "", "vendor/lib/b.lua": "", "vendor/lib/deep/c.lua": "",
+    })
+    assert _scanned(tmp_path) == ["vendor/lib/b.lua"]
+
+
+def test_exclude_negation_overrides_ignore_file(tmp_path):
+    """调用方指定的排除模式优先，其中的 '!' 规则可以重新包含忽略文件排除的路径"""
+    _make_tree(tmp_path, {
+        ".gitignore": "*_test.lua\n",
+        "a_test.lua": "", "b_test.lua": "", "main.lua": "",
+    })
+    rules = IgnoreRules(str(tmp_path), excludes=["main.lua", "!a_test.lua"])
+    assert _scanned(tmp_path, rules) == ["a_test.lua"]
+
+
+def test_escaped_exclamation(tmp_path):
+    """'\\!' 开头的模式匹配以 '!' 开头的文件名，不是重新包含"""
+    _make_tree(tmp_path, {
+        ".gitignore": "\\!important.lua\n",
+        "!important.lua": "", "important.lua": "",
+    })
+    assert _scanned(tmp_path) == ["important.lua"]
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试跨文件符号解析 (lus4n.resolve)：require 别名、返回的表、module() 声明
+"""
+
+import pytest
+
+from lus4n.builder import build_network, main_node
+from lus4n.graph import scan_source
+from lus4n.resolve import RESOLVE_ACTION, module_names, resolve_calls
+from lus4n.sites import CallSiteTable, node_sites
+
+
+HTTP = "usr/lib/lua/luci/http.lua"
+UTIL = "usr/lib/lua/luci/util.lua"
+CGI = "www/cgi.lua"
+
+SOURCES = {
+    HTTP: """module("luci.http", package.seeall)
+function write(s) io.write(s) end
+function status(code) write(code) end
+""",
+    UTIL: """local M = {}
+function M.exec(cmd) return io.popen(cmd) end
+function M.trim(s) return s end
+function M.run(cmd) return M.exec(cmd) end
+return M
+""",
+    CGI: """local u = require "luci.util"
+local http = require("luci.http")
+function handle()
+    u.exec("ls")
+    u.exec("id")
+    http.write("x")
+    luci.http.status(200)
+    u.missing()
+end
+u.trim(" a ")
+""",
+}
+
+
+def _scan(sources):
+    """解析源码，返回 (调用表, require 列表, 调用图)"""
+    call_sites, file_requires, whole_call_graph = CallSiteTable(), {}, {}
+    for relative_file_path, source in sources.items():
+        _, call_graph, require, status, sites = scan_source(relative_file_path, source.encode(), _format=None,
+                                                            with_sites=True)
+        assert status == "成功"
+        call_sites.add_file(relative_file_path, node_sites(relative_file_path, sites, require))
+        file_requires[relative_file_path] = require
+        whole_call_graph[relative_file_path] = call_graph
+    return call_sites, file_requires, whole_call_graph
+
+
+@pytest.fixture(scope="module")
+def resolution():
+    call_sites, file_requires, _ = _scan(SOURCES)
+    return resolve_calls(call_sites, file_requires)
+
+
+def test_require_alias(resolution):
+    """local u = require "luci.util" 之后 u.exec 解析到 util.lua 导出的函数，调用次数累加"""
+    assert resolution.edges[("handle", "util.exec")] == 2
+    assert resolution.edges[(main_node(CGI), "util.trim")] == 1
+    assert resolution.targets["util.exec"] == UTIL
+    assert resolution.module_file("luci/util") == UTIL
+
+
+def test_returned_table(resolution):
+    """文件内通过返回的表调用自己导出的函数"""
+    assert resolution.edges[("util.run", "util.exec")] == 1
+
+
+def test_module_declaration(resolution):
+    """module("luci.http") 中的全局函数按声明的模块名导出，通过别名或全局模块名都能解析"""
+    assert resolution.edges[("handle", "write")] == 1
+    assert resolution.edges[("handle", "status")] == 1
+    assert resolution.targets["status"] == HTTP
+    assert resolution.module_file("luci.http") == HTTP
+
+
+def test_unresolved(resolution):
+    """没有导出的字段和标准库调用不解析，计入未解析次数"""
+    assert resolution.callees_of("handle") == ["status", "util.exec", "write"]
+    assert resolution.resolved == 6
+    assert resolution.unresolved == 3
+
+
+def test_single_name_module_requires_require():
+    """单段的模块名只在声明过或被本文件 require 时才当作模块"""
+    sources = {
+        "lib/util.lua": "local M = {}\nfunction M.exec(cmd) os.execute(cmd) end\nreturn M\n",
+        "a.lua": 'require "util"\nutil.exec("ls")\n',
+        "b.lua": 'util.exec("ls")\n',
+    }
+    call_sites, file_requires, _ = _scan(sources)
+    resolution = resolve_calls(call_sites, file_requires)
+    assert resolution.callers_of("util.exec") == [main_node("a.lua")]
+
+
+def test_apply_adds_resolve_edges(resolution):
+    """解析得到的边加入调用网络；没有调用的目标函数同时加入定义文件的 export 边"""
+    _, file_requires, whole_call_graph = _scan(SOURCES)
+    network = resolution.apply(build_network(whole_call_graph, file_requires))
+    assert network.edges["handle", "util.exec"] == {"action": RESOLVE_ACTION, "weight": 2}
+    assert network.edges[UTIL, "util.trim"]["action"] == "export"
+    assert network.edges[main_node(CGI), "util.trim"]["action"] == RESOLVE_ACTION
+
+
+def test_module_names():
+    assert module_names("usr/lib/lua/luci/http.lua")[-2:] == ["luci.http", "http"]
+    assert module_names("lib/json/init.lua") == ["lib.json", "json"]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+测试存储文件的日志重放与合并 (lus4n.storage)
+"""
+
+import os
+import pickle
+
+import pytest
+
+from lus4n.builder import build_network
+from lus4n.storage import (
+    STATE_KEY, compact_storage, journal_path, load_storage, save_delta, save_storage,
+)
+
+
+def _scan_result(files):
+    """模拟一次扫描的存储内容，files 为 {文件节点名: (哈希, 调用图, require 列表)}"""
+    whole_call_graph = {name: call_graph for name, (_, call_graph, _) in files.items()}
+    file_requires = {name: require for name, (_, _, require) in files.items()}
+    return {
+        'file_hashes': {name: file_hash for name, (file_hash, _, _) in files.items()},
+        'whole_call_graph': whole_call_graph,
+        'file_requires': file_requires,
+        'whole_call_network': build_network(whole_call_graph, file_requires),
+        'scan_path': "/src",
+    }
+
+
+FILES = {
+    "a.lua": ("h1", {"[G]": ["print", "b_func"], "[X]a_func": ["os.execute"]}, ["b"]),
+    "b.lua": ("h2", {"[X]b_func": ["io.open"]}, []),
+    "c.lua": ("h3", {"[G]": ["a_func"]}, ["a"]),
+}
+
+
+def _updated(files, changes):
+    """在 files 上修改、新增 (值为元组) 或删除 (值为 None) 文件"""
+    files = dict(files)
+    for name, value in changes.items():
+        if value is None:
+            files.pop(name)
+        else:
+            files[name] = value
+    return files
+
+
+def _content(data):
+    """便于比较的存储内容 (调用网络展开为节点和边)"""
+    content = {key: value for key, value in data.items() if key not in (STATE_KEY, 'snapshot_id', 'whole_call_network')}
+    network = data['whole_call_network']
+    content['nodes'] = sorted((node, sorted(attrs.items())) for node, attrs in network.nodes(data=True))
+    content['edges'] = sorted((u, v, sorted(attrs.items())) for u, v, attrs in network.edges(data=True))
+    return content
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage_path = str(tmp_path / "scan.lus4n")
+    save_storage(_scan_result(FILES), storage_path)
+    return storage_path
+
+
+def test_journal_replay(storage):
+    """连续追加的日志记录在加载时依次重放，结果与完整保存相同"""
+    old = load_storage(storage)
+    first = _scan_result(_updated(FILES, {"b.lua": ("h4", {"[X]b_func": ["io.write"], "[G]": ["b_func"]}, [])}))
+    assert save_delta(old, first, storage)
+    second = _scan_result(_updated(FILES, {"b.lua": ("h4", {"[X]b_func": ["io.write"], "[G]": ["b_func"]}, []),
+                                   "c.lua": None, "d.lua": ("h5", {"[G]": ["print"]}, ["a", "b"])}))
+    # save_delta 在 data 中记录新的存储状态，可以直接作为下一次的 old_data
+    assert save_delta(first, second, storage)
+    assert os.path.exists(journal_path(storage))
+    assert _content(load_storage(storage)) == _content(second)
+
+
+def test_compaction_round_trip(storage):
+    """合并日志后得到相同的内容，日志被删除"""
+    old = load_storage(storage)
+    new = _scan_result(_updated(FILES, {"a.lua": ("h6", {"[G]": ["print"]}, [])}))
+    assert save_delta(old, new, storage)
+    stamp = compact_storage(storage)
+    assert stamp is not None
+    assert not os.path.exists(journal_path(storage))
+    assert _content(load_storage(storage)) == _content(new)
+    assert compact_storage(storage) is None
+
+
+def test_truncated_journal_tail(storage):
+    """最后一条记录写了一半时重放到上一条记录为止"""
+    old = load_storage(storage)
+    first = _scan_result(_updated(FILES, {"c.lua": None}))
+    assert save_delta(old, first, storage)
+    complete_size = os.path.getsize(journal_path(storage))
+    second = _scan_result(_updated(FILES, {"c.lua": None, "a.lua": ("h7", {}, [])}))
+    assert save_delta(first, second, storage)
+    with open(journal_path(storage), "r+b") as f:
+        f.truncate(complete_size + (os.path.getsize(journal_path(storage)) - complete_size) // 2)
+    loaded = load_storage(storage)
+    assert _content(loaded) == _content(first)
+    assert loaded[STATE_KEY][2] == complete_size
+
+
+def test_stale_journal_ignored(storage):
+    """日志不属于当前基准快照 (快照已被替换) 时不重放"""
+    old = load_storage(storage)
+    new = _scan_result(_updated(FILES, {"c.lua": None}))
+    assert save_delta(old, new, storage)
+    with open(journal_path(storage), "rb") as f:
+        journal = f.read()
+    save_storage(_scan_result(FILES), storage)
+    with open(journal_path(storage), "wb") as f:
+        f.write(journal)
+    assert _content(load_storage(storage)) == _content(_scan_result(FILES))
+
+
+def test_delta_rejected_after_rewrite(storage):
+    """加载后存储文件被改写时不追加日志，需要完整保存"""
+    old = load_storage(storage)
+    save_storage(_scan_result(FILES), storage)
+    assert not save_delta(old, _scan_result(_updated(FILES, {"c.lua": None})), storage)
+    assert not os.path.exists(journal_path(storage))
+
+
+def test_plain_pickle_and_graph(tmp_path):
+    """命令行保存的 DiGraph 和其他工具写出的 pickle 文件同样可以读取"""
+    storage_path = str(tmp_path / "graph.lus4n")
+    network = _scan_result(FILES)['whole_call_network']
+    with open(storage_path, "wb") as f:
+        pickle.dump(network, f, protocol=2)
+    loaded = load_storage(storage_path)
+    assert sorted(loaded.edges(data=True)) == sorted(network.edges(data=True))